@@ -1,7 +1,8 @@
 import os
+from typing import Callable
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app import config
 
@@ -19,3 +20,16 @@ def create_env_engine(psql_environment, sqlalchemy_database_url):
 
 engine = create_env_engine(config.PSQL_ENVIRONMENT, SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+SessionFactory = Callable[[], Session]
+
+
+def get_session_factory(session: Session) -> SessionFactory:
+    """Returns a factory of sessions bound like the given session.
+
+    Background work cannot use the session of the request that started
+    it, since the session is closed once the response is sent.
+    """
+    return sessionmaker(
+        autocommit=False, autoflush=False, bind=session.get_bind(),
+    )
@@ -1,19 +1,23 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict
+from datetime import date, datetime
+from typing import Any, Dict, List
 
 from sqlalchemy import (
     Boolean,
     Column,
+    Date,
     DateTime,
     DDL,
     event,
     Float,
     ForeignKey,
+    func,
     Index,
+    inspect,
     Integer,
     JSON,
+    select,
     String,
     Time,
     UniqueConstraint,
@@ -22,6 +26,7 @@
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.declarative.api import declarative_base, DeclarativeMeta
 from sqlalchemy.orm import relationship, Session
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.sql.schema import CheckConstraint
 
 from app.config import PSQL_ENVIRONMENT
@@ -47,6 +52,10 @@ class User(Base):
     privacy = Column(String, default="Private", nullable=False)
     is_manager = Column(Boolean, default=False)
     language_id = Column(Integer, ForeignKey("languages.id"))
+    # Bumped in the transaction of every write to the user's events.
+    events_version = Column(
+        Integer, default=0, server_default="0", nullable=False)
+    events_changed_at = Column(DateTime)
 
     owned_events = relationship(
         "Event",
@@ -96,7 +105,12 @@ class Event(Base):
     all_day = Column(Boolean, default=False)
     invitees = Column(String)
     emotion = Column(String, nullable=True)
+    # The UTC time the emotion was scored at, NULL until it is scored.
+    emotion_scored_at = Column(DateTime)
+    flair = Column(String, nullable=True)
     availability = Column(Boolean, default=True, nullable=False)
+    # The import the event was inserted by, if any.
+    import_batch_id = Column(String(32))
 
     owner_id = Column(Integer, ForeignKey("users.id"))
     category_id = Column(Integer, ForeignKey("categories.id"))
@@ -108,11 +122,23 @@ class Event(Base):
         back_populates="events",
     )
     comments = relationship("Comment", back_populates="event")
+    google_event = relationship(
+        "GoogleEvent",
+        cascade="all, delete",
+        back_populates="event",
+        uselist=False,
+    )
+
+    __table_args__ = (
+        Index("ix_events_owner_id_start", "owner_id", "start"),
+        Index("ix_events_start_end", "start", "end"),
+        Index("ix_events_import_batch_id", "import_batch_id"),
+    )
 
     # PostgreSQL
     if PSQL_ENVIRONMENT:
         events_tsv = Column(TSVECTOR)
-        __table_args__ = (
+        __table_args__ += (
             Index("events_tsv_idx", "events_tsv", postgresql_using="gin"),
         )
 
@@ -130,6 +156,11 @@ class UserEvent(Base):
     events = relationship("Event", back_populates="participants")
     participants = relationship("User", back_populates="events")
 
+    __table_args__ = (
+        Index("ix_user_event_user_id_event_id", "user_id", "event_id"),
+        Index("ix_user_event_event_id", "event_id"),
+    )
+
     def __repr__(self):
         return f"<UserEvent ({self.participants}, {self.events})>"
 
@@ -203,8 +234,8 @@ class Invitation(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     status = Column(String, nullable=False, default="unread")
-    recipient_id = Column(Integer, ForeignKey("users.id"))
-    event_id = Column(Integer, ForeignKey("events.id"))
+    recipient_id = Column(Integer, ForeignKey("users.id"), index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), index=True)
     creation = Column(DateTime, default=datetime.now)
 
     recipient = relationship("User")
@@ -225,10 +256,65 @@ class OAuthCredentials(Base):
     client_secret = Column(String)
     expiry = Column(DateTime)
 
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, unique=True)
     owner = relationship("User", back_populates=__tablename__, uselist=False)
 
 
+class GoogleSyncState(Base):
+    """The sync token of the last sync of a user's Google calendar."""
+    __tablename__ = "google_sync_states"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    calendar_id = Column(String, primary_key=True)
+    sync_token = Column(String)
+    synced_at = Column(DateTime)
+
+
+class GoogleEvent(Base):
+    """The Google Calendar event ID of an event synced from Google."""
+    __tablename__ = "google_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    calendar_id = Column(String, nullable=False)
+    google_event_id = Column(String, nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+
+    event = relationship("Event", back_populates="google_event")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "calendar_id", "google_event_id"),
+        Index("ix_google_events_event_id", "event_id"),
+    )
+
+
+class Translation(Base):
+    """A translation of a text, keyed by the SHA-256 of the text."""
+    __tablename__ = "translations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text_hash = Column(String(64), nullable=False)
+    source = Column(String, nullable=False)
+    target = Column(String, nullable=False)
+    translation = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("text_hash", "source", "target"),)
+
+
+class ImportJobProgress(Base):
+    """The progress of a background import, shared by the app workers."""
+    __tablename__ = "import_jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String, nullable=False)
+    progress = Column(JSON, nullable=False)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class SalarySettings(Base):
     # Code revision required after categories feature is added
     # Code revision required after holiday times feature is added
@@ -329,6 +415,20 @@ def __repr__(self):
         return f"<SalarySettings ({self.user_id}, {self.category_id})>"
 
 
+class WeatherDay(Base):
+    """The weather of a day at a location, as last fetched."""
+    __tablename__ = "weather_days"
+
+    location = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    forecast_type = Column(String, nullable=False)
+    min_temp = Column(Float, nullable=False)
+    max_temp = Column(Float, nullable=False)
+    conditions = Column(String)
+    address = Column(String)
+    fetched_at = Column(DateTime, nullable=False)
+
+
 class WikipediaEvents(Base):
     __tablename__ = "wikipedia_events"
 
@@ -336,7 +436,13 @@ class WikipediaEvents(Base):
     date_ = Column(String, nullable=False)
     wikipedia = Column(String, nullable=False)
     events = Column(JSON, nullable=True)
-    date_inserted = Column(DateTime, default=datetime.utcnow)
+    date_inserted = Column(DateTime, default=datetime.utcnow, index=True)
+    # The date the events are of, one row per date.
+    day = Column(Date, default=date.today)
+
+    __table_args__ = (
+        Index("ix_wikipedia_events_day", "day", unique=True),
+    )
 
 
 class Quote(Base):
@@ -359,6 +465,8 @@ class Comment(Base):
     user = relationship("User", back_populates="comments")
     event = relationship("Event", back_populates="comments")
 
+    __table_args__ = (Index("ix_comments_event_id_time", "event_id", "time"),)
+
     def __repr__(self):
         return f"<Comment {self.id}>"
 
@@ -382,6 +490,144 @@ def __repr__(self):
         )
 
 
+def add_missing_columns(engine) -> List[str]:
+    """Adds every model column that is missing from an existing table.
+
+    `Base.metadata.create_all` only creates new tables, so the tables of
+    databases created before a column was added to a model never get it,
+    and every query of the model fails. This step is idempotent, and works
+    for SQLite and PostgreSQL alike. Columns that can't be added to a
+    table with rows, which are required but have no server default, are
+    skipped with an error.
+
+    Returns:
+        The columns that were added, as "table.column".
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.error(
+                        f"Can't add the required column {column.name} "
+                        f"to the existing table {table.name}")
+                    continue
+                spec = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.execute(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {spec}")
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added missing columns: {', '.join(added)}")
+    return added
+
+
+def upgrade_wikipedia_events(engine) -> int:
+    """Prepares the rows stored before WikipediaEvents.day was added for
+    its unique index.
+
+    The day of each row is backfilled from the date it was inserted, and
+    only the latest row of each day is kept. This step is idempotent.
+
+    Returns:
+        The number of duplicate rows deleted.
+    """
+    table = WikipediaEvents.__table__
+    with engine.begin() as connection:
+        connection.execute(
+            table.update()
+            .where(table.c.day.is_(None) & table.c.date_inserted.isnot(None))
+            .values(day=func.date(table.c.date_inserted))
+        )
+        latest_ids = (
+            select([func.max(table.c.id)])
+            .where(table.c.day.isnot(None))
+            .group_by(table.c.day)
+        )
+        deleted = connection.execute(
+            table.delete().where(
+                table.c.day.isnot(None) & table.c.id.notin_(latest_ids))
+        ).rowcount
+    if deleted:
+        logger.info(f"Deleted {deleted} duplicate on this day rows")
+    return deleted
+
+
+def upgrade_oauth_credentials(engine) -> int:
+    """Prepares the rows stored before OAuthCredentials.user_id was made
+    unique for its unique index.
+
+    Older versions added a row on every token refresh, so only the latest
+    row of each user is kept. A non-unique index on user_id is dropped, to
+    be created again as unique by `create_missing_indexes`. This step is
+    idempotent.
+
+    Returns:
+        The number of duplicate rows deleted.
+    """
+    table = OAuthCredentials.__table__
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    if table.name not in inspector.get_table_names():
+        return 0
+    with engine.begin() as connection:
+        latest_ids = (
+            select([func.max(table.c.id)])
+            .where(table.c.user_id.isnot(None))
+            .group_by(table.c.user_id)
+        )
+        deleted = connection.execute(
+            table.delete().where(
+                table.c.user_id.isnot(None) & table.c.id.notin_(latest_ids))
+        ).rowcount
+        for index in inspector.get_indexes(table.name):
+            if index["column_names"] == ["user_id"] and not index["unique"]:
+                connection.execute(
+                    f"DROP INDEX {preparer.quote(index['name'])}")
+    if deleted:
+        logger.info(f"Deleted {deleted} duplicate OAuth credentials rows")
+    return deleted
+
+
+def create_missing_indexes(engine) -> List[str]:
+    """Creates every model index that is missing from an existing database.
+
+    `Base.metadata.create_all` only creates indexes together with new
+    tables, so databases created before an index was added to a model
+    never get it. This step is idempotent, and works for SQLite and
+    PostgreSQL alike.
+
+    Returns:
+        The names of the indexes that were created.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                created.append(index.name)
+    if created:
+        logger.info(f"Created missing indexes: {', '.join(created)}")
+    return created
+
+
 # insert language data
 
 # Credit to adrihanu   https://stackoverflow.com/users/9127249/adrihanu
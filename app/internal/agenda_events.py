@@ -1,13 +1,30 @@
 import datetime
 from datetime import date, timedelta
-from typing import Iterator, List, Optional, Union
+from typing import Iterator, List, Optional, Tuple, Union
 
 import arrow
 from sqlalchemy.orm import Session
 
 from app.database.models import Event
-from app.routers.event import sort_by_date
-from app.routers.user import get_all_user_events
+from app.routers.user import get_user_events_starting_in_range
+
+
+def get_dates_range_bounds(
+        start: Optional[date],
+        end: Optional[date],
+) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]:
+    """Converts an inclusive dates range to [start, end) datetime bounds.
+
+    A missing date is kept as None, leaving that side of the range open.
+    """
+    range_start = range_end = None
+    if start:
+        range_start = datetime.datetime.combine(start, datetime.time.min)
+    if end:
+        range_end = datetime.datetime.combine(
+            end + timedelta(days=1), datetime.time.min,
+        )
+    return range_start, range_end
 
 
 def get_events_per_dates(
@@ -22,14 +39,9 @@ def get_events_per_dates(
     if start > end:
         return []
 
-    return (
-        filter_dates(
-            sort_by_date(
-                get_all_user_events(session, user_id)
-            ),
-            start,
-            end,
-        )
+    range_start, range_end = get_dates_range_bounds(start, end)
+    return get_user_events_starting_in_range(
+        session, user_id, range_start, range_end,
     )
 
 
@@ -87,5 +99,7 @@ def get_events_in_time_frame(
         user_id: int, db: Session
 ) -> Iterator[Event]:
     """Yields all user's events in a time frame."""
-    events = get_all_user_events(db, user_id)
-    yield from filter_dates(events, start_date, end_date)
+    range_start, range_end = get_dates_range_bounds(start_date, end_date)
+    yield from get_user_events_starting_in_range(
+        db, user_id, range_start, range_end,
+    )
@@ -1,14 +1,23 @@
-from datetime import datetime
-import functools
-from typing import Any, Dict
+from collections import OrderedDict
+from datetime import date as date_type, datetime
+from typing import Any, Dict, Optional
 
 import httpx
+import pytz
 
 from app import config
+from app.internal.ephemeris import AstronomicalDay, get_astronomical_days
+from app.internal.geocoding import get_location
+from app.internal.http_client import http_client, ServiceUnavailableError
 
-# This feature requires an API key. Get yours free at www.weatherapi.com.
+# The fallback for locations missing from the local table requires an API
+# key. Get yours free at www.weatherapi.com.
 ASTRONOMY_URL = "https://api.weatherapi.com/v1/astronomy.json"
 NO_API_RESPONSE = _("No response from server.")
+API_CACHE_SIZE = 128
+TIME_FORMAT = "%I:%M %p"
+
+_api_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
 
 
 async def get_astronomical_data(
@@ -16,6 +25,9 @@ async def get_astronomical_data(
 ) -> Dict[str, Any]:
     """Returns astronomical data (sun and moon) for date and location.
 
+    The data is computed locally if the location is in the local table,
+    and requested from the Weather API otherwise.
+
     Args:
         date: The requested date for astronomical data.
         location: The location name.
@@ -30,16 +42,73 @@ async def get_astronomical_data(
                 sunrise, sunset, moonrise, moonset, moon_phase, and
                 moon_illumination.
     """
+    local = get_astronomical_data_range(date, date, location)
+    if local is not None:
+        local["astronomy"] = local["astronomy"][date.strftime('%Y-%m-%d')]
+        return local
     formatted_date = date.strftime('%Y-%m-%d')
     return await _get_astronomical_data_from_api(formatted_date, location)
 
 
-@functools.lru_cache(maxsize=128)
+def get_astronomical_data_range(
+        start: date_type, end: date_type, location: str,
+) -> Optional[Dict[str, Any]]:
+    """Returns the astronomical data of each date of a range, computed
+    locally, such as the days of a month or a year.
+
+    Args:
+        start: The first date.
+        end: The last date, inclusive.
+        location: The location name.
+
+    Returns:
+        A dictionary like get_astronomical_data's, whose astronomy maps
+        each date in ISO format to its astronomical data, or None if the
+        location is not in the local table.
+    """
+    found = get_location(location)
+    if found is None:
+        return None
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    days = get_astronomical_days(
+        start, end, found.lat, found.lon, pytz.timezone(found.tz_id),
+    )
+    return {
+        "success": True,
+        **found._asdict(),
+        "astronomy": {day.date.isoformat(): _format_day(day) for day in days},
+    }
+
+
+def _format_time(moment: Optional[datetime], event: str) -> str:
+    if moment is None:
+        return f"No {event}"
+    return moment.strftime(TIME_FORMAT)
+
+
+def _format_day(day: AstronomicalDay) -> Dict[str, str]:
+    """Returns the data of a day in the format of the Weather API."""
+    return {
+        "sunrise": _format_time(day.sunrise, "sunrise"),
+        "sunset": _format_time(day.sunset, "sunset"),
+        "moonrise": _format_time(day.moonrise, "moonrise"),
+        "moonset": _format_time(day.moonset, "moonset"),
+        "moon_phase": day.moon_phase,
+        "moon_illumination": str(day.moon_illumination),
+    }
+
+
 async def _get_astronomical_data_from_api(
         date: str, location: str
 ) -> Dict[str, Any]:
     """Returns astronomical_data from a Weather API call.
 
+    Successful responses are cached, unlike errors, which may be
+    temporary.
+
     Args:
         date: The requested date for astronomical data.
         location: The location name.
@@ -47,6 +116,11 @@ async def _get_astronomical_data_from_api(
     Returns:
         A dictionary with the results from the API call.
     """
+    key = (date, location)
+    if key in _api_cache:
+        _api_cache.move_to_end(key)
+        return dict(_api_cache[key])
+
     input_query_string = {
         'key': config.ASTRONOMY_API_KEY,
         'q': location,
@@ -55,10 +129,9 @@ async def _get_astronomical_data_from_api(
 
     output: Dict[str, Any] = {}
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                ASTRONOMY_URL, params=input_query_string)
-    except httpx.HTTPError:
+        response = await http_client.request(
+            "astronomy", "GET", ASTRONOMY_URL, params=input_query_string)
+    except ServiceUnavailableError:
         output["success"] = False
         output["error"] = NO_API_RESPONSE
         return output
@@ -71,8 +144,12 @@ async def _get_astronomical_data_from_api(
     output["success"] = True
     try:
         output.update(response.json()['location'])
-        return output
+        output["astronomy"] = response.json()['astronomy']['astro']
     except KeyError:
         output["success"] = False
         output["error"] = response.json()['error']['message']
         return output
+    _api_cache[key] = dict(output)
+    if len(_api_cache) > API_CACHE_SIZE:
+        _api_cache.popitem(last=False)
+    return output
@@ -0,0 +1,121 @@
+"""The iCalendar subscription feed of a user.
+
+Calendar clients poll the feed url, which is signed per user since they
+cannot log in. The feed is rendered once per user, range and events
+version, and the clients are answered with 304 Not Modified while the
+version they hold is current. The version is the one stored with the
+user, so every worker of the app gives a feed the same validators.
+"""
+from datetime import date, datetime, time, timezone
+from email.utils import formatdate, parsedate_to_datetime
+import hashlib
+import hmac
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import JWT_KEY
+from app.internal.agenda_events import get_dates_range_bounds
+from app.internal.event_changes import EventsVersion
+from app.internal.export import iter_user_icalendar
+from app.internal.render_cache import RenderCache
+
+FEED_CACHE_SIZE = 128
+FEED_CACHE_CONTROL = "private, no-cache"
+FEED_TOKEN_SEPARATOR = "-"
+
+feed_cache = RenderCache(maxsize=FEED_CACHE_SIZE)
+
+
+def _sign(user_id: int) -> str:
+    message = f"calendar-feed:{user_id}".encode()
+    return hmac.new(JWT_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def get_feed_token(user_id: int) -> str:
+    """Returns the token of the user's feed url."""
+    return f"{user_id}{FEED_TOKEN_SEPARATOR}{_sign(user_id)}"
+
+
+def get_feed_user_id(token: str) -> Optional[int]:
+    """Returns the user ID of a feed token, or None if it is not valid."""
+    user_id, _, signature = token.partition(FEED_TOKEN_SEPARATOR)
+    if not user_id.isdigit():
+        return None
+    if not hmac.compare_digest(signature, _sign(int(user_id))):
+        return None
+    return int(user_id)
+
+
+def get_feed_headers(
+        user_id: int,
+        start: Optional[date],
+        end: Optional[date],
+        version: EventsVersion,
+) -> Dict[str, str]:
+    """Returns the validators and caching headers of the user's feed.
+
+    The feed is rendered with the current date, like the other cached
+    fragments, so it is never older than the start of the day.
+    """
+    key = (user_id, start, end)
+    last_modified = datetime.combine(date.today(), time.min).timestamp()
+    if version.changed_at is not None:
+        changed_at = version.changed_at.replace(tzinfo=timezone.utc)
+        last_modified = max(changed_at.timestamp(), last_modified)
+    return {
+        "ETag": feed_cache.etag(key, version.version),
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": FEED_CACHE_CONTROL,
+    }
+
+
+def is_not_modified(
+        headers: Dict[str, str],
+        if_none_match: Optional[str],
+        if_modified_since: Optional[str],
+) -> bool:
+    """Whether the client holds the current feed.
+
+    If-None-Match is checked first, and If-Modified-Since only without it.
+
+    Args:
+        headers: The feed headers.
+        if_none_match: The If-None-Match request header.
+        if_modified_since: The If-Modified-Since request header.
+
+    Returns:
+        True if the client's copy is current, otherwise returns False.
+    """
+    if if_none_match is not None:
+        etags = {etag.strip() for etag in if_none_match.split(",")}
+        return headers["ETag"] in etags or "*" in etags
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(headers["Last-Modified"]) <= since
+
+
+def render_feed(
+        session: Session,
+        user_id: int,
+        start: Optional[date],
+        end: Optional[date],
+        version: EventsVersion,
+) -> str:
+    """Returns the user's iCalendar of the events starting in the dates
+    range, rendered once per events version and day."""
+    def render() -> str:
+        range_start, range_end = get_dates_range_bounds(start, end)
+        return b"".join(iter_user_icalendar(
+            session, user_id, range_start, range_end,
+        )).decode()
+
+    return feed_cache.get_or_render(
+        (user_id, start, end), version.version, render,
+    )
@@ -0,0 +1,83 @@
+"""A process-local cache of the users' Google OAuth credentials.
+
+Building the credentials costs a database query, and refreshing them a
+round trip to Google's token endpoint. The credentials of a user are kept
+until shortly before their token expires or the TTL passes, whichever is
+first, so other processes' refreshes are picked up too. A lock per user
+makes concurrent syncs of the same user wait for a single refresh.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+import threading
+import time
+from typing import DefaultDict, Dict, Optional, Tuple
+
+from google.oauth2.credentials import Credentials
+
+CREDENTIALS_CACHE_TTL = 10 * 60
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def needs_refresh(
+        credentials: Credentials,
+        margin: timedelta = TOKEN_REFRESH_MARGIN,
+) -> bool:
+    """Whether the access token is missing or expires within the margin."""
+    if not credentials.token:
+        return True
+    if credentials.expiry is None:
+        return False
+    return credentials.expiry - margin <= datetime.utcnow()
+
+
+class CredentialsCache:
+    """A TTL cache of valid credentials, keyed by user ID.
+
+    Args:
+        ttl: Optional; The seconds the credentials are kept for.
+            Defaults to CREDENTIALS_CACHE_TTL.
+        margin: Optional; How long before the token expiry the credentials
+            are dropped. Defaults to TOKEN_REFRESH_MARGIN.
+    """
+
+    def __init__(
+            self,
+            ttl: float = CREDENTIALS_CACHE_TTL,
+            margin: timedelta = TOKEN_REFRESH_MARGIN,
+    ):
+        self.ttl = ttl
+        self.margin = margin
+        self._credentials: Dict[int, Tuple[Credentials, float]] = {}
+        self._locks: DefaultDict[int, threading.Lock] = defaultdict(
+            threading.Lock)
+        self._locks_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._credentials)
+
+    def lock(self, user_id: int) -> threading.Lock:
+        """Returns the lock of the user's credentials."""
+        with self._locks_lock:
+            return self._locks[user_id]
+
+    def get(self, user_id: int) -> Optional[Credentials]:
+        """Returns the user's credentials, or None if they are not cached or
+        need a refresh."""
+        cached = self._credentials.get(user_id)
+        if cached is None:
+            return None
+        credentials, cached_at = cached
+        if (time.monotonic() - cached_at > self.ttl
+                or needs_refresh(credentials, self.margin)):
+            self._credentials.pop(user_id, None)
+            return None
+        return credentials
+
+    def set(self, user_id: int, credentials: Credentials) -> None:
+        self._credentials[user_id] = (credentials, time.monotonic())
+
+    def invalidate(self, user_id: int) -> None:
+        self._credentials.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._credentials.clear()
@@ -1,10 +1,16 @@
-import text2emotion as te
-from typing import Dict, NamedTuple, Union
+from functools import lru_cache
+import json
+import re
+from typing import (
+    Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union,
+)
 
 from app.config import (
     CONTENT_WEIGHTS,
     LEVEL_OF_SIGNIFICANCE,
+    RESOURCES_DIR,
     TITLE_WEIGHTS)
+from app.internal.preload import ensure_nltk_data
 
 
 EMOTIONS = {"Happy": "&#128515",
@@ -12,33 +18,154 @@
             "Angry": "&#128544",
             "Fear": "&#128561",
             "Surprise": "&#128558"}
+EMOTION_NAMES = tuple(EMOTIONS)
+EMOTION_CODES = tuple(EMOTIONS.values())
+LEXICON_FILE = RESOURCES_DIR / "emotion_lexicon.json"
+TOKENS_CACHE_SIZE = 64 * 1024
+MIN_WORD_LENGTH = 3
+
+URL_REGEX = re.compile(r"http\S+|www.\S+")
+WORD_REGEX = re.compile(r"'?\w+(?:-\w+)*")
+# The contractions NLTK's word tokenizer splits, which text2emotion uses.
+SPLIT_WORDS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
 
 Emoticon = NamedTuple("Emoticon", [("dominant", str), ("score", float),
                       ("code", str)])
-DupEmotion = NamedTuple("DupEmotion", [("dominant", str), ("flag", bool)])
+Scores = Tuple[float, ...]
+NO_SCORES: Scores = (0.0,) * len(EMOTIONS)
 
 
-def get_weight(emotion: str, title_emotion: Dict[str, float],
-               content_emotion: Dict[str, float] = None) -> float:
-    if not content_emotion:
-        return title_emotion[emotion]
-    return (title_emotion[emotion] * TITLE_WEIGHTS +
-            content_emotion[emotion] * CONTENT_WEIGHTS)
+class EmotionLexicon:
+    """The words of each emotion, compiled for scoring texts in batches.
 
+    The lexicon, negations, shortcuts and emojis are the ones of
+    text2emotion, under its MIT license (see emotion_lexicon.LICENSE in
+    the resources), and a text is scored the same way: its words are
+    normalized, stop words are dropped, the rest are lemmatized, and the
+    share of the words of each emotion is its score. The tokenizing is done
+    with a precompiled regex, and each distinct token is lemmatized and
+    looked up once, so a batch costs about a dict lookup per word.
 
-def score_comp(emotion_score: float, dominant_emotion: Emoticon, emotion: str,
-               code: str, flag: bool) -> DupEmotion:
+    The NLTK stop words and WordNet are loaded on first use, or by load.
     """
-    score comparison between emotions.
-    returns the dominant and if equals we flag it
-    """
-    if emotion_score > dominant_emotion.score:
-        flag = False
-        dominant_emotion = Emoticon(dominant=emotion, score=emotion_score,
-                                    code=code)
-    elif emotion_score == dominant_emotion.score:
-        flag = True
-    return DupEmotion(dominant=dominant_emotion, flag=flag)
+
+    def __init__(self, lexicon: Dict[str, Dict[str, str]]):
+        self.words = {
+            word: EMOTION_NAMES.index(emotion)
+            for word, emotion in lexicon["words"].items()
+        }
+        self.negations = {
+            word: emotion.lower()
+            for word, emotion in lexicon["negations"].items()
+        }
+        self.shortcuts = lexicon["shortcuts"]
+        self.emojis = str.maketrans({
+            emoji: f" {emotion.lower()} "
+            for emoji, emotion in lexicon["emojis"].items()
+        })
+        self.get_token_emotion = lru_cache(maxsize=TOKENS_CACHE_SIZE)(
+            self._get_token_emotion)
+        self._stopwords: Optional[frozenset] = None
+        self._lemmatizer = None
+
+    @classmethod
+    def from_file(cls, path=LEXICON_FILE) -> "EmotionLexicon":
+        with open(path, encoding="utf-8") as lexicon_file:
+            return cls(json.load(lexicon_file))
+
+    def load(self) -> None:
+        """Loads the NLTK stop words and WordNet, if they are not loaded."""
+        if self._lemmatizer is not None:
+            return
+        ensure_nltk_data("stopwords", "wordnet")
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+
+        self._stopwords = frozenset(stopwords.words())
+        self._lemmatizer = WordNetLemmatizer()
+
+    def _get_token_emotion(self, token: str) -> Optional[int]:
+        if self._lemmatizer is None:
+            self.load()
+        if (token.isdigit() or token in self._stopwords
+                or len(token) < MIN_WORD_LENGTH):
+            return None
+        lemma = self._lemmatizer.lemmatize(token, "v")
+        lemma = self._lemmatizer.lemmatize(lemma, "n")
+        return self.words.get(lemma)
+
+    def get_words(self, text: str) -> Iterable[str]:
+        """Yields the normalized words of a text."""
+        text = text.lower().translate(self.emojis)
+        text = URL_REGEX.sub("", text).replace("n't", " not")
+        words = []
+        for token in text.split():
+            words.extend(WORD_REGEX.findall(self.shortcuts.get(token, token)))
+        negated = False
+        for i, word in enumerate(words):
+            if negated:
+                negated = False
+                continue
+            if word.endswith("not") and i + 1 < len(words):
+                negation = self.negations.get(words[i + 1])
+                if negation is not None:
+                    # Like text2emotion, a negation glued to its word,
+                    # as in "cannot", replaces both words with nothing.
+                    negated = True
+                    if word == "not":
+                        yield negation
+                    continue
+            yield from SPLIT_WORDS.get(word, (word,))
+
+    def score(self, text: str) -> Scores:
+        """Returns the share of the words of each emotion in the text,
+        rounded to 2 digits, in the order of EMOTIONS."""
+        counts = [0] * len(EMOTIONS)
+        for word in self.get_words(text):
+            emotion = self.get_token_emotion(word)
+            if emotion is not None:
+                counts[emotion] += 1
+        total = sum(counts)
+        if not total:
+            return NO_SCORES
+        return tuple(round(count / total, 2) for count in counts)
+
+
+@lru_cache(maxsize=None)
+def get_lexicon() -> EmotionLexicon:
+    return EmotionLexicon.from_file()
+
+
+def has_text(text: Optional[str]) -> bool:
+    return text is not None and text.strip() != ""
+
+
+def get_weight(title_score: float, content_score: Optional[float]) -> float:
+    if content_score is None:
+        return title_score
+    return title_score * TITLE_WEIGHTS + content_score * CONTENT_WEIGHTS
+
+
+def _get_dominant(
+        title_scores: Scores, content_scores: Optional[Scores],
+) -> Emoticon:
+    if content_scores is None:
+        scores = title_scores
+    else:
+        scores = tuple(map(get_weight, title_scores, content_scores))
+    top = max(scores)
+    if scores.count(top) > 1:
+        return Emoticon(dominant=None, score=0, code=None)
+    emotion = scores.index(top)
+    return Emoticon(dominant=EMOTION_NAMES[emotion], score=top,
+                    code=EMOTION_CODES[emotion])
 
 
 def get_dominant_emotion(title: str, content: str) -> Emoticon:
@@ -46,24 +173,9 @@ def get_dominant_emotion(title: str, content: str) -> Emoticon:
     get text from event title and content and return
     the dominant emotion, emotion score and emoticon code
     """
-    dominant_emotion = Emoticon(dominant=None, score=0, code=None)
-    has_content = False
-    duplicate_dominant_flag = False
-    title_emotion = te.get_emotion(title)
-    if content is not None and content.strip() != "":
-        content_emotion = te.get_emotion(content)
-        has_content = True
-    for emotion, code in EMOTIONS.items():
-        weight_parameters = [emotion, title_emotion]
-        if has_content:
-            weight_parameters.append(content_emotion)
-        emotion_score = get_weight(*weight_parameters)
-        score_comparison = score_comp(emotion_score, dominant_emotion, emotion,
-                                      code, duplicate_dominant_flag)
-        dominant_emotion, duplicate_dominant_flag = [*score_comparison]
-    if duplicate_dominant_flag:
-        return Emoticon(dominant=None, score=0, code=None)
-    return dominant_emotion
+    lexicon = get_lexicon()
+    content_scores = lexicon.score(content) if has_text(content) else None
+    return _get_dominant(lexicon.score(title), content_scores)
 
 
 def is_emotion_above_significance(dominant_emotion: Emoticon,
@@ -89,3 +201,30 @@ def get_emotion(title: str, content: str) -> Union[str, None]:
     dominant = get_dominant_emotion(title, content)
     if is_emotion_above_significance(dominant):
         return get_html_emoticon(dominant)
+
+
+def get_emotions(
+        texts: Sequence[Tuple[str, Optional[str]]],
+) -> List[Optional[str]]:
+    """Returns the emoticon codes of (title, content) pairs.
+
+    Like get_emotion for each pair, but each distinct text of the batch is
+    scored once, which pays off for imports where titles repeat.
+    """
+    lexicon = get_lexicon()
+    scores: Dict[str, Scores] = {}
+
+    def score(text: str) -> Scores:
+        if text not in scores:
+            scores[text] = lexicon.score(text)
+        return scores[text]
+
+    codes = []
+    for title, content in texts:
+        dominant = _get_dominant(
+            score(title), score(content) if has_text(content) else None)
+        codes.append(
+            dominant.code if is_emotion_above_significance(dominant)
+            else None
+        )
+    return codes
@@ -0,0 +1,334 @@
+"""Emotion tagging of events in the background.
+
+Scoring the emotion of a text is CPU bound NLP, so it runs on a pool of
+worker processes instead of in the request. Events are saved with a NULL
+emotion, and once their session commits, the events that were added or
+whose title or content changed are scored and updated in batches. The
+scored batches are saved by a background thread, one at a time.
+
+The tagging hooks into every session once `register_listeners` is
+called, which the app does on startup. Scored events are marked with the
+time they were scored at, since most events have no dominant emotion, and
+the mark is cleared when their title or content change. Events that were
+never scored, such as events saved before the tagger existed, are scored
+in chunks by the backfill:
+
+    python -m app.internal.emotion_tagging --chunk-size 500
+"""
+import argparse
+from collections import deque
+from concurrent.futures import (
+    Future, ProcessPoolExecutor, ThreadPoolExecutor,
+)
+from datetime import datetime
+import threading
+from typing import (
+    Any, Deque, Iterable, Iterator, List, Optional, Sequence, Set, Tuple,
+)
+
+from loguru import logger
+from sqlalchemy import bindparam, event
+from sqlalchemy.engine import Connectable
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.database import SessionLocal
+from app.database.models import Event
+from app.internal.emotion import get_emotions
+from app.internal.event_changes import bump_events_versions
+
+EMOTION_TAGGING_WORKERS = 2
+EMOTION_BATCH_SIZE = 100
+EMOTION_BACKFILL_CHUNK_SIZE = 500
+PENDING_TAGS_KEY = "untagged_events"
+
+EventText = Tuple[int, str, Optional[str]]
+
+
+def score_emotions(
+        texts: Sequence[Tuple[str, Optional[str]]],
+) -> List[Optional[str]]:
+    """Returns the emoticon codes of (title, content) pairs.
+
+    Runs in the worker processes.
+    """
+    return get_emotions(texts)
+
+
+def _get_batches(
+        events: Iterable[EventText], size: int,
+) -> Iterator[List[EventText]]:
+    batch: List[EventText] = []
+    for event_text in events:
+        batch.append(event_text)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _save_emotions(
+        session: Session, ids: Sequence[int], codes: Sequence[Optional[str]],
+) -> None:
+    """Marks the events as scored, updates the emotions that changed in a
+    single executemany, and bumps the events versions of the users of the
+    events."""
+    events = Event.__table__
+    session.execute(
+        events.update()
+        .where(events.c.id.in_(ids))
+        .values(emotion_scored_at=datetime.utcnow())
+    )
+    result = session.execute(
+        events.update()
+        .where(events.c.id == bindparam("event_id"))
+        .where(events.c.emotion.is_distinct_from(bindparam("code")))
+        .values(emotion=bindparam("code")),
+        [
+            {"event_id": event_id, "code": code}
+            for event_id, code in zip(ids, codes)
+        ],
+    )
+    if result.rowcount != 0:  # Unknown rowcounts are -1.
+        bump_events_versions(session, event_ids=ids)
+    session.commit()
+
+
+class EmotionTagger:
+    """Scores the emotions of events on a pool of worker processes.
+
+    The pool is started on first use.
+
+    Args:
+        max_workers: Optional; The number of worker processes.
+            Defaults to EMOTION_TAGGING_WORKERS.
+        batch_size: Optional; The number of events scored per task.
+            Defaults to EMOTION_BATCH_SIZE.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = EMOTION_TAGGING_WORKERS,
+            batch_size: int = EMOTION_BATCH_SIZE,
+    ):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._saver: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Set[Future] = set()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            return self._executor
+
+    def _get_saver(self) -> ThreadPoolExecutor:
+        # The executor's done callbacks run on its management thread, so
+        # the batches are saved on a thread of their own.
+        with self._lock:
+            if self._saver is None:
+                self._saver = ThreadPoolExecutor(
+                    1, thread_name_prefix="emotion-saver")
+            return self._saver
+
+    def tag(self, bind: Connectable, events: Iterable[EventText]) -> None:
+        """Queues the scoring of committed events.
+
+        Each batch is saved with its own session once it is scored.
+
+        Args:
+            bind: The database the events are saved in.
+            events: The ID, title and content of each event.
+        """
+        for batch in _get_batches(events, self.batch_size):
+            ids = [event_id for event_id, _, _ in batch]
+            texts = [(title, content) for _, title, content in batch]
+            saved: Future = Future()
+            with self._lock:
+                self._pending.add(saved)
+            scored = self._get_executor().submit(score_emotions, texts)
+            scored.add_done_callback(
+                lambda scored, ids=ids, saved=saved:
+                self._get_saver().submit(
+                    self._save, bind, ids, scored, saved))
+
+    def _save(
+            self,
+            bind: Connectable,
+            ids: List[int],
+            scored: Future,
+            saved: Future,
+    ) -> None:
+        session = Session(bind=bind)
+        try:
+            _save_emotions(session, ids, scored.result())
+        except Exception as e:
+            session.rollback()
+            logger.exception(f"Tagging the emotions of {len(ids)} events "
+                             f"failed: {e}")
+        finally:
+            session.close()
+            with self._lock:
+                self._pending.discard(saved)
+            saved.set_result(None)
+
+    def wait(self) -> None:
+        """Blocks until the queued events are scored and saved."""
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+            for saved in pending:
+                saved.result()
+
+    def close(self) -> None:
+        """Waits for the queued events, and shuts down the worker processes
+        and the saver thread. They are started again on the next use."""
+        self.wait()
+        with self._lock:
+            executor, self._executor = self._executor, None
+            saver, self._saver = self._saver, None
+        if executor is not None:
+            executor.shutdown()
+        if saver is not None:
+            saver.shutdown()
+
+    def backfill(
+            self,
+            session: Session,
+            chunk_size: int = EMOTION_BACKFILL_CHUNK_SIZE,
+    ) -> int:
+        """Scores the events that were never scored, chunk by chunk.
+
+        The events are read in ID order, so each is scored once per run,
+        and a few chunks are scored while the previous ones are saved.
+
+        Args:
+            session: The database connection.
+            chunk_size: Optional; The number of events scored per task.
+                Defaults to EMOTION_BACKFILL_CHUNK_SIZE.
+
+        Returns:
+            The number of events scored.
+        """
+        in_flight: Deque[Tuple[List[int], Future]] = deque()
+        scored = 0
+        for chunk in _get_batches(
+                _iter_untagged_events(session, chunk_size), chunk_size):
+            ids = [event_id for event_id, _, _ in chunk]
+            texts = [(title, content) for _, title, content in chunk]
+            in_flight.append((
+                ids, self._get_executor().submit(score_emotions, texts),
+            ))
+            if len(in_flight) > self.max_workers:
+                scored += _save_scored(session, *in_flight.popleft())
+        while in_flight:
+            scored += _save_scored(session, *in_flight.popleft())
+        return scored
+
+
+def _iter_untagged_events(
+        session: Session, chunk_size: int,
+) -> Iterator[EventText]:
+    last_id = 0
+    while True:
+        chunk = (
+            session.query(Event.id, Event.title, Event.content)
+            .filter(Event.emotion_scored_at.is_(None), Event.id > last_id)
+            .order_by(Event.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1].id
+
+
+def _save_scored(session: Session, ids: List[int], scored: Future) -> int:
+    _save_emotions(session, ids, scored.result())
+    return len(ids)
+
+
+emotion_tagger = EmotionTagger()
+
+
+def _pending_tags(session: Session) -> List[EventText]:
+    return session.info.setdefault(PENDING_TAGS_KEY, [])
+
+
+def _has_changed_text(instance: Event) -> bool:
+    return any(
+        get_history(instance, attribute).has_changes()
+        for attribute in ("title", "content")
+    )
+
+
+def _clear_changed_scores(
+        session: Session, flush_context: Any, instances: Any,
+) -> None:
+    for instance in session.dirty:
+        if isinstance(instance, Event) and _has_changed_text(instance):
+            instance.emotion_scored_at = None
+
+
+def _collect_untagged_events(session: Session, flush_context: Any) -> None:
+    pending = _pending_tags(session)
+    for instance in session.new:
+        if isinstance(instance, Event) and instance.emotion is None:
+            pending.append((instance.id, instance.title, instance.content))
+    for instance in session.dirty:
+        if isinstance(instance, Event) and _has_changed_text(instance):
+            pending.append((instance.id, instance.title, instance.content))
+
+
+def _tag_committed_events(session: Session) -> None:
+    pending = session.info.pop(PENDING_TAGS_KEY, None)
+    if pending:
+        emotion_tagger.tag(session.get_bind(), pending)
+
+
+def _discard_untagged_events(session: Session) -> None:
+    session.info.pop(PENDING_TAGS_KEY, None)
+
+
+SESSION_LISTENERS = (
+    ("before_flush", _clear_changed_scores),
+    ("after_flush", _collect_untagged_events),
+    ("after_commit", _tag_committed_events),
+    ("after_rollback", _discard_untagged_events),
+)
+
+
+def register_listeners() -> None:
+    """Tags the events added or changed by every session once it commits.
+
+    Registering the listeners again has no effect.
+    """
+    for identifier, listener in SESSION_LISTENERS:
+        if not event.contains(Session, identifier, listener):
+            event.listen(Session, identifier, listener)
+
+
+def main(args: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Scores the emotions of the events never scored.")
+    parser.add_argument(
+        "--chunk-size", type=int, default=EMOTION_BACKFILL_CHUNK_SIZE,
+        help="The number of events scored per task.")
+    options = parser.parse_args(args)
+
+    session = SessionLocal()
+    try:
+        scored = emotion_tagger.backfill(session, options.chunk_size)
+    finally:
+        session.close()
+    logger.info(f"Scored the emotions of {scored} events")
+
+
+if __name__ == "__main__":
+    main()
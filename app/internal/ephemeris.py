@@ -0,0 +1,361 @@
+"""Sun and moon times and the moon phase, computed locally.
+
+The positions are the low precision ones of Astronomical Algorithms by
+Jean Meeus, as used by the suncalc library, and are accurate to about a
+minute for the sun and a few minutes for the moon, which is what a
+calendar shows. The times are returned in the timezone of the location.
+
+A single day is computed with get_astronomical_day, and a range of days,
+such as a month or a year, with get_astronomical_days, which computes the
+moon's altitude at each hour of the range once.
+"""
+from datetime import date, datetime, time, timedelta, tzinfo
+from math import acos, asin, atan2, cos, pi, sin, sqrt, tan
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pytz
+
+RAD = pi / 180
+DAY_SECONDS = 60 * 60 * 24
+J1970 = 2440588
+J2000 = 2451545
+J0 = 0.0009
+OBLIQUITY = RAD * 23.4397
+SUN_DISTANCE_KM = 149598000
+SUNRISE_ALTITUDE = RAD * -0.833
+MOONRISE_ALTITUDE = RAD * 0.133
+MOON_PHASES = (
+    "New Moon",
+    "Waxing Crescent",
+    "First Quarter",
+    "Waxing Gibbous",
+    "Full Moon",
+    "Waning Gibbous",
+    "Last Quarter",
+    "Waning Crescent",
+)
+
+AstronomicalDay = NamedTuple("AstronomicalDay", [
+    ("date", date),
+    ("sunrise", Optional[datetime]),
+    ("sunset", Optional[datetime]),
+    ("moonrise", Optional[datetime]),
+    ("moonset", Optional[datetime]),
+    ("moon_phase", str),
+    ("moon_illumination", int),
+])
+
+
+def _to_days(moment: datetime) -> float:
+    """Returns the days since J2000 of an aware datetime."""
+    return moment.timestamp() / DAY_SECONDS - 0.5 + J1970 - J2000
+
+
+def _from_julian(julian: float) -> datetime:
+    return datetime.fromtimestamp(
+        (julian + 0.5 - J1970) * DAY_SECONDS, pytz.utc)
+
+
+def _right_ascension(longitude: float, latitude: float) -> float:
+    return atan2(
+        sin(longitude) * cos(OBLIQUITY) - tan(latitude) * sin(OBLIQUITY),
+        cos(longitude),
+    )
+
+
+def _declination(longitude: float, latitude: float) -> float:
+    return asin(
+        sin(latitude) * cos(OBLIQUITY)
+        + cos(latitude) * sin(OBLIQUITY) * sin(longitude)
+    )
+
+
+def _altitude(hour_angle: float, phi: float, declination: float) -> float:
+    return asin(
+        sin(phi) * sin(declination)
+        + cos(phi) * cos(declination) * cos(hour_angle)
+    )
+
+
+def _sidereal_time(days: float, west_longitude: float) -> float:
+    return RAD * (280.16 + 360.9856235 * days) - west_longitude
+
+
+def _refraction(altitude: float) -> float:
+    altitude = max(altitude, 0)
+    return 0.0002967 / tan(altitude + 0.00312536 / (altitude + 0.08901179))
+
+
+def _solar_mean_anomaly(days: float) -> float:
+    return RAD * (357.5291 + 0.98560028 * days)
+
+
+def _ecliptic_longitude(mean_anomaly: float) -> float:
+    center = RAD * (
+        1.9148 * sin(mean_anomaly)
+        + 0.02 * sin(2 * mean_anomaly)
+        + 0.0003 * sin(3 * mean_anomaly)
+    )
+    perihelion = RAD * 102.9372
+    return mean_anomaly + center + perihelion + pi
+
+
+def _sun_coordinates(days: float) -> Tuple[float, float]:
+    """Returns the right ascension and declination of the sun."""
+    longitude = _ecliptic_longitude(_solar_mean_anomaly(days))
+    return _right_ascension(longitude, 0), _declination(longitude, 0)
+
+
+def _moon_coordinates(days: float) -> Tuple[float, float, float]:
+    """Returns the right ascension, declination and distance in km of the
+    moon."""
+    mean_longitude = RAD * (218.316 + 13.176396 * days)
+    mean_anomaly = RAD * (134.963 + 13.064993 * days)
+    mean_distance = RAD * (93.272 + 13.229350 * days)
+    longitude = mean_longitude + RAD * 6.289 * sin(mean_anomaly)
+    latitude = RAD * 5.128 * sin(mean_distance)
+    distance = 385001 - 20905 * cos(mean_anomaly)
+    return (
+        _right_ascension(longitude, latitude),
+        _declination(longitude, latitude),
+        distance,
+    )
+
+
+def get_sun_times(
+        day: date, lat: float, lon: float, tz: tzinfo = pytz.utc,
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Returns the sunrise and sunset of a day at a location.
+
+    Args:
+        day: The local date.
+        lat: The latitude in degrees, north positive.
+        lon: The longitude in degrees, east positive.
+        tz: Optional; The timezone of the location. Defaults to UTC.
+
+    Returns:
+        The sunrise and the sunset in the timezone, or None for both if the
+        sun does not rise or does not set that day.
+    """
+    west_longitude = RAD * -lon
+    phi = RAD * lat
+    noon = _localize(tz, datetime.combine(day, time(12)))
+    cycle = round(_to_days(noon) - J0 - west_longitude / (2 * pi))
+    approximate_noon = J0 + west_longitude / (2 * pi) + cycle
+    mean_anomaly = _solar_mean_anomaly(approximate_noon)
+    longitude = _ecliptic_longitude(mean_anomaly)
+    declination = _declination(longitude, 0)
+    solar_noon = _solar_transit(approximate_noon, mean_anomaly, longitude)
+
+    cos_hour_angle = (
+        (sin(SUNRISE_ALTITUDE) - sin(phi) * sin(declination))
+        / (cos(phi) * cos(declination))
+    )
+    if not -1 <= cos_hour_angle <= 1:
+        return None, None
+    hour_angle = acos(cos_hour_angle)
+    sunset = _solar_transit(
+        J0 + (hour_angle + west_longitude) / (2 * pi) + cycle,
+        mean_anomaly, longitude,
+    )
+    sunrise = solar_noon - (sunset - solar_noon)
+    return (
+        _from_julian(sunrise).astimezone(tz),
+        _from_julian(sunset).astimezone(tz),
+    )
+
+
+def _solar_transit(
+        days: float, mean_anomaly: float, longitude: float,
+) -> float:
+    return (
+        J2000 + days + 0.0053 * sin(mean_anomaly)
+        - 0.0069 * sin(2 * longitude)
+    )
+
+
+def get_moon_altitude(moment: datetime, lat: float, lon: float) -> float:
+    """Returns the altitude in radians of the moon, with refraction."""
+    days = _to_days(moment)
+    right_ascension, declination, _ = _moon_coordinates(days)
+    hour_angle = _sidereal_time(days, RAD * -lon) - right_ascension
+    altitude = _altitude(hour_angle, RAD * lat, declination)
+    return altitude + _refraction(altitude)
+
+
+def get_moon_illumination(moment: datetime) -> Tuple[float, float]:
+    """Returns the phase and the illuminated fraction of the moon.
+
+    The phase goes from 0 at the new moon, through 0.5 at the full moon,
+    to 1 at the next new moon.
+    """
+    days = _to_days(moment)
+    sun_ra, sun_dec = _sun_coordinates(days)
+    moon_ra, moon_dec, moon_distance = _moon_coordinates(days)
+    elongation = acos(
+        sin(sun_dec) * sin(moon_dec)
+        + cos(sun_dec) * cos(moon_dec) * cos(sun_ra - moon_ra)
+    )
+    incidence = atan2(
+        SUN_DISTANCE_KM * sin(elongation),
+        moon_distance - SUN_DISTANCE_KM * cos(elongation),
+    )
+    angle = atan2(
+        cos(sun_dec) * sin(sun_ra - moon_ra),
+        sin(sun_dec) * cos(moon_dec)
+        - cos(sun_dec) * sin(moon_dec) * cos(sun_ra - moon_ra),
+    )
+    fraction = (1 + cos(incidence)) / 2
+    sign = -1 if angle < 0 else 1
+    phase = 0.5 + 0.5 * incidence * sign / pi
+    return phase, fraction
+
+
+def get_moon_phase_name(phase: float) -> str:
+    """Returns the name of the eighth of the lunar cycle of a phase."""
+    return MOON_PHASES[int(phase * len(MOON_PHASES) + 0.5) % len(MOON_PHASES)]
+
+
+class _MoonAltitudes:
+    """The moon's altitudes at a location, computed once per moment."""
+
+    def __init__(self, lat: float, lon: float):
+        self.lat = lat
+        self.lon = lon
+        self._altitudes: Dict[float, float] = {}
+
+    def __call__(self, moment: datetime) -> float:
+        key = moment.timestamp()
+        if key not in self._altitudes:
+            self._altitudes[key] = (
+                get_moon_altitude(moment, self.lat, self.lon)
+                - MOONRISE_ALTITUDE
+            )
+        return self._altitudes[key]
+
+
+def _get_moon_times(
+        midnight: datetime, altitudes: _MoonAltitudes,
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Finds the moonrise and moonset in the 24 hours after midnight, by
+    fitting a parabola to the altitudes of each 2 hours."""
+    def hours_after(hours: float) -> datetime:
+        return midnight + timedelta(hours=hours)
+
+    rise = set_ = None
+    previous = altitudes(midnight)
+    for hour in range(1, 24, 2):
+        middle = altitudes(hours_after(hour))
+        following = altitudes(hours_after(hour + 1))
+        a = (previous + following) / 2 - middle
+        b = (following - previous) / 2
+        discriminant = b * b - 4 * a * middle
+        if a != 0 and discriminant >= 0:
+            extremum = -b / (2 * a)
+            extremum_altitude = (a * extremum + b) * extremum + middle
+            dx = sqrt(discriminant) / (abs(a) * 2)
+            first, second = extremum - dx, extremum + dx
+            roots = (abs(first) <= 1) + (abs(second) <= 1)
+            if first < -1:
+                first = second
+            if roots == 1:
+                if previous < 0:
+                    rise = hour + first
+                else:
+                    set_ = hour + first
+            elif roots == 2:
+                rising_first = extremum_altitude >= 0
+                rise = hour + (first if rising_first else second)
+                set_ = hour + (second if rising_first else first)
+        if rise is not None and set_ is not None:
+            break
+        previous = following
+    return (
+        None if rise is None else hours_after(rise),
+        None if set_ is None else hours_after(set_),
+    )
+
+
+def get_moon_times(
+        day: date, lat: float, lon: float, tz: tzinfo = pytz.utc,
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Returns the moonrise and moonset of a day at a location.
+
+    Args:
+        day: The local date.
+        lat: The latitude in degrees, north positive.
+        lon: The longitude in degrees, east positive.
+        tz: Optional; The timezone of the location. Defaults to UTC.
+
+    Returns:
+        The moonrise and the moonset in the timezone. Either is None if
+        the moon does not rise or set that day.
+    """
+    midnight = _localize(tz, datetime.combine(day, time.min))
+    return _get_moon_times(midnight, _MoonAltitudes(lat, lon))
+
+
+def _localize(tz: tzinfo, moment: datetime) -> datetime:
+    if hasattr(tz, "localize"):
+        return tz.localize(moment)
+    return moment.replace(tzinfo=tz)
+
+
+def _get_day(
+        day: date, lat: float, lon: float, tz: tzinfo,
+        altitudes: _MoonAltitudes,
+) -> AstronomicalDay:
+    sunrise, sunset = get_sun_times(day, lat, lon, tz)
+    midnight = _localize(tz, datetime.combine(day, time.min))
+    moonrise, moonset = _get_moon_times(
+        midnight.astimezone(pytz.utc), altitudes)
+    phase, fraction = get_moon_illumination(midnight + timedelta(hours=12))
+    return AstronomicalDay(
+        date=day,
+        sunrise=sunrise,
+        sunset=sunset,
+        moonrise=None if moonrise is None else moonrise.astimezone(tz),
+        moonset=None if moonset is None else moonset.astimezone(tz),
+        moon_phase=get_moon_phase_name(phase),
+        moon_illumination=round(fraction * 100),
+    )
+
+
+def get_astronomical_day(
+        day: date, lat: float, lon: float, tz: tzinfo = pytz.utc,
+) -> AstronomicalDay:
+    """Returns the sun and moon times and the moon phase of a day.
+
+    The moon phase and illumination are the ones of local noon.
+
+    Args:
+        day: The local date.
+        lat: The latitude in degrees, north positive.
+        lon: The longitude in degrees, east positive.
+        tz: Optional; The timezone of the location. Defaults to UTC.
+    """
+    return _get_day(day, lat, lon, tz, _MoonAltitudes(lat, lon))
+
+
+def get_astronomical_days(
+        start: date, end: date, lat: float, lon: float,
+        tz: tzinfo = pytz.utc,
+) -> List[AstronomicalDay]:
+    """Returns the sun and moon times and the moon phase of each day from
+    start to end, inclusive.
+
+    The moon's altitude at the midnight between two days is computed once
+    for both, so a range costs less than its days one by one.
+
+    Args:
+        start: The first local date.
+        end: The last local date.
+        lat: The latitude in degrees, north positive.
+        lon: The longitude in degrees, east positive.
+        tz: Optional; The timezone of the location. Defaults to UTC.
+    """
+    altitudes = _MoonAltitudes(lat, lon)
+    return [
+        _get_day(start + timedelta(days=offset), lat, lon, tz, altitudes)
+        for offset in range((end - start).days + 1)
+    ]
@@ -0,0 +1,108 @@
+"""Per-user versions of the events.
+
+Output derived from a user's events, such as rendered calendar fragments,
+can be cached under the user's events version, and is invalidated by any
+committed write to the events the user takes part in.
+
+Each user's version, and the UTC time of its last change, are stored in
+the users table and bumped in the transaction of the writes to the
+events, so they are shared by every worker of the app and survive
+restarts. Adding or removing a user from an event bumps that user's
+version, and creating, updating or deleting an event bumps the versions
+of its owner and participants. Bulk query writes may touch events of
+many users, so they bump every user's version.
+"""
+from datetime import datetime
+import itertools
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.database.models import Event, User, UserEvent
+
+EventsVersion = NamedTuple("EventsVersion", [
+    ("version", int), ("changed_at", Optional[datetime])])
+
+
+def get_events_version(session: Session, user_id: int) -> EventsVersion:
+    """Returns the stored version of the user's events, and the UTC time
+    of their last change."""
+    row = session.query(User.events_version, User.events_changed_at).filter(
+        User.id == user_id).first()
+    if row is None:
+        return EventsVersion(0, None)
+    return EventsVersion(row.events_version, row.events_changed_at)
+
+
+def bump_events_versions(
+        session: Session,
+        user_ids: Iterable[int] = (),
+        event_ids: Iterable[int] = (),
+        all_users: bool = False,
+) -> None:
+    """Bumps the stored versions of the users, and of the owners and
+    participants of the events, in the session's transaction."""
+    users = User.__table__
+    statement = users.update().values(
+        events_version=users.c.events_version + 1,
+        events_changed_at=datetime.utcnow(),
+    )
+    if not all_users:
+        user_ids, event_ids = set(user_ids), set(event_ids)
+        conditions = []
+        if user_ids:
+            conditions.append(users.c.id.in_(user_ids))
+        if event_ids:
+            events, user_event = Event.__table__, UserEvent.__table__
+            conditions.append(users.c.id.in_(
+                select([events.c.owner_id])
+                .where(events.c.id.in_(event_ids))))
+            conditions.append(users.c.id.in_(
+                select([user_event.c.user_id])
+                .where(user_event.c.event_id.in_(event_ids))))
+        if not conditions:
+            return
+        statement = statement.where(or_(*conditions))
+    session.connection().execute(statement)
+
+
+def _get_changed_rows(session: Session) -> Iterator[Tuple[str, int]]:
+    """Yields the users and events changed by a flush, as ("user", ID) and
+    ("event", ID)."""
+    for instance in itertools.chain(session.new, session.deleted):
+        if isinstance(instance, UserEvent):
+            yield "user", instance.user_id
+        elif isinstance(instance, Event):
+            yield "user", instance.owner_id
+    for instance in session.dirty:
+        if not isinstance(instance, (Event, UserEvent)):
+            continue
+        if not session.is_modified(instance):
+            continue
+        if isinstance(instance, Event):
+            yield "event", instance.id
+            owner_ids = get_history(instance, "owner_id")
+            for owner_id in itertools.chain(*owner_ids):
+                yield "user", owner_id
+        else:
+            user_ids = get_history(instance, "user_id")
+            for user_id in itertools.chain(*user_ids):
+                yield "user", user_id
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_versions(session: Session, flush_context) -> None:
+    changed: Dict[str, Set[int]] = {"user": set(), "event": set()}
+    for kind, row_id in _get_changed_rows(session):
+        if row_id is not None:
+            changed[kind].add(row_id)
+    bump_events_versions(session, changed["user"], changed["event"])
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _bump_bulk_versions(context) -> None:
+    if context.mapper.class_ in (Event, UserEvent):
+        bump_events_versions(context.session, all_users=True)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Iterable, List, Optional, Tuple
+
+from app.database.models import Event
+
+# A zero length event is stored as lasting one tick, so it overlaps a range
+# exactly when it starts inside it, like in `get_user_events_in_range`.
+ZERO_LENGTH_DURATION = timedelta(microseconds=1)
+
+Interval = Tuple[datetime, datetime, int, Event]
+
+
+class _Node:
+    """A node of a centered interval tree.
+
+    Holds the intervals that contain the node center, sorted once by start
+    and once by end (descending), and the subtrees of the intervals that
+    end before the center or start after it.
+    """
+
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(
+            self,
+            center: datetime,
+            intervals: List[Interval],
+            left: Optional[_Node],
+            right: Optional[_Node],
+    ):
+        self.center = center
+        self.by_start = sorted(intervals, key=itemgetter(0))
+        self.by_end = sorted(intervals, key=itemgetter(1), reverse=True)
+        self.left = left
+        self.right = right
+
+
+def _build(intervals: List[Interval]) -> Optional[_Node]:
+    if not intervals:
+        return None
+    starts = sorted(interval[0] for interval in intervals)
+    center = starts[len(starts) // 2]
+    left, here, right = [], [], []
+    for interval in intervals:
+        start, end = interval[0], interval[1]
+        if end <= center:
+            left.append(interval)
+        elif start > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+    return _Node(center, here, _build(left), _build(right))
+
+
+class EventIntervalIndex:
+    """An in-memory index of events by their time span.
+
+    Built once from the result of a range query, it answers "which events
+    overlap [start, end)" in O(log n + k) instead of scanning every event,
+    which is what the multi-day views need when bucketing events per day.
+
+    Args:
+        events: The events to index.
+    """
+
+    def __init__(self, events: Iterable[Event]):
+        intervals = []
+        for position, event in enumerate(events):
+            end = max(event.end, event.start + ZERO_LENGTH_DURATION)
+            intervals.append((event.start, end, position, event))
+        self._size = len(intervals)
+        self._root = _build(intervals)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Event]:
+        """Returns the events overlapping [start, end), sorted by start."""
+        found: List[Interval] = []
+        node = self._root
+        stack = []
+        while node is not None or stack:
+            if node is None:
+                node = stack.pop()
+            if end <= node.center:
+                for interval in node.by_start:
+                    if interval[0] >= end:
+                        break
+                    found.append(interval)
+                node = node.left
+            elif start > node.center:
+                for interval in node.by_end:
+                    if interval[1] <= start:
+                        break
+                    found.append(interval)
+                node = node.right
+            else:
+                found.extend(node.by_start)
+                if node.right is not None:
+                    stack.append(node.right)
+                node = node.left
+        found.sort(key=itemgetter(0, 2))
+        return [interval[3] for interval in found]
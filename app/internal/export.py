@@ -1,14 +1,19 @@
+from collections import defaultdict
 from datetime import datetime
-from typing import List
+from itertools import islice
+from typing import DefaultDict, Iterable, Iterator, List, Optional
 
 from icalendar import Calendar, Event as IEvent, vCalAddress, vText
 import pytz
 from sqlalchemy.orm import Session
 
 from app.config import DOMAIN, ICAL_VERSION, PRODUCT_ID
-from app.database.models import Event
+from app.database.models import Event, User, UserEvent
 from app.internal.email import verify_email_pattern
-from app.routers.event import get_attendees_email
+from app.routers.user import get_user_events_starting_in_range_query
+
+EXPORT_BATCH_SIZE = 1000
+ICALENDAR_END = b"END:VCALENDAR\r\n"
 
 
 def get_icalendar(event: Event, emails: List[str]) -> bytes:
@@ -46,15 +51,100 @@ def get_icalendar_with_multiple_events(
         An iCalendar that can be used as a string for a file.
     """
     icalendar = _create_icalendar()
+    attendees = _get_attendees_emails(session, [event.id for event in events])
     for event in events:
-        emails = get_attendees_email(session, event)
-        emails.remove((event.owner.email,))
+        emails = _get_invitees(attendees[event.id], event.owner.email)
         ievent = _get_icalendar_event(event, emails)
         icalendar.add_component(ievent)
 
     return icalendar.to_ical()
 
 
+def iter_user_icalendar(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Yields an iCalendar of the user's events in chunks of bytes.
+
+    The events starting in [start, end) are streamed with their owner's
+    email in one query, using a server-side cursor where the database
+    supports it. The attendees are fetched with one query per batch of
+    events, and each batch is yielded as its VEVENT blocks, so only one
+    batch is held in memory.
+
+    Args:
+        session: The database connection.
+        user_id: The user's ID.
+        start: Optional; The start of the range. Open if missing.
+        end: Optional; The end of the range. Open if missing.
+        batch_size: Optional; The number of events fetched at once.
+            Defaults to EXPORT_BATCH_SIZE.
+
+    Yields:
+        The iCalendar header, the events in batches, and the footer.
+    """
+    rows = iter(
+        get_user_events_starting_in_range_query(session, user_id, start, end)
+        .join(User, User.id == Event.owner_id)
+        .with_entities(
+            Event.id, Event.title, Event.start, Event.end,
+            Event.location, Event.content, User.email.label("owner_email"),
+        )
+        .yield_per(batch_size)
+    )
+    yield _get_icalendar_header()
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        attendees = _get_attendees_emails(session, [row.id for row in batch])
+        yield b"".join(
+            _get_icalendar_event(
+                row,
+                _get_invitees(attendees[row.id], row.owner_email),
+                row.owner_email,
+            ).to_ical()
+            for row in batch
+        )
+    yield ICALENDAR_END
+
+
+def _get_icalendar_header() -> bytes:
+    """Returns the start of an iCalendar, before its events."""
+    icalendar = _create_icalendar().to_ical()
+    return icalendar[:-len(ICALENDAR_END)]
+
+
+def _get_attendees_emails(
+        session: Session, event_ids: List[int],
+) -> DefaultDict[int, List[str]]:
+    """Returns the emails of the users of each event, in one query.
+
+    Args:
+        session: The database connection.
+        event_ids: The events' IDs.
+
+    Returns:
+        The emails of the users of each event, by the event ID.
+    """
+    emails: DefaultDict[int, List[str]] = defaultdict(list)
+    if not event_ids:
+        return emails
+    rows = (
+        session.query(UserEvent.event_id, User.email)
+        .join(User, User.id == UserEvent.user_id)
+        .filter(UserEvent.event_id.in_(event_ids))
+    )
+    for event_id, email in rows:
+        emails[event_id].append(email)
+    return emails
+
+
+def _get_invitees(emails: Iterable[str], owner_email: str) -> List[str]:
+    """Returns the emails of the users of an event, except the owner."""
+    return [email for email in emails if email != owner_email]
+
+
 def _create_icalendar() -> Calendar:
     """Returns an iCalendar."""
     calendar = Calendar()
@@ -64,35 +154,48 @@ def _create_icalendar() -> Calendar:
     return calendar
 
 
-def _get_icalendar_event(event: Event, emails: List[str]) -> IEvent:
+def _get_icalendar_event(
+        event: Event,
+        emails: List[str],
+        organizer_email: Optional[str] = None,
+) -> IEvent:
     """Returns an iCalendar event in bytes.
 
     Builds an iCalendar event with information from the Event object.
     and a list of emails.
 
     Args:
-        event: The Event.
+        event: The Event, or a row of its columns.
         emails: A list of emails.
+        organizer_email: Optional; The email of the event owner.
+            Defaults to the email of `event.owner`.
 
     Returns:
         A iCalendar that can be used as a string for a file.
     """
-    ievent = _create_icalendar_event(event)
+    ievent = _create_icalendar_event(event, organizer_email)
     _add_attendees(ievent, emails)
     return ievent
 
 
-def _create_icalendar_event(event: Event) -> IEvent:
+def _create_icalendar_event(
+        event: Event, organizer_email: Optional[str] = None,
+) -> IEvent:
     """Returns an iCalendar event with event data.
 
     Args:
-        event: The Event to transform into an iCalendar event.
+        event: The Event to transform into an iCalendar event,
+            or a row of its columns.
+        organizer_email: Optional; The email of the event owner.
+            Defaults to the email of `event.owner`.
 
     Returns:
         An iCalendar event.
     """
+    if organizer_email is None:
+        organizer_email = event.owner.email
     data = [
-        ('organizer', _get_v_cal_address(event.owner.email, organizer=True)),
+        ('organizer', _get_v_cal_address(organizer_email, organizer=True)),
         ('uid', _generate_id(event)),
         ('dtstart', event.start),
         ('dtstamp', datetime.now(tz=pytz.utc)),
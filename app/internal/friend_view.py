@@ -3,8 +3,7 @@
 from sqlalchemy.orm import Session
 
 from app.database.models import Event
-from app.routers.event import sort_by_date
-from app.routers.user import get_all_user_events
+from app.routers.user import get_user_events_in_range
 
 
 def get_events_per_friend(
@@ -17,7 +16,7 @@ def get_events_per_friend(
     show all events where we are both in the invitees list"""
 
     events_together = []
-    sorted_events = sort_by_date(get_all_user_events(session, user_id))
+    sorted_events = get_user_events_in_range(session, user_id)
     for event in sorted_events:
         if my_friend in event.invitees.split(','):
             events_together.append(event)
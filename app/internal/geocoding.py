@@ -0,0 +1,44 @@
+"""A local table of named locations.
+
+Features that compute data from coordinates, such as the sun and moon
+times, look the location names up here instead of calling a geocoding
+service. The table is app/resources/locations.json, and a location is
+found by its name or one of its aliases, ignoring case, spaces and
+punctuation.
+"""
+from functools import lru_cache
+import json
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from app.config import RESOURCES_DIR
+
+LOCATIONS_FILE = RESOURCES_DIR / "locations.json"
+
+NOT_ALPHANUMERIC_REGEX = re.compile(r"[\W_]+")
+
+Location = NamedTuple("Location", [("name", str), ("region", str),
+                      ("country", str), ("lat", float), ("lon", float),
+                      ("tz_id", str)])
+
+
+def normalize_location_name(name: str) -> str:
+    return NOT_ALPHANUMERIC_REGEX.sub("", name.casefold())
+
+
+@lru_cache(maxsize=None)
+def _get_locations() -> Dict[str, Location]:
+    with open(LOCATIONS_FILE, encoding="utf-8") as locations_file:
+        rows: List[dict] = json.load(locations_file)
+    locations = {}
+    for row in rows:
+        aliases = row.pop("aliases", [])
+        location = Location(**row)
+        for name in (location.name, *aliases):
+            locations[normalize_location_name(name)] = location
+    return locations
+
+
+def get_location(name: str) -> Optional[Location]:
+    """Returns the location of a name, or None if it is not in the table."""
+    return _get_locations().get(normalize_location_name(name))
@@ -1,29 +1,65 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+from http import HTTPStatus
+from queue import Full, Queue
+import threading
+from typing import (
+    Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set,
+)
+
 from fastapi import Depends
 
 from google.auth.transport.requests import Request as google_request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-
-from app.database.models import Event, User, OAuthCredentials, UserEvent
+from googleapiclient.discovery import build, Resource
+from googleapiclient.errors import HttpError
+from loguru import logger
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+
+from app.database.models import (
+    Event, GoogleEvent, GoogleSyncState, User, OAuthCredentials, UserEvent,
+)
 from app.dependencies import get_db, SessionLocal
 from app.config import CLIENT_SECRET_FILE
-from app.routers.event import create_event
+from app.internal.credentials_cache import CredentialsCache, needs_refresh
+from app.routers.event_images import get_event_flair
 
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
+GOOGLE_EVENTS_PAGE_SIZE = 250
+GOOGLE_EVENT_CANCELLED = 'cancelled'
+GOOGLE_SYNC_WORKERS = 4
+GOOGLE_SYNC_QUEUE_SIZE = 8
+GOOGLE_SYNC_PUT_TIMEOUT = 0.1
+PRIMARY_CALENDAR = 'primary'
+
+credentials_cache = CredentialsCache()
 
 
 def get_credentials(user: User,
                     session: SessionLocal = Depends(get_db)) -> Credentials:
-    credentials = get_credentials_from_db(user)
+    '''Returns the user's valid credentials.
 
-    if credentials is not None:
-        credentials = refresh_token(credentials, session, user)
-    else:
-        credentials = get_credentials_from_consent_screen(
-            user=user, session=session)
+    Cached credentials are returned as long as their token is not about to
+    expire. Otherwise they are loaded, and refreshed if needed, under the
+    user's lock, so concurrent syncs of a user refresh the token once.
+    '''
+    with credentials_cache.lock(user.id):
+        credentials = credentials_cache.get(user.id)
+        if credentials is not None:
+            return credentials
+
+        credentials = get_credentials_from_db(user)
+
+        if credentials is not None:
+            credentials = refresh_token(credentials, user, session)
+        else:
+            credentials = get_credentials_from_consent_screen(
+                user=user, session=session)
 
     return credentials
 
@@ -31,8 +67,291 @@ def get_credentials(user: User,
 def fetch_save_events(credentials: Credentials, user: User,
                       session: SessionLocal = Depends(get_db)) -> None:
     if credentials is not None:
-        events = get_current_year_events(credentials, user, session)
-        push_events_to_db(events, user, session)
+        sync_calendars(
+            partial(get_calendar_service, credentials), user, session)
+
+
+def get_calendar_service(credentials: Credentials) -> Resource:
+    return build('calendar', 'v3', credentials=credentials)
+
+
+class GoogleEventsPage(NamedTuple):
+    '''A page of the changed events of a calendar, or its fetch error.'''
+    calendar_id: str
+    items: List[Dict[str, Any]]
+    full_sync: bool
+    next_sync_token: Optional[str] = None
+    is_last: bool = False
+    error: Optional[Exception] = None
+
+
+def sync_calendars(get_service: Callable[[], Resource], user: User,
+                   session: SessionLocal = Depends(get_db),
+                   max_workers: int = GOOGLE_SYNC_WORKERS) -> None:
+    '''Syncs the user's events with the changes in all their calendars.
+
+    The calendars are fetched concurrently on a bounded pool of threads,
+    each with its own service, since the services are not thread safe.
+    The pages are streamed through a bounded queue into the upserts, which
+    run on the calling thread with its session. Each calendar is committed
+    with its sync token once its last page is saved, and a calendar that
+    fails to fetch keeps its previous token.
+
+    Args:
+        get_service: Returns a new Calendar API service.
+        user: The user.
+        session: The database connection.
+        max_workers: Optional; The number of calendars fetched at once.
+            Defaults to GOOGLE_SYNC_WORKERS.
+    '''
+    calendar_ids = list_calendar_ids(get_service())
+    states = {
+        state.calendar_id: state
+        for state in session.query(GoogleSyncState).filter_by(user_id=user.id)
+    }
+    pages: Queue = Queue(maxsize=GOOGLE_SYNC_QUEUE_SIZE)
+    stop = threading.Event()
+    thread_data = threading.local()
+
+    def put(page: GoogleEventsPage) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=GOOGLE_SYNC_PUT_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def fetch(calendar_id: str, sync_token: Optional[str]) -> None:
+        try:
+            if not hasattr(thread_data, 'service'):
+                thread_data.service = get_service()
+            for page in iter_changed_events_pages(
+                    thread_data.service, calendar_id, sync_token):
+                if not put(page):
+                    return
+        except Exception as e:
+            put(GoogleEventsPage(calendar_id, [], False, is_last=True,
+                                 error=e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for calendar_id in calendar_ids:
+            state = states.get(calendar_id)
+            sync_token = state.sync_token if state else None
+            executor.submit(fetch, calendar_id, sync_token)
+        try:
+            _save_pages(pages, len(calendar_ids), states, user, session)
+        finally:
+            stop.set()
+
+
+def _save_pages(pages: Queue, calendars: int,
+                states: Dict[str, GoogleSyncState], user: User,
+                session: SessionLocal) -> None:
+    '''Upserts the pages of the calendars as they are fetched.'''
+    synced_ids: Dict[str, Set[int]] = defaultdict(set)
+    while calendars:
+        page = pages.get()
+        if page.error is not None:
+            # The pages saved so far are kept, since upserts are idempotent,
+            # and the calendar is synced again from its previous token.
+            logger.error(f'Google Calendar {page.calendar_id} sync failed: '
+                         f'{page.error}')
+            synced_ids.pop(page.calendar_id, None)
+            calendars -= 1
+            continue
+
+        links = save_google_events(
+            page.items, user, session, page.calendar_id)
+        session.flush()
+        synced_ids[page.calendar_id].update(link.event.id for link in links)
+        if not page.is_last:
+            continue
+
+        if page.full_sync:
+            delete_stale_google_events(
+                user, session, page.calendar_id,
+                synced_ids.pop(page.calendar_id))
+        state = states.get(page.calendar_id)
+        if state is None:
+            state = GoogleSyncState(
+                user_id=user.id, calendar_id=page.calendar_id)
+            session.add(state)
+            states[page.calendar_id] = state
+        state.sync_token = page.next_sync_token
+        state.synced_at = datetime.now()
+        session.commit()
+        calendars -= 1
+    session.commit()
+
+
+def list_calendar_ids(service: Resource) -> List[str]:
+    '''Returns the IDs of all the calendars in the user's calendar list.'''
+    calendar_list = service.calendarList()
+    request = calendar_list.list(maxResults=GOOGLE_EVENTS_PAGE_SIZE)
+    calendar_ids = []
+    while request is not None:
+        response = request.execute()
+        calendar_ids.extend(item['id'] for item in response.get('items', []))
+        request = calendar_list.list_next(request, response)
+    return calendar_ids or [PRIMARY_CALENDAR]
+
+
+def iter_changed_events_pages(
+        service: Resource, calendar_id: str = PRIMARY_CALENDAR,
+        sync_token: Optional[str] = None,
+) -> Iterator[GoogleEventsPage]:
+    '''Yields the pages of the calendar events changed since the sync token.
+
+    Without a sync token, or if Google no longer accepts it, the current
+    year events are yielded as a full sync. The last page holds the next
+    sync token.
+    '''
+    try:
+        yield from _iter_events_pages(service, calendar_id, sync_token)
+    except HttpError as e:
+        if sync_token is None or e.resp.status != HTTPStatus.GONE:
+            raise
+        yield from _iter_events_pages(service, calendar_id, None)
+
+
+def _iter_events_pages(
+        service: Resource, calendar_id: str, sync_token: Optional[str],
+) -> Iterator[GoogleEventsPage]:
+    if sync_token is None:
+        current_year = datetime.now().year
+        params = {
+            'timeMin': datetime(current_year, 1, 1).isoformat() + 'Z',
+            'timeMax': datetime(current_year + 1, 1, 1).isoformat() + 'Z',
+        }
+    else:
+        params = {'syncToken': sync_token}
+
+    events = service.events()
+    request = events.list(
+        calendarId=calendar_id,
+        singleEvents=True,
+        maxResults=GOOGLE_EVENTS_PAGE_SIZE,
+        **params,
+    )
+    while request is not None:
+        response = request.execute()
+        request = events.list_next(request, response)
+        yield GoogleEventsPage(
+            calendar_id=calendar_id,
+            items=response.get('items', []),
+            full_sync=sync_token is None,
+            next_sync_token=response.get('nextSyncToken'),
+            is_last=request is None,
+        )
+
+
+def save_google_events(events: List[Dict[str, Any]], user: User,
+                       session: SessionLocal = Depends(get_db),
+                       calendar_id: str = PRIMARY_CALENDAR,
+                       ) -> List[GoogleEvent]:
+    '''Upserts Google events by their Google event ID, without committing.
+
+    Cancelled events are deleted.
+
+    Returns:
+        The saved events' links to Google.
+    '''
+    links = {
+        link.google_event_id: link
+        for link in (
+            session.query(GoogleEvent)
+            .options(joinedload(GoogleEvent.event))
+            .filter(
+                GoogleEvent.user_id == user.id,
+                GoogleEvent.calendar_id == calendar_id,
+                GoogleEvent.google_event_id.in_(
+                    {event['id'] for event in events}),
+            )
+        )
+    }
+    synced_links = []
+
+    for google_event in events:
+        link = links.get(google_event['id'])
+        if google_event.get('status') == GOOGLE_EVENT_CANCELLED:
+            if link is not None:
+                session.delete(link.event)
+                del links[google_event['id']]
+            continue
+
+        data = get_google_event_data(google_event)
+        if link is None:
+            event = Event(
+                owner_id=user.id,
+                is_google_event=True,
+                **data,
+            )
+            link = GoogleEvent(
+                user_id=user.id,
+                calendar_id=calendar_id,
+                google_event_id=google_event['id'],
+                event=event,
+            )
+            session.add_all([
+                event, link, UserEvent(user_id=user.id, events=event),
+            ])
+            links[google_event['id']] = link
+            synced_links.append(link)
+            continue
+
+        synced_links.append(link)
+        event = link.event
+        for key, value in data.items():
+            setattr(event, key, value)
+
+    return synced_links
+
+
+def delete_stale_google_events(user: User, session: SessionLocal,
+                               calendar_id: str,
+                               synced_ids: Set[int]) -> None:
+    '''Deletes the calendar events that a full sync did not return.
+
+    Google events saved before they were linked to their calendar are
+    deleted too.
+    '''
+    stale_events = (
+        session.query(Event)
+        .outerjoin(GoogleEvent)
+        .filter(
+            Event.owner_id == user.id,
+            Event.is_google_event.is_(True),
+            or_(GoogleEvent.calendar_id == calendar_id,
+                GoogleEvent.id.is_(None)),
+        )
+    )
+    for event in stale_events:
+        if event.id not in synced_ids:
+            session.delete(event)
+
+
+def get_google_event_data(event: Dict[str, Any]) -> Dict[str, Any]:
+    '''Returns the columns of the Event of a Google event.'''
+    # support for all day events
+    if 'dateTime' in event['start']:
+        # This case handles part time events (not all day events)
+        start = datetime.fromisoformat(event['start']['dateTime'])
+        end = datetime.fromisoformat(event['end']['dateTime'])
+    else:
+        # This case handles all day events
+        start = datetime.strptime(event['start']['date'], '%Y-%m-%d')
+        end = datetime.strptime(event['end']['date'], '%Y-%m-%d')
+
+    title = event.get('summary')  # The Google event title
+    return {
+        'title': title,
+        'start': start,
+        'end': end,
+        # if Google Event has a location attached
+        'location': event.get('location'),
+        'flair': get_event_flair(title) if title else None,
+    }
 
 
 def clean_up_old_credentials_from_db(
@@ -67,20 +386,24 @@ def get_credentials_from_consent_screen(user: User,
 
 def push_credentials_to_db(credentials: Credentials, user: User,
                            session: SessionLocal = Depends(get_db)
-                           ) -> OAuthCredentials:
-
-    oauth_credentials = OAuthCredentials(
-        owner=user,
-        token=credentials.token,
-        refresh_token=credentials.refresh_token,
-        token_uri=credentials.token_uri,
-        client_id=credentials.client_id,
-        client_secret=credentials.client_secret,
-        expiry=credentials.expiry
-    )
+                           ) -> Credentials:
+    '''Saves the user's credentials in their single row, and caches them.'''
+    oauth_credentials = session.query(OAuthCredentials).filter_by(
+        user_id=user.id).first()
+
+    if oauth_credentials is None:
+        oauth_credentials = OAuthCredentials(user_id=user.id)
+        session.add(oauth_credentials)
+
+    oauth_credentials.token = credentials.token
+    oauth_credentials.refresh_token = credentials.refresh_token
+    oauth_credentials.token_uri = credentials.token_uri
+    oauth_credentials.client_id = credentials.client_id
+    oauth_credentials.client_secret = credentials.client_secret
+    oauth_credentials.expiry = credentials.expiry
 
-    session.add(oauth_credentials)
     session.commit()
+    credentials_cache.set(user.id, credentials)
     return credentials
 
 
@@ -88,88 +411,6 @@ def is_client_secret_none() -> bool:
     return CLIENT_SECRET_FILE is None
 
 
-def get_current_year_events(
-        credentials: Credentials, user: User,
-        session: SessionLocal = Depends(get_db)) -> list:
-    '''Getting user events from google calendar'''
-
-    current_year = datetime.now().year
-    start = datetime(current_year, 1, 1).isoformat() + 'Z'
-    end = datetime(current_year + 1, 1, 1).isoformat() + 'Z'
-
-    service = build('calendar', 'v3', credentials=credentials)
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=start,
-        timeMax=end,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    events = events_result.get('items', [])
-    return events
-
-
-def push_events_to_db(events: list, user: User,
-                      session: SessionLocal = Depends(get_db)) -> bool:
-    '''Adding google events to db'''
-    cleanup_user_google_calendar_events(user, session)
-
-    for event in events:
-        # Running over the events that have come from the API
-        title = event.get('summary')  # The Google event title
-
-        # support for all day events
-        if 'dateTime' in event['start']:
-            # This case handles part time events (not all day events)
-            start = datetime.fromisoformat(event['start']['dateTime'])
-            end = datetime.fromisoformat(event['end']['dateTime'])
-        else:
-            # This case handles all day events
-            start_in_str = event['start']['date']
-            start = datetime.strptime(start_in_str, '%Y-%m-%d')
-
-            end_in_str = event['end']['date']
-            end = datetime.strptime(end_in_str, '%Y-%m-%d')
-
-        # if Google Event has a location attached
-        location = event.get('location')
-
-        create_google_event(title, start, end, user, location, session)
-    return True
-
-
-def create_google_event(title: str, start: datetime,
-                        end: datetime, user: User, location: str,
-                        session: SessionLocal = Depends(get_db)) -> Event:
-    return create_event(
-        # creating an event obj and pushing it into the db
-        db=session,
-        title=title,
-        start=start,
-        end=end,
-        owner_id=user.id,
-        location=location,
-        is_google_event=True
-    )
-
-
-def cleanup_user_google_calendar_events(
-    user: User, session: SessionLocal = Depends(get_db)
-) -> bool:
-    '''removing all user google events so the next time will be syncronized'''
-
-    for user_event in user.events:
-        user_event_id = user_event.id
-        event = user_event.events
-        if event.is_google_event:
-            session.query(Event).filter_by(id=event.id).delete()
-            session.query(UserEvent).filter_by(id=user_event_id).delete()
-            session.commit()
-
-    return True
-
-
 def get_credentials_from_db(user: User) -> Credentials:
     '''bring user credential to use with google calendar api
     and save the credential in the db'''
@@ -193,21 +434,11 @@ def get_credentials_from_db(user: User) -> Credentials:
 def refresh_token(credentials: Credentials,
                   user: User, session: SessionLocal = Depends(get_db)
                   ) -> Credentials:
-
-    refreshed_credentials = credentials
-    if credentials.expired:
+    '''Refreshes the token shortly before it expires, and saves it.'''
+    if needs_refresh(credentials):
         credentials.refresh(google_request())
-        refreshed_credentials = OAuthCredentials(
-            owner=user,
-            token=credentials.token,
-            refresh_token=credentials.refresh_token,
-            token_uri=credentials.token_uri,
-            client_id=credentials.client_id,
-            client_secret=credentials.client_secret,
-            expiry=credentials.expiry
-        )
-
-        session.add(refreshed_credentials)
-        session.commit()
+        push_credentials_to_db(credentials, user, session)
+    else:
+        credentials_cache.set(user.id, credentials)
 
-    return refreshed_credentials
+    return credentials
@@ -0,0 +1,401 @@
+"""The HTTP client of the external services the app calls.
+
+A single client, with a pool of keep-alive connections, is shared for the
+lifetime of the app instead of a new connection per call. Each request
+goes through the policy of its service: a timeout, retries with
+exponential backoff, and a circuit breaker that fails fast while the
+service is down. A failed GET request is answered with the last successful
+response to it, if there is one. The latency and errors of each host are
+counted:
+
+    response = await http_client.request("astronomy", "GET", url)
+    response = http_client.request_sync("weather", "GET", url)
+"""
+import asyncio
+from collections import OrderedDict
+import threading
+import time
+from typing import (
+    Any, Callable, Dict, MutableMapping, NamedTuple, Optional, Tuple, Union,
+)
+from urllib.parse import urlsplit
+import weakref
+
+import httpx
+from loguru import logger
+import requests
+from requests.adapters import HTTPAdapter
+
+ServicePolicy = NamedTuple("ServicePolicy", [
+    ("timeout", float), ("retries", int), ("backoff", float),
+    ("failure_threshold", int), ("reset_seconds", float)])
+
+DEFAULT_SERVICE = "default"
+SERVICE_POLICIES = {
+    DEFAULT_SERVICE: ServicePolicy(timeout=10, retries=1, backoff=0.25,
+                                   failure_threshold=5, reset_seconds=30),
+    "astronomy": ServicePolicy(timeout=5, retries=1, backoff=0.25,
+                               failure_threshold=5, reset_seconds=60),
+    "on_this_day": ServicePolicy(timeout=10, retries=2, backoff=1,
+                                 failure_threshold=3, reset_seconds=300),
+    "telegram": ServicePolicy(timeout=10, retries=2, backoff=0.25,
+                              failure_threshold=5, reset_seconds=30),
+    "weather": ServicePolicy(timeout=10, retries=1, backoff=0.25,
+                             failure_threshold=5, reset_seconds=60),
+}
+HTTP_POOL_SIZE = 20
+STALE_CACHE_SIZE = 256
+# Requests that are safe to send again after they may have reached the
+# server. Others are sent again only if the connection failed.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+Response = Union[httpx.Response, requests.Response]
+
+
+class ServiceUnavailableError(Exception):
+    """Raised when a request to a service failed, after its retries."""
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised when a service failed recently, without sending a request."""
+
+
+class CircuitBreaker:
+    """Fails fast while a service is down.
+
+    The circuit opens after `failure_threshold` failed calls in a row, and
+    calls are refused. After `reset_seconds`, a single trial call is let
+    through: if it succeeds the circuit closes, and otherwise it stays
+    open for another `reset_seconds`. A call is let through once, before
+    its first attempt, and its outcome is recorded after its last one.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+            self, failure_threshold: int, reset_seconds: float,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at < self.reset_seconds:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.HALF_OPEN:
+                # Refuse the other calls until the trial call is over.
+                self._opened_at = self.clock()
+            return state != self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if (self._opened_at is not None
+                    or self.failures >= self.failure_threshold):
+                self._opened_at = self.clock()
+
+
+class HostStats:
+    """The requests, errors and latency of a host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        average = self.total_seconds / self.requests if self.requests else 0
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "average_ms": round(average * 1000, 1),
+            "max_ms": round(self.max_seconds * 1000, 1),
+        }
+
+
+class _Call:
+    """A request of a service, through its retries."""
+
+    def __init__(
+            self, client: "HttpClient", service: str, method: str, url: str,
+            params: Optional[Dict[str, Any]],
+    ):
+        self.client = client
+        self.service = service
+        self.policy = client.get_policy(service)
+        self.breaker = client.get_breaker(service)
+        self.stats = client.get_host_stats(url)
+        self.method = method.upper()
+        self.key: Optional[Tuple] = None
+        if self.method == "GET":
+            self.key = (url, tuple(sorted(
+                (name, str(value)) for name, value in (params or {}).items())))
+        self.attempts = 0
+        self.response: Optional[Response] = None
+        self.error: Optional[Exception] = None
+
+    def allow(self) -> bool:
+        # The breaker admits the call as a whole, so a half-open trial
+        # call is retried too.
+        if self.attempts == 0 and not self.breaker.allow_request():
+            self.error = CircuitOpenError(
+                f"The {self.service} circuit is open.")
+            return False
+        self.attempts += 1
+        return True
+
+    def failed(
+            self, started: float, error: Exception, connected: bool,
+    ) -> Optional[float]:
+        """Records a failed request.
+
+        Returns:
+            The seconds to wait before retrying, or None not to retry.
+        """
+        self.stats.record(time.monotonic() - started, failed=True)
+        self.response, self.error = None, error
+        if self._can_retry() and (
+                not connected or self.method in IDEMPOTENT_METHODS):
+            return self._get_backoff()
+        self.breaker.record_failure()
+        return None
+
+    def responded(self, started: float, response: Response) -> Optional[float]:
+        """Records a response. Server errors count as failures.
+
+        Returns:
+            The seconds to wait before retrying, or None not to retry.
+        """
+        failed = response.status_code >= 500
+        self.stats.record(time.monotonic() - started, failed=failed)
+        self.response, self.error = response, None
+        if (response.status_code in RETRY_STATUS_CODES
+                and self.method in IDEMPOTENT_METHODS and self._can_retry()):
+            return self._get_backoff()
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            if self.key is not None and response.status_code == 200:
+                self.client.store_stale(self.key, response)
+        return None
+
+    def get_result(self) -> Response:
+        """Returns the response, or the last successful one if it failed.
+
+        Raises:
+            ServiceUnavailableError: If there is no response to return.
+        """
+        if self.response is not None and self.response.status_code < 500:
+            return self.response
+        stale = self.client.get_stale(self.key)
+        if stale is not None:
+            logger.warning(
+                f"{self.service} is unavailable, serving a stale response")
+            return stale
+        if self.response is not None:
+            return self.response
+        if isinstance(self.error, ServiceUnavailableError):
+            raise self.error
+        raise ServiceUnavailableError(
+            f"{self.service} is unavailable: {self.error}") from self.error
+
+    def _can_retry(self) -> bool:
+        return self.attempts <= self.policy.retries
+
+    def _get_backoff(self) -> float:
+        return self.policy.backoff * 2 ** (self.attempts - 1)
+
+
+class HttpClient:
+    """The pooled clients, circuit breakers and host statistics shared by
+    the calls to the external services.
+
+    An async client is created on first use in each event loop, since its
+    connections belong to the loop, and the sync session on first use.
+    """
+
+    def __init__(
+            self, policies: Dict[str, ServicePolicy] = SERVICE_POLICIES,
+            stale_cache_size: int = STALE_CACHE_SIZE,
+    ):
+        self.policies = policies
+        self.stale_cache_size = stale_cache_size
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._host_stats: Dict[str, HostStats] = {}
+        self._stale: "OrderedDict[Tuple, Response]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._async_clients: MutableMapping[
+            asyncio.AbstractEventLoop, httpx.AsyncClient,
+        ] = weakref.WeakKeyDictionary()
+        self._session: Optional[requests.Session] = None
+
+    def get_policy(self, service: str) -> ServicePolicy:
+        return self.policies.get(service, self.policies[DEFAULT_SERVICE])
+
+    def get_breaker(self, service: str) -> CircuitBreaker:
+        with self._lock:
+            if service not in self._breakers:
+                policy = self.get_policy(service)
+                self._breakers[service] = CircuitBreaker(
+                    policy.failure_threshold, policy.reset_seconds)
+            return self._breakers[service]
+
+    def get_host_stats(self, url: str) -> HostStats:
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            return self._host_stats.setdefault(host, HostStats())
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the requests, errors and latency of each host."""
+        with self._lock:
+            return {
+                host: stats.as_dict()
+                for host, stats in self._host_stats.items()
+            }
+
+    def get_stale(self, key: Optional[Tuple]) -> Optional[Response]:
+        with self._lock:
+            return self._stale.get(key)
+
+    def store_stale(self, key: Tuple, response: Response) -> None:
+        with self._lock:
+            self._stale[key] = response
+            self._stale.move_to_end(key)
+            if len(self._stale) > self.stale_cache_size:
+                self._stale.popitem(last=False)
+
+    def reset(self) -> None:
+        """Forgets the failures, statistics and stale responses."""
+        with self._lock:
+            self._breakers.clear()
+            self._host_stats.clear()
+            self._stale.clear()
+
+    async def request(
+            self, service: str, method: str, url: str, **kwargs: Any,
+    ) -> httpx.Response:
+        """Sends a request with the policy of the service.
+
+        The keyword arguments are those of httpx.AsyncClient.request.
+
+        Raises:
+            ServiceUnavailableError: If the request failed, and there is
+                no stale response to serve.
+        """
+        call = _Call(self, service, method, url, kwargs.get("params"))
+        client = self._get_async_client()
+        while call.allow():
+            started = time.monotonic()
+            try:
+                response = await client.request(
+                    method, url, timeout=call.policy.timeout, **kwargs)
+            except httpx.RequestError as e:
+                delay = call.failed(started, e, connected=not isinstance(
+                    e, (httpx.ConnectError, httpx.ConnectTimeout)))
+            else:
+                delay = call.responded(started, response)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        return call.get_result()
+
+    def request_sync(
+            self, service: str, method: str, url: str, **kwargs: Any,
+    ) -> requests.Response:
+        """Sends a request with the policy of the service, blocking.
+
+        The keyword arguments are those of requests.Session.request.
+
+        Raises:
+            ServiceUnavailableError: If the request failed, and there is
+                no stale response to serve.
+        """
+        call = _Call(self, service, method, url, kwargs.get("params"))
+        session = self._get_session()
+        while call.allow():
+            started = time.monotonic()
+            try:
+                response = session.request(
+                    method, url, timeout=call.policy.timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                delay = call.failed(started, e, connected=not isinstance(
+                    e, requests.exceptions.ConnectionError))
+            else:
+                delay = call.responded(started, response)
+            if delay is None:
+                break
+            time.sleep(delay)
+        return call.get_result()
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections.
+
+        The async clients of other loops are closed in their loop, if it
+        is still running.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for client_loop, client in clients:
+            if client_loop is loop:
+                await client.aclose()
+            elif client_loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                    client.aclose(), client_loop))
+        session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=httpx.Limits(
+                    max_keepalive_connections=HTTP_POOL_SIZE))
+                self._async_clients[loop] = client
+            return client
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+
+http_client = HttpClient()
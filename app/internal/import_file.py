@@ -1,13 +1,20 @@
 from collections import defaultdict
+import csv
 from datetime import datetime
 from pathlib import Path
 import re
+import threading
+import time
 from typing import (
-    Any, DefaultDict, Dict, Iterator, List, Optional, Tuple, Union
+    Any, Callable, DefaultDict, Dict, Generator, Iterable, Iterator, List,
+    Optional, Sequence, Tuple, TypeVar, Union,
 )
+import uuid
 
-from icalendar import cal, Calendar
+from icalendar import cal
 from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm.session import Session
 
 from app.config import (
@@ -21,11 +28,50 @@
     MAX_FILE_SIZE_MB,
     VALID_FILE_EXTENSION,
 )
-from app.routers.event import create_event
+from app.database.models import Event, UserEvent
+from app.internal.emotion_tagging import emotion_tagger
+from app.internal.event_changes import bump_events_versions
+from app.routers.event_images import get_event_flair
 
 DATE_FORMAT = "%m-%d-%Y"
 DATE_FORMAT2 = "%m-%d-%Y %H:%M"
 DESC_EVENT = "VEVENT"
+IMPORT_CHUNK_SIZE = 500
+IMPORT_STAGES = ("parse", "validate", "insert")
+
+CSV_FIELDS = ("title", "content", "start", "end", "location")
+CSV_REQUIRED_FIELDS = ("title", "start", "end")
+# Header names of the columns, as exported by common calendar tools.
+CSV_HEADERS = {
+    "title": "title",
+    "head": "title",
+    "subject": "title",
+    "summary": "title",
+    "content": "content",
+    "description": "content",
+    "start": "start",
+    "start date": "start",
+    "start time": "start_time",
+    "end": "end",
+    "end date": "end",
+    "end time": "end_time",
+    "location": "location",
+}
+CSV_DATE_FORMATS = (
+    DATE_FORMAT2,
+    DATE_FORMAT,
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y",
+)
+CSV_DELIMITERS = ",;\t"
+CSV_SNIFF_SIZE = 4096
+
+T = TypeVar("T")
 
 EVENT_PATTERN = re.compile(r"^(\w{" + str(int(EVENT_HEADER_NOT_EMPTY)) + "," +
                            str(EVENT_HEADER_LIMIT) + r"}),\s(\w{0," +
@@ -44,30 +90,222 @@
                             r"}))?$")
 
 
-def import_events(path: str, user_id: int, session: Session) -> bool:
+class InvalidImportDataError(Exception):
+    """Raised when the data of an imported file is not valid."""
+
+
+class ImportCancelledError(Exception):
+    """Raised when an import is cancelled before it is committed."""
+
+
+class ImportStageStats:
+    """The number of items handled by an import stage, and the time spent.
+
+    Args:
+        name: The stage name.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.seconds += seconds
+
+    @property
+    def throughput(self) -> float:
+        """The items handled per second."""
+        if not self.seconds:
+            return 0.0
+        return self.items / self.seconds
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.items} in {self.seconds:.3f}s "
+                f"({self.throughput:.0f}/s)")
+
+
+class ImportStats:
+    """The progress and per-stage throughput of an import.
+
+    The stats may be read, and the import cancelled, from another thread
+    while the import runs.
+    """
+
+    def __init__(self):
+        self.stages = {name: ImportStageStats(name) for name in IMPORT_STAGES}
+        self.rejected: List[Tuple[int, str]] = []
+        self._cancelled = threading.Event()
+
+    def __getitem__(self, stage: str) -> ImportStageStats:
+        return self.stages[stage]
+
+    @property
+    def parsed_events(self) -> int:
+        return self.stages["parse"].items
+
+    @property
+    def saved_events(self) -> int:
+        return self.stages["insert"].items
+
+    def reject(self, row: int, reason: str) -> None:
+        """Records a row of the file that is not valid, and why."""
+        self.rejected.append((row, reason))
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check_cancelled(self) -> None:
+        """Raises ImportCancelledError if the import was cancelled."""
+        if self.is_cancelled:
+            raise ImportCancelledError("Import cancelled")
+
+    def __str__(self) -> str:
+        return ", ".join(str(stage) for stage in self.stages.values())
+
+
+def import_events(
+        path: str,
+        user_id: int,
+        session: Session,
+        stats: Optional[ImportStats] = None,
+        csv_columns: Optional[Sequence[str]] = None,
+) -> bool:
     """Imports events from an outside file and saves them to the database.
 
     For the file to be successfully imported, it must be one of the supported
     types set at VALID_FILE_EXTENSION and not pass the max size set
     at MAX_FILE_SIZE_MB.
 
+    The file is read, validated and saved in a stream, in chunks of
+    IMPORT_CHUNK_SIZE events that are bulk inserted in a single transaction.
+    If any event is not valid, nothing is saved, and the rows that are not
+    valid are recorded in the stats. Nothing is saved either if the import
+    is cancelled through the stats.
+
     Args:
         path: The file path.
         user_id: The user's ID.
         session: The database connection.
+        stats: Optional; Collects the progress and per-stage throughput
+            of the import.
+        csv_columns: Optional; The fields of the columns of a *.csv file
+            without a header, out of the values of CSV_HEADERS.
+            Defaults to CSV_FIELDS.
 
     Returns:
         True if successfully saved, otherwise returns False.
     """
-    if _is_file_valid_to_import(path):
-        if _is_file_extension_valid(path, ".ics"):
-            event_data = _get_data_from_ics_file(path)
-        else:
-            event_data = _get_data_from_txt_file(path)
-        if event_data and _is_file_valid_to_save_to_database(event_data):
-            _save_events_to_database(event_data, user_id, session)
-            return True
-    return False
+    if not _is_file_valid_to_import(path):
+        return False
+    if stats is None:
+        stats = ImportStats()
+    try:
+        _save_events_to_database(
+            _get_valid_events(path, stats, csv_columns),
+            user_id, session, stats,
+        )
+    except (InvalidImportDataError, ImportCancelledError) as e:
+        session.rollback()
+        logger.info(f"Import of {path} failed: {e}")
+        return False
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.exception(f"Import of {path} failed: {e}")
+        return False
+    logger.info(f"Imported {stats.saved_events} events from {path}: {stats}")
+    return stats.saved_events > 0
+
+
+def _get_valid_events(
+        path: str,
+        stats: ImportStats,
+        csv_columns: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Returns the file events' data, parsed and validated in a stream.
+
+    Once a row is not valid no more events are yielded, but the rest of the
+    rows are still validated, so that every row that is not valid is
+    recorded in the stats.
+
+    Args:
+        path: The file path.
+        stats: Collects the parse and validate stages throughput,
+            and the rejected rows.
+        csv_columns: Optional; The fields of the columns of a *.csv file
+            without a header.
+
+    Yields:
+        The data of each event.
+
+    Raises:
+        InvalidImportDataError: If the file data is not valid.
+        ImportCancelledError: If the import is cancelled.
+    """
+    if _is_file_extension_valid(path, ".ics"):
+        records: Iterator[Any] = _get_event_components_from_ics_file(path)
+        get_event_data: Callable[[Any], Dict[str, Any]] = (
+            _get_event_data_from_ics_component
+        )
+    elif _is_file_extension_valid(path, ".csv"):
+        csv_events = CsvEventReader(path, csv_columns)
+        records = iter(csv_events)
+        get_event_data = csv_events.get_event_data
+    else:
+        records = _get_event_from_txt_file(path)
+        get_event_data = _get_valid_event_data_from_text
+    same_date_events = _check_same_date_events()
+    next(same_date_events)
+    row = 0
+    try:
+        for row, record in enumerate(_timed(records, stats["parse"]), 1):
+            stats.check_cancelled()
+            start = time.perf_counter()
+            try:
+                event_data = get_event_data(record)
+                if not same_date_events.send(event_data["S_Date"]):
+                    raise InvalidImportDataError(
+                        f"Too many events start on {event_data['S_Date']}")
+            except InvalidImportDataError as e:
+                stats.reject(row, str(e))
+                continue
+            finally:
+                stats["validate"].add(1, time.perf_counter() - start)
+            if not stats.rejected:
+                yield event_data
+    except InvalidImportDataError as e:
+        stats.reject(row + 1, str(e))
+    if stats.rejected:
+        raise InvalidImportDataError(
+            f"{len(stats.rejected)} rows are not valid, "
+            f"the first is row {stats.rejected[0][0]}: "
+            f"{stats.rejected[0][1]}")
+
+
+def _timed(items: Iterable[T], stage: ImportStageStats) -> Iterator[T]:
+    """Yields the items, adding the time spent producing them to the stage.
+
+    Args:
+        items: The items a stage produces.
+        stage: The stage stats.
+
+    Yields:
+        The items.
+    """
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        stage.add(1, time.perf_counter() - start)
+        yield item
 
 
 def _is_file_valid_to_import(path: str) -> bool:
@@ -127,44 +365,60 @@ def _is_file_size_valid(path: str, max_size: int = MAX_FILE_SIZE_MB) -> bool:
     return file_size <= max_size
 
 
-def _get_data_from_ics_file(ics_file_path: str) -> List[Dict[str, Any]]:
-    """Returns a list of event data in dictionaries from an *.ics file.
+def _get_event_components_from_ics_file(
+        ics_file_path: str,
+) -> Iterator[cal.Event]:
+    """Reads an *.ics file line by line and yields its events.
+
+    Only the lines of one event are held in memory at a time.
 
     Args:
         ics_file_path: The file path.
 
-    Returns:
-        A list of event data in dictionaries, or an empty list
-        if the data is not valid.
-    """
-    calendar_content: List[Dict[str, Any]] = []
-    calendar = _get_calendar_from_ics(ics_file_path)
-    if not calendar:
-        return []
-
-    for component in calendar.walk():
-        if component.name == DESC_EVENT:
-            if not _is_valid_data_event_ics(component):
-                return []
-            _add_event_component_ics(component, calendar_content)
-    return calendar_content
-
+    Yields:
+        An event component.
 
-def _get_calendar_from_ics(ics_file_path: str) -> Optional[Calendar]:
-    """Opens an *.ics file and returns a Calendar object from it.
+    Raises:
+        InvalidImportDataError: If the file structure or an event
+            is not valid.
+    """
+    components: List[str] = []
+    event_lines: List[str] = []
+    with open(ics_file_path, "r") as ics:
+        for line in ics:
+            if line[:6].upper() == "BEGIN:":
+                components.append(line[6:].strip().upper())
+            in_event = DESC_EVENT in components
+            if in_event:
+                event_lines.append(line)
+            if line[:4].upper() == "END:":
+                name = line[4:].strip().upper()
+                if not components or components.pop() != name:
+                    raise InvalidImportDataError(f"Unexpected END:{name}")
+                if name == DESC_EVENT:
+                    yield _get_event_component_from_ics("".join(event_lines))
+                    event_lines = []
+    if components:
+        raise InvalidImportDataError(f"Missing END:{components[-1]}")
+
+
+def _get_event_component_from_ics(event_text: str) -> cal.Event:
+    """Returns an event component from the *.ics text of one event.
 
     Args:
-        ics_file_path: The file path.
+        event_text: The text of the event, from BEGIN to END.
 
     Returns:
-        A Calendar object if successful, otherwise returns None.
+        An event component.
+
+    Raises:
+        InvalidImportDataError: If the text is not a valid event.
     """
-    with open(ics_file_path, "r") as ics:
-        try:
-            return Calendar.from_ical(ics.read())
-        except (IndexError, ValueError) as e:
-            logger.error(f"open_ics function failed error message: {e}")
-            return None
+    try:
+        return cal.Event.from_ical(event_text)
+    except (IndexError, ValueError) as e:
+        logger.error(f"Parsing an ics event failed: {e}")
+        raise InvalidImportDataError(str(e))
 
 
 def _is_valid_data_event_ics(component: cal.Event) -> bool:
@@ -184,47 +438,29 @@ def _is_valid_data_event_ics(component: cal.Event) -> bool:
                 )
 
 
-def _add_event_component_ics(
-        component: cal.Event, calendar_content: List[Dict[str, Any]]) -> None:
-    """Appends event data from an *.ics file.
+def _get_event_data_from_ics_component(
+        component: cal.Event,
+) -> Dict[str, Any]:
+    """Returns the event data of a valid event component.
 
     Args:
         component: An event component.
-        calendar_content: A list of event data.
+
+    Returns:
+        A dictionary with the event data.
+
+    Raises:
+        InvalidImportDataError: If the event data is not valid.
     """
-    calendar_content.append({
+    if not _is_valid_data_event_ics(component):
+        raise InvalidImportDataError("Invalid event data")
+    return {
         "Head": str(component.get('summary')),
         "Content": str(component.get('description')),
         "S_Date": component.get('dtstart').dt.replace(tzinfo=None),
         "E_Date": component.get('dtend').dt.replace(tzinfo=None),
         "Location": str(component.get('location')),
-    })
-
-
-def _get_data_from_txt_file(txt_file_path: str) -> List[Dict[str, Any]]:
-    """Returns a list of event data in dictionaries from a *.txt file.
-
-    Args:
-        txt_file_path: The file path.
-
-    Returns:
-        A list of event data in dictionaries, or an empty list
-        if the data is not valid.
-    """
-    calendar_content: List[Dict[str, Any]] = []
-    for event in _get_event_from_txt_file(txt_file_path):
-        if not _is_event_text_valid(event):
-            return []
-
-        event_data = _get_event_data_from_text(event)
-
-        if not _is_event_dates_valid(
-                event_data["start_date"], event_data["end_date"]):
-            return []
-
-        _add_event_component_txt(event_data, calendar_content)
-
-    return calendar_content
+    }
 
 
 def _get_event_from_txt_file(txt_file: str) -> Iterator[str]:
@@ -237,8 +473,28 @@ def _get_event_from_txt_file(txt_file: str) -> Iterator[str]:
         A row of event data.
     """
     with open(txt_file, "r") as text:
-        for row in text.readlines():
-            yield row
+        yield from text
+
+
+def _get_valid_event_data_from_text(text: str) -> Dict[str, Any]:
+    """Returns the event data of a valid row of a *.txt file.
+
+    Args:
+        text: The event text.
+
+    Returns:
+        A dictionary with the event data.
+
+    Raises:
+        InvalidImportDataError: If the event data is not valid.
+    """
+    if not _is_event_text_valid(text):
+        raise InvalidImportDataError("Invalid event text")
+    event_data = _get_event_data_from_text(text)
+    if not _is_event_dates_valid(
+            event_data["start_date"], event_data["end_date"]):
+        raise InvalidImportDataError("Invalid event dates")
+    return _get_event_component_txt(event_data)
 
 
 def _is_event_text_valid(text: str) -> bool:
@@ -305,14 +561,14 @@ def _is_event_dates_valid(start: str, end: str) -> bool:
     return is_date_in_range and is_end_after_start and is_duration_valid
 
 
-def _add_event_component_txt(
-        event: Dict[str, Any], calendar_content: List[Dict[str, Any]]
-) -> None:
-    """Appends event data from a txt file.
+def _get_event_component_txt(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the event data of a txt file row, with dates converted.
 
     Args:
         event: An event's data.
-        calendar_content: A list of event data.
+
+    Returns:
+        A dictionary with the event data.
     """
     if ":" in event["start_date"] and ":" in event["start_date"]:
         start_date = datetime.strptime(event["start_date"], DATE_FORMAT2)
@@ -321,13 +577,142 @@ def _add_event_component_txt(
         start_date = datetime.strptime(event["start_date"], DATE_FORMAT)
         end_date = datetime.strptime(event["end_date"], DATE_FORMAT)
 
-    calendar_content.append({
+    return {
         "Head": event["head"],
         "Content": event["content"],
         "S_Date": start_date,
         "E_Date": end_date,
         "Location": event["location"],
-    })
+    }
+
+
+class CsvEventReader:
+    """Reads the events of a *.csv file in a stream, one parse per row.
+
+    The delimiter is detected from the start of the file. If the first row
+    is a header, the columns are mapped by the names in CSV_HEADERS,
+    otherwise by the given columns. A start or end time column is joined to
+    its date column. The format of the dates is detected once and reused for
+    the following dates, and detected again only if it does not match.
+
+    Args:
+        path: The file path.
+        columns: Optional; The fields of the columns, out of the values of
+            CSV_HEADERS, when the file has no header. An empty field skips
+            its column. Defaults to CSV_FIELDS.
+
+    Raises:
+        InvalidImportDataError: If the columns are not valid.
+    """
+
+    def __init__(
+            self, path: str, columns: Optional[Sequence[str]] = None,
+    ):
+        self.path = path
+        columns = CSV_FIELDS if columns is None else columns
+        self.columns = self._get_column_indexes(columns)
+        self.date_formats = list(CSV_DATE_FORMATS)
+
+    @staticmethod
+    def _get_column_indexes(columns: Sequence[str]) -> Dict[str, int]:
+        indexes = {field: i for i, field in enumerate(columns) if field}
+        missing = [
+            field for field in CSV_REQUIRED_FIELDS if field not in indexes
+        ]
+        if missing:
+            raise InvalidImportDataError(
+                f"Missing columns: {', '.join(missing)}")
+        return indexes
+
+    @staticmethod
+    def _get_header_columns(row: List[str]) -> Optional[List[str]]:
+        columns = [CSV_HEADERS.get(cell.strip().lower(), "") for cell in row]
+        if all(field in columns for field in CSV_REQUIRED_FIELDS):
+            return columns
+        return None
+
+    def _get_dialect(self, csv_file) -> Union[csv.Dialect, str]:
+        sample = csv_file.read(CSV_SNIFF_SIZE)
+        csv_file.seek(0)
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            return "excel"
+
+    def __iter__(self) -> Iterator[List[str]]:
+        with open(self.path, "r", newline="") as csv_file:
+            reader = csv.reader(
+                csv_file, self._get_dialect(csv_file), skipinitialspace=True,
+            )
+            rows = (row for row in reader if any(row))
+            first_row = next(rows, None)
+            if first_row is None:
+                return
+            header = self._get_header_columns(first_row)
+            if header is None:
+                yield first_row
+            else:
+                self.columns = self._get_column_indexes(header)
+            yield from rows
+
+    def _get_cell(self, row: List[str], field: str) -> str:
+        index = self.columns.get(field)
+        if index is None or index >= len(row):
+            return ""
+        return row[index].strip()
+
+    def _parse_date(self, text: str) -> datetime:
+        formats = self.date_formats
+        for i, date_format in enumerate(formats):
+            try:
+                date = datetime.strptime(text, date_format)
+            except ValueError:
+                continue
+            if i:
+                formats.insert(0, formats.pop(i))
+            return date
+        raise InvalidImportDataError(f"Invalid event date {text!r}")
+
+    def _get_date(self, row: List[str], field: str) -> datetime:
+        text = self._get_cell(row, field)
+        time_text = self._get_cell(row, f"{field}_time")
+        if time_text:
+            text = f"{text} {time_text}"
+        return self._parse_date(text)
+
+    def get_event_data(self, row: List[str]) -> Dict[str, Any]:
+        """Returns the event data of a valid row.
+
+        Args:
+            row: The cells of the row.
+
+        Returns:
+            A dictionary with the event data.
+
+        Raises:
+            InvalidImportDataError: If the event data is not valid.
+        """
+        title = self._get_cell(row, "title")
+        content = self._get_cell(row, "content")
+        location = self._get_cell(row, "location")
+        if (EVENT_HEADER_NOT_EMPTY and not title
+                or len(title) > EVENT_HEADER_LIMIT
+                or len(content) > EVENT_CONTENT_LIMIT
+                or len(location) > LOCATION_LIMIT):
+            raise InvalidImportDataError("Invalid event text")
+        start = self._get_date(row, "start")
+        end = self._get_date(row, "end")
+        if not (_is_date_in_range(start) and _is_date_in_range(end)
+                and _is_start_date_before_end_date(start, end)
+                and _is_event_duration_valid(start, end)):
+            raise InvalidImportDataError("Invalid event dates")
+        return {
+            "Head": title,
+            "Content": content,
+            "S_Date": start,
+            "E_Date": end,
+            "Location": location,
+        }
 
 
 def _convert_string_to_date(string_date: str) -> Optional[datetime]:
@@ -401,56 +786,126 @@ def _is_event_duration_valid(
     return (end - start).days < max_days
 
 
-def _is_file_valid_to_save_to_database(
-        events: List[Dict[str, Any]],
+def _check_same_date_events(
         max_event_start_date: int = MAX_EVENTS_START_DATE,
-) -> bool:
-    """Whether the number of events starting on the same date is valid.
+) -> Generator[bool, datetime, None]:
+    """Checks the number of events starting on the same date, in a stream.
 
     The number of events starting on the same date cannot be greater than the
     maximum number of events allowed to start on the same day in the settings.
     The default value is set in MAX_EVENTS_START_DATE.
+    Each start date is sent to the generator once it is primed.
 
     Args:
-        events: A list of events.
         max_event_start_date: Optional; The maximum number of events allowed
             to start on the same day.
             Defaults to MAX_EVENTS_START_DATE.
 
-    Returns:
-        True if valid, otherwise returns False.
+    Yields:
+        Whether the number of events starting on the date that was sent
+        is still valid.
     """
-    same_date_counter = 1
     dates: DefaultDict[datetime, int] = defaultdict(int)
-    for event in events:
-        dates[event["S_Date"]] += 1
-        if dates[event["S_Date"]] > same_date_counter:
-            same_date_counter = dates[event["S_Date"]]
-    return same_date_counter <= max_event_start_date
+    is_valid = True
+    while True:
+        start_date = yield is_valid
+        dates[start_date] += 1
+        is_valid = dates[start_date] <= max_event_start_date
+
+
+def _get_event_row(
+        event: Dict[str, Any], user_id: int, batch_id: str,
+) -> Dict[str, Any]:
+    """Returns the row of the events table of an imported event.
+
+    Args:
+        event: An event's data.
+        user_id: The user's ID.
+        batch_id: The ID of the import.
+
+    Returns:
+        The column values of the event.
+    """
+    return {
+        "title": event["Head"],
+        "content": event["Content"],
+        "start": event["S_Date"],
+        "end": event["E_Date"],
+        "location": event["Location"],
+        "owner_id": user_id,
+        "emotion": None,
+        "flair": get_event_flair(event["Head"], event["Content"]),
+        "invitees": "",
+        "all_day": False,
+        "availability": True,
+        "is_google_event": False,
+        "vc_link": None,
+        "color": None,
+        "category_id": None,
+        "import_batch_id": batch_id,
+    }
+
+
+def _get_chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yields lists of up to `size` items."""
+    chunk: List[T] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 def _save_events_to_database(
-        events: List[Dict[str, Any]], user_id: int, session: Session
+        events: Iterable[Dict[str, Any]],
+        user_id: int,
+        session: Session,
+        stats: ImportStats,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
 ) -> None:
-    """Inserts the events into the Event table.
+    """Inserts the events into the Event table, in one transaction.
+
+    The events are inserted with one executemany per chunk, and their
+    UserEvent rows with a single INSERT ... SELECT once all are inserted.
+    The inserted events are found by the ID of the import they are saved
+    with. Their emotions are scored in the background after the commit.
 
     Args:
-        events: A list of events.
+        events: The events' data.
         user_id: The user's ID.
         session: The database connection.
+        stats: Collects the insert stage throughput.
+        chunk_size: Optional; The number of events inserted at once.
+            Defaults to IMPORT_CHUNK_SIZE.
+
+    Raises:
+        InvalidImportDataError: If an event is not valid. Nothing is
+            committed in that case.
+        ImportCancelledError: If the import is cancelled. Nothing is
+            committed in that case.
     """
-    for event in events:
-        title = event["Head"]
-        content = event["Content"]
-        start = event["S_Date"]
-        end = event["E_Date"]
-        location = event["Location"]
-        owner_id = user_id
-        create_event(db=session,
-                     title=title,
-                     content=content,
-                     start=start,
-                     end=end,
-                     location=location,
-                     owner_id=owner_id,
-                     )
+    events_table = Event.__table__
+    batch_id = uuid.uuid4().hex
+    for chunk in _get_chunks(events, chunk_size):
+        start = time.perf_counter()
+        rows = [_get_event_row(event, user_id, batch_id) for event in chunk]
+        session.execute(events_table.insert(), rows)
+        stats["insert"].add(len(rows), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    user_events_table = UserEvent.__table__
+    imported_events = select(
+        [events_table.c.owner_id, events_table.c.id],
+    ).where(events_table.c.import_batch_id == batch_id)
+    session.execute(user_events_table.insert().from_select(
+        ["user_id", "event_id"], imported_events,
+    ))
+    bump_events_versions(session, [user_id])
+    stats.check_cancelled()
+    session.commit()
+    stats["insert"].add(0, time.perf_counter() - start)
+    emotion_tagger.tag(session.get_bind(), session.query(
+        Event.id, Event.title, Event.content,
+    ).filter(Event.import_batch_id == batch_id).yield_per(chunk_size))
@@ -0,0 +1,434 @@
+"""Background import jobs.
+
+An uploaded file is imported on a bounded pool of worker threads, so the
+upload returns at once with the id of its job. The job reports the import
+progress while it runs, and can be cancelled until it is committed.
+
+Jobs run in the worker of the app that queued them, and are stored in the
+database when they are queued, start and finish, so their progress can be
+read, and the job cancelled, from every worker. A job polls whether it was
+cancelled from another worker while it parses the file, and stores its
+progress as it does. Finished jobs are kept in memory for a while so their
+result can be read, and the oldest of them are dropped past
+MAX_FINISHED_JOBS.
+
+The stored jobs are cleaned up whenever a job is queued: jobs that
+finished more than FINISHED_JOB_KEEP_SECONDS ago are deleted, and jobs that
+were not stored for STALE_JOB_SECONDS, whose worker died, are failed.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+import uuid
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import SessionFactory
+from app.database.models import ImportJobProgress
+from app.internal.import_file import ImportStats, import_events
+from app.internal.import_holidays import (
+    get_holidays_from_file,
+    save_holidays_to_db,
+)
+
+MAX_IMPORT_WORKERS = 4
+MAX_USER_IMPORTS = 2
+MAX_FINISHED_JOBS = 256
+CANCEL_POLL_SECONDS = 1
+FINISHED_JOB_KEEP_SECONDS = 24 * 60 * 60
+STALE_JOB_SECONDS = 60 * 60
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+
+class TooManyImportsError(Exception):
+    """Raised when a user already runs the maximum number of imports."""
+
+
+class JobStats(ImportStats):
+    """The stats of a job, which also polls whether the job was cancelled
+    from another worker."""
+
+    def __init__(self, job: "ImportJob"):
+        super().__init__()
+        self._job = job
+        self._polled = time.monotonic()
+
+    def check_cancelled(self) -> None:
+        now = time.monotonic()
+        if not self.is_cancelled and now - self._polled >= CANCEL_POLL_SECONDS:
+            self._polled = now
+            if self._job.is_cancel_requested():
+                self.cancel()
+            else:
+                self._job.save()
+        super().check_cancelled()
+
+
+class ImportJob:
+    """An import that runs in the background.
+
+    Args:
+        user_id: The ID of the user the import belongs to.
+        session_factory: Optional; Creates the connections the job is
+            stored with. The job is not stored if it is None.
+    """
+
+    def __init__(
+            self,
+            user_id: int,
+            session_factory: Optional[SessionFactory] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.session_factory = session_factory
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.stats = JobStats(self)
+        self.future: Optional[Future] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def elapsed(self) -> float:
+        """The seconds the job has been running for, or ran for."""
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.monotonic()) - self._started
+
+    def start(self) -> None:
+        self.status = RUNNING
+        self._started = time.monotonic()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self._finished = time.monotonic()
+
+    def cancel(self) -> bool:
+        """Asks the job to stop.
+
+        Returns:
+            True if the job was not finished yet, otherwise returns False.
+        """
+        if self.is_finished:
+            return False
+        self.stats.cancel()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Blocks until the job is finished."""
+        if self.future is not None:
+            self.future.result(timeout)
+
+    def save(self) -> None:
+        """Stores the job's status and progress."""
+        if self.session_factory is None:
+            return
+        session = self.session_factory()
+        try:
+            record = session.query(ImportJobProgress).get(self.id)
+            if record is None:
+                record = ImportJobProgress(id=self.id, user_id=self.user_id)
+                session.add(record)
+            record.status = self.status
+            record.progress = self.to_dict()
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.exception(f"Saving import job {self.id} failed: {e}")
+        finally:
+            session.close()
+
+    def is_cancel_requested(self) -> bool:
+        """Returns whether the job was cancelled from another worker."""
+        if self.session_factory is None:
+            return False
+        session = self.session_factory()
+        try:
+            return bool(session.query(ImportJobProgress.cancel_requested)
+                        .filter_by(id=self.id).scalar())
+        finally:
+            session.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        inserted = self.stats.saved_events
+        if self.is_finished and self.status != DONE:
+            inserted = 0  # The import was rolled back.
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows_parsed": self.stats.parsed_events,
+            "rows_inserted": inserted,
+            "rejected": [
+                {"row": row, "reason": reason}
+                for row, reason in self.stats.rejected
+            ],
+            "error": self.error,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+class ImportJobManager:
+    """Runs import jobs on a bounded pool of worker threads.
+
+    Args:
+        max_workers: Optional; The number of imports that run at once.
+            Defaults to MAX_IMPORT_WORKERS.
+        max_user_jobs: Optional; The number of unfinished imports a user
+            may have. Defaults to MAX_USER_IMPORTS.
+        max_finished_jobs: Optional; The number of finished jobs kept.
+            Defaults to MAX_FINISHED_JOBS.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = MAX_IMPORT_WORKERS,
+            max_user_jobs: int = MAX_USER_IMPORTS,
+            max_finished_jobs: int = MAX_FINISHED_JOBS,
+    ):
+        self.max_user_jobs = max_user_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="import",
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ImportJob] = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+    def get_progress(
+            self, session: Session, job_id: str, user_id: int,
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the progress of a user's job, which may run on another
+        worker, or None if the user has no such job."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict() if job.user_id == user_id else None
+        record = _get_job_progress(session, job_id, user_id)
+        return None if record is None else record.progress
+
+    def cancel(
+            self, session: Session, job_id: str, user_id: int,
+    ) -> Optional[bool]:
+        """Asks a user's job, which may run on another worker, to stop.
+
+        Returns:
+            None if the user has no such job, otherwise whether the job was
+            not finished yet.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.cancel() if job.user_id == user_id else None
+        record = _get_job_progress(session, job_id, user_id)
+        if record is None:
+            return None
+        if record.status in FINISHED_STATUSES:
+            return False
+        record.cancel_requested = True
+        session.commit()
+        return True
+
+    def submit(
+            self,
+            user_id: int,
+            run: Callable[..., bool],
+            *args: Any,
+            session_factory: Optional[SessionFactory] = None,
+    ) -> ImportJob:
+        """Queues an import of a user.
+
+        Args:
+            user_id: The user's ID.
+            run: The import function. It is called with the job and args,
+                and returns whether the import succeeded.
+            *args: The import function arguments.
+            session_factory: Optional; Creates the connections the job is
+                stored with, so other workers can read it.
+
+        Returns:
+            The queued job.
+
+        Raises:
+            TooManyImportsError: If the user already has the maximum
+                number of unfinished imports.
+        """
+        with self._lock:
+            if session_factory is None:
+                running = sum(
+                    1 for job in self._jobs.values()
+                    if job.user_id == user_id and not job.is_finished
+                )
+            else:
+                running = _count_stored_unfinished_jobs(
+                    session_factory, user_id)
+            if running >= self.max_user_jobs:
+                raise TooManyImportsError(
+                    f"User {user_id} already runs {running} imports")
+            job = ImportJob(user_id, session_factory)
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+            job.save()
+        job.future = self._executor.submit(self._run, job, run, *args)
+        return job
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [
+            job_id for job_id, job in self._jobs.items() if job.is_finished
+        ]
+        for job_id in finished[:len(finished) - self.max_finished_jobs]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _run(job: ImportJob, run: Callable[..., bool], *args: Any) -> None:
+        job.start()
+        job.save()
+        try:
+            succeeded = run(job, *args)
+        except Exception as e:
+            logger.exception(f"Import job {job.id} failed: {e}")
+            job.finish(FAILED, str(e))
+            job.save()
+            return
+        if job.stats.is_cancelled and not succeeded:
+            job.finish(CANCELLED)
+        elif succeeded:
+            job.finish(DONE)
+        else:
+            job.finish(FAILED, "The file could not be imported")
+        job.save()
+        logger.info(f"Import job {job.id} {job.status}: {job.stats}")
+
+
+def _get_job_progress(
+        session: Session, job_id: str, user_id: int,
+) -> Optional[ImportJobProgress]:
+    return session.query(ImportJobProgress).filter_by(
+        id=job_id, user_id=user_id).first()
+
+
+def clean_up_stored_jobs(session: Session) -> int:
+    """Deletes the stored jobs that finished long ago, and fails the
+    unfinished jobs whose worker stopped storing them.
+
+    Args:
+        session: The database connection.
+
+    Returns:
+        The number of jobs deleted or failed.
+    """
+    now = datetime.utcnow()
+    deleted = session.query(ImportJobProgress).filter(
+        ImportJobProgress.status.in_(FINISHED_STATUSES),
+        ImportJobProgress.updated_at
+        < now - timedelta(seconds=FINISHED_JOB_KEEP_SECONDS),
+    ).delete(synchronize_session=False)
+    stale_jobs = session.query(ImportJobProgress).filter(
+        ImportJobProgress.status.notin_(FINISHED_STATUSES),
+        ImportJobProgress.updated_at
+        < now - timedelta(seconds=STALE_JOB_SECONDS),
+    ).all()
+    for record in stale_jobs:
+        record.status = FAILED
+        record.progress = {
+            **record.progress,
+            "status": FAILED,
+            "rows_inserted": 0,
+            "error": "The import stopped responding",
+        }
+    session.commit()
+    return deleted + len(stale_jobs)
+
+
+def _count_stored_unfinished_jobs(
+        session_factory: SessionFactory, user_id: int,
+) -> int:
+    """Returns the number of unfinished jobs of a user in every worker."""
+    session = session_factory()
+    try:
+        clean_up_stored_jobs(session)
+        return session.query(ImportJobProgress).filter(
+            ImportJobProgress.user_id == user_id,
+            ImportJobProgress.status.notin_(FINISHED_STATUSES),
+        ).count()
+    finally:
+        session.close()
+
+
+def run_events_import(
+        job: ImportJob,
+        path: str,
+        session_factory: SessionFactory,
+        csv_columns: Optional[Sequence[str]] = None,
+) -> bool:
+    """Imports an events file, and deletes it once done.
+
+    Args:
+        job: The import job.
+        path: The path of the uploaded file.
+        session_factory: Creates the job's database connection.
+        csv_columns: Optional; The fields of the columns of a *.csv file
+            without a header.
+
+    Returns:
+        True if the events were saved, otherwise returns False.
+    """
+    session = session_factory()
+    try:
+        return import_events(
+            path, job.user_id, session, job.stats, csv_columns,
+        )
+    finally:
+        session.close()
+        os.remove(path)
+
+
+def run_holidays_import(
+        job: ImportJob, ics_text: str, session_factory: SessionFactory,
+) -> bool:
+    """Imports the holidays of an *.ics file.
+
+    Args:
+        job: The import job.
+        ics_text: The file text.
+        session_factory: Creates the job's database connection.
+
+    Returns:
+        True if the holidays were saved, otherwise returns False.
+    """
+    session = session_factory()
+    try:
+        start = time.perf_counter()
+        holidays = get_holidays_from_file(ics_text, session)
+        job.stats["parse"].add(len(holidays), time.perf_counter() - start)
+        if job.stats.is_cancelled:
+            return False
+        start = time.perf_counter()
+        save_holidays_to_db(holidays, session)
+        job.stats["insert"].add(len(holidays), time.perf_counter() - start)
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.exception(e)
+        return False
+    finally:
+        session.close()
+    return True
+
+
+jobs = ImportJobManager()
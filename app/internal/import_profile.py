@@ -0,0 +1,127 @@
+"""A report of the time it takes to import the app, module by module.
+
+The module is imported in a fresh interpreter with `python -X importtime`,
+and the modules and top level packages that took the longest are listed,
+so startup regressions can be spotted and tracked:
+
+    python -m app.internal.import_profile --module app.main --limit 20
+"""
+import argparse
+from collections import defaultdict
+import json
+import re
+import subprocess
+import sys
+from typing import DefaultDict, Dict, Iterable, List, NamedTuple, Optional
+from typing import Sequence
+
+IMPORT_PROFILE_MODULE = "app.main"
+IMPORT_PROFILE_LIMIT = 20
+
+IMPORT_TIME_REGEX = re.compile(
+    r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+ImportTime = NamedTuple("ImportTime", [("name", str), ("self_us", int),
+                        ("cumulative_us", int), ("depth", int)])
+
+
+class ImportProfileError(Exception):
+    """Raised when the profiled module fails to import."""
+
+
+def parse_import_times(lines: Iterable[str]) -> List[ImportTime]:
+    """Returns the import times of `python -X importtime` output lines.
+
+    Lines that are not import times, such as warnings, are skipped.
+    """
+    times = []
+    for line in lines:
+        match = IMPORT_TIME_REGEX.match(line.rstrip("\n"))
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            times.append(ImportTime(
+                name=name,
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(indent) - 1) // 2,
+            ))
+    return times
+
+
+def profile_imports(module: str = IMPORT_PROFILE_MODULE) -> List[ImportTime]:
+    """Imports the module in a new interpreter and returns the import times.
+
+    Raises:
+        ImportProfileError: If the import fails.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        raise ImportProfileError(
+            f"Importing {module} failed:\n{process.stderr}")
+    return parse_import_times(process.stderr.splitlines())
+
+
+def get_package_times(times: Iterable[ImportTime]) -> Dict[str, int]:
+    """Returns the microseconds spent in each top level package."""
+    packages: DefaultDict[str, int] = defaultdict(int)
+    for import_time in times:
+        packages[import_time.name.partition(".")[0]] += import_time.self_us
+    return dict(packages)
+
+
+def get_report(
+        times: Sequence[ImportTime], limit: int = IMPORT_PROFILE_LIMIT,
+) -> str:
+    """Returns a readable report of the slowest modules and packages."""
+    total = sum(import_time.self_us for import_time in times)
+    slowest = sorted(
+        times, key=lambda import_time: import_time.cumulative_us,
+        reverse=True,
+    )[:limit]
+    packages = sorted(
+        get_package_times(times).items(),
+        key=lambda package: package[1], reverse=True,
+    )[:limit]
+    lines = [f"Imported {len(times)} modules in {total / 1000:.1f} ms", ""]
+    lines.append(f"{'cumulative ms':>13}  {'self ms':>8}  module")
+    for import_time in slowest:
+        lines.append(
+            f"{import_time.cumulative_us / 1000:>13.1f}  "
+            f"{import_time.self_us / 1000:>8.1f}  {import_time.name}")
+    lines.extend(["", f"{'self ms':>13}  package"])
+    for package, self_us in packages:
+        lines.append(f"{self_us / 1000:>13.1f}  {package}")
+    return "\n".join(lines)
+
+
+def main(args: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Reports the time it takes to import a module.")
+    parser.add_argument(
+        "--module", default=IMPORT_PROFILE_MODULE,
+        help="The module to import.")
+    parser.add_argument(
+        "--limit", type=int, default=IMPORT_PROFILE_LIMIT,
+        help="The number of modules and packages listed.")
+    parser.add_argument(
+        "--json", action="store_true",
+        help="Print the import time of every module as JSON.")
+    options = parser.parse_args(args)
+
+    try:
+        times = profile_imports(options.module)
+    except ImportProfileError as e:
+        sys.exit(str(e))
+    if options.json:
+        print(json.dumps([import_time._asdict() for import_time in times]))
+    else:
+        print(get_report(times, options.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Offline detection of the language a text is written in.
+
+Each language has a profile of the character n-grams of a sample text,
+and a text is assigned the language whose profile makes its n-grams the
+most likely, with add-one smoothing. The profiles are built once, on
+first use, from app/resources/language_samples.json, so supporting
+another language takes a paragraph of it in that file.
+
+Short texts, such as event titles, are often closer to the wrong profile,
+and texts in scripts the samples don't cover always are. So a language is
+only returned if the text is long enough, its letters are covered by the
+samples, and the language is clearly more likely than the runner-up.
+"""
+from collections import Counter
+from functools import lru_cache
+import json
+import math
+import re
+from typing import Dict, Iterator, Optional
+
+from app.config import RESOURCES_DIR
+
+LANGUAGE_SAMPLES_FILE = RESOURCES_DIR / "language_samples.json"
+NGRAM_SIZES = (1, 2, 3)
+MIN_DETECTION_LETTERS = 5
+# The share of the letters of a text that must appear in the samples.
+MIN_KNOWN_LETTERS = 0.9
+# How many times more likely the best language must be than the next,
+# as a natural log. Naive Bayes overrates its certainty, so it is high.
+MIN_LOG_LIKELIHOOD_RATIO = 10
+
+LETTERS_REGEX = re.compile(r"[^\W\d_]+")
+
+
+def get_ngrams(text: str) -> Iterator[str]:
+    """Yields the character n-grams of the words of a text.
+
+    The words are padded with spaces, so their starts and ends are n-grams
+    of their own.
+    """
+    for word in LETTERS_REGEX.findall(text.lower()):
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for i in range(len(padded) - size + 1):
+                yield padded[i:i + size]
+
+
+class LanguageProfile:
+    """The log likelihood of each n-gram of a language."""
+
+    def __init__(self, sample: str):
+        counts = Counter(get_ngrams(sample))
+        total = sum(counts.values()) + len(counts)
+        self.log_likelihoods = {
+            ngram: math.log((count + 1) / total)
+            for ngram, count in counts.items()
+        }
+        self.unknown = math.log(1 / total)
+
+    def score(self, ngrams: Counter) -> float:
+        get = self.log_likelihoods.get
+        return sum(
+            get(ngram, self.unknown) * count
+            for ngram, count in ngrams.items()
+        )
+
+
+class LanguageDetector:
+    """Detects the languages of the samples.
+
+    Args:
+        samples: A sample text of each language, keyed by its ISO 639-1
+            code.
+    """
+
+    def __init__(self, samples: Dict[str, str]):
+        self.profiles = {
+            code: LanguageProfile(sample) for code, sample in samples.items()
+        }
+        self.letters = set(get_ngrams(" ".join(samples.values()))) - {" "}
+
+    @classmethod
+    def from_file(cls, path=LANGUAGE_SAMPLES_FILE) -> "LanguageDetector":
+        with open(path, encoding="utf-8") as samples_file:
+            return cls(json.load(samples_file))
+
+    def detect(self, text: str) -> Optional[str]:
+        """Returns the code of the language of the text, or None if it
+        can't be told with confidence."""
+        letters = "".join(LETTERS_REGEX.findall(text.lower()))
+        if len(letters) < MIN_DETECTION_LETTERS:
+            return None
+        known = sum(letter in self.letters for letter in letters)
+        if known < len(letters) * MIN_KNOWN_LETTERS:
+            return None
+        ngrams = Counter(get_ngrams(text))
+        scores = sorted(
+            ((profile.score(ngrams), code)
+             for code, profile in self.profiles.items()),
+            reverse=True,
+        )
+        (best, code), (runner_up, _) = scores[:2]
+        if best - runner_up < MIN_LOG_LIKELIHOOD_RATIO:
+            return None
+        return code
+
+
+@lru_cache(maxsize=None)
+def get_detector() -> LanguageDetector:
+    return LanguageDetector.from_file()
+
+
+def detect_language(text: str) -> Optional[str]:
+    """Returns the ISO 639-1 code of the language of the text, or None if
+    it can't be told with confidence."""
+    return get_detector().detect(text)
@@ -1,49 +1,206 @@
-from datetime import date, datetime
-import json
-from typing import Any, Dict
+"""The Wikipedia events that happened on this day in history.
+
+The events of each date are fetched once, ahead of time, by a daily job
+that runs on the event loop, and are stored one row per date. The profile
+page only reads the stored events, so it never waits on the external
+service: if today's events are missing, it gets an empty list and their
+fetch is started in the background. Only one fetch runs per date, however
+many requests miss it.
+
+The fetches in flight are kept per event loop, since their futures can
+only be awaited on the loop they run on, and are cancelled on shutdown by
+`cancel_prefetches`.
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, MutableMapping, Optional
+import weakref
 
 from fastapi import Depends
 from loguru import logger
-import requests
-from sqlalchemy import func
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.exc import NoResultFound
 
+from app.database import get_session_factory, SessionFactory, SessionLocal
 from app.database.models import WikipediaEvents
 from app.dependencies import get_db
+from app.internal.http_client import http_client
 
+ON_THIS_DAY_URL = 'https://byabbe.se/on-this-day/{month}/{day}/events.json'
+ON_THIS_DAY_KEEP_DAYS = 7
+ON_THIS_DAY_RETRY_SECONDS = 60 * 60
+NO_EVENTS_WIKIPEDIA = 'https://en.wikipedia.org/'
 
-def insert_on_this_day_data(
-        db: Session = Depends(get_db)
-) -> Dict[str, Any]:
-    now = datetime.now()
-    day, month = now.day, now.month
-
-    res = requests.get(
-        f'https://byabbe.se/on-this-day/{month}/{day}/events.json')
-    text = json.loads(res.text)
-    res_events = text.get('events')
-    res_date = text.get('date')
-    res_wiki = text.get('wikipedia')
-    db.add(WikipediaEvents(events=res_events,
-                           date_=res_date, wikipedia=res_wiki))
+LoopFetches = Dict[date, asyncio.Future]
+
+_fetches: MutableMapping[asyncio.AbstractEventLoop, LoopFetches] = (
+    weakref.WeakKeyDictionary())
+
+
+def _get_url(day: date) -> str:
+    return ON_THIS_DAY_URL.format(month=day.month, day=day.day)
+
+
+def get_stored_events(db: Session, day: date) -> Optional[WikipediaEvents]:
+    return db.query(WikipediaEvents).filter(WikipediaEvents.day == day).first()
+
+
+def store_on_this_day_data(
+        db: Session, day: date, data: Dict[str, Any],
+) -> WikipediaEvents:
+    """Stores the events of a date, unless they are stored already.
+
+    Returns:
+        The stored events of the date.
+    """
+    db.add(WikipediaEvents(
+        events=data.get('events'),
+        date_=data.get('date'),
+        wikipedia=data.get('wikipedia'),
+        day=day,
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the events of the date first.
+        db.rollback()
+    return get_stored_events(db, day)
+
+
+async def fetch_on_this_day_data(day: date) -> Dict[str, Any]:
+    """Returns the events of a date from the external service.
+
+    Raises:
+        ServiceUnavailableError: If the service is unavailable.
+        httpx.HTTPStatusError: If the response is an error.
+    """
+    response = await http_client.request('on_this_day', 'GET', _get_url(day))
+    response.raise_for_status()
+    return response.json()
+
+
+async def _fetch_and_store(day: date, session_factory: SessionFactory) -> None:
+    session = session_factory()
+    try:
+        if get_stored_events(session, day) is not None:
+            return
+        data = await fetch_on_this_day_data(day)
+        store_on_this_day_data(session, day, data)
+    finally:
+        session.close()
+
+
+async def prefetch_on_this_day(
+        day: date, session_factory: SessionFactory = SessionLocal,
+) -> None:
+    """Fetches and stores the events of a date, if they are not stored.
+
+    Concurrent calls for the same date wait for a single fetch.
+
+    Raises:
+        ServiceUnavailableError: If the service is unavailable.
+        httpx.HTTPStatusError: If the response is an error.
+    """
+    fetches = _get_loop_fetches()
+    fetch = fetches.get(day)
+    if fetch is None:
+        fetch = asyncio.ensure_future(_fetch_and_store(day, session_factory))
+        fetches[day] = fetch
+        fetch.add_done_callback(lambda _: fetches.pop(day, None))
+    await asyncio.shield(fetch)
+
+
+def _get_loop_fetches() -> LoopFetches:
+    return _fetches.setdefault(asyncio.get_running_loop(), {})
+
+
+async def cancel_prefetches() -> None:
+    """Cancels the fetches in flight on the running loop, and waits for
+    them to stop."""
+    fetches = list(_get_loop_fetches().values())
+    for fetch in fetches:
+        fetch.cancel()
+    await asyncio.gather(*fetches, return_exceptions=True)
+
+
+def _prefetch_in_background(day: date, db: Session) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if day in _get_loop_fetches():
+        return
+
+    async def prefetch() -> None:
+        try:
+            await prefetch_on_this_day(day, get_session_factory(db))
+        except Exception as e:
+            logger.error(f'fetching on this day of {day} failed: {e}')
+
+    loop.create_task(prefetch())
+
+
+def prune_on_this_day_data(
+        db: Session, keep_days: int = ON_THIS_DAY_KEEP_DAYS,
+) -> int:
+    """Deletes the events of the dates before the last days.
+
+    Returns:
+        The number of rows deleted.
+    """
+    oldest = date.today() - timedelta(days=keep_days)
+    deleted = db.query(WikipediaEvents).filter(
+        (WikipediaEvents.day < oldest)
+        | (WikipediaEvents.day.is_(None)
+           & (WikipediaEvents.date_inserted
+              < datetime.combine(oldest, time.min)))
+    ).delete(synchronize_session=False)
     db.commit()
-    return text
+    return deleted
+
+
+async def run_prefetch_job(
+        session_factory: SessionFactory = SessionLocal,
+) -> None:
+    """Prefetches the events of today and tomorrow, and prunes the old
+    ones, once a day.
+
+    Failed fetches are retried after ON_THIS_DAY_RETRY_SECONDS.
+    """
+    while True:
+        today = date.today()
+        failed = False
+        for day in (today, today + timedelta(days=1)):
+            try:
+                await prefetch_on_this_day(day, session_factory)
+            except Exception as e:
+                failed = True
+                logger.error(f'prefetching on this day of {day} failed: {e}')
+        session = session_factory()
+        try:
+            prune_on_this_day_data(session)
+        except SQLAlchemyError as e:
+            logger.error(f'pruning on this day failed: {e}')
+        finally:
+            session.close()
+
+        tomorrow = datetime.combine(today + timedelta(days=1), time.min)
+        delay = (tomorrow - datetime.now()).total_seconds()
+        if failed:
+            delay = min(delay, ON_THIS_DAY_RETRY_SECONDS)
+        await asyncio.sleep(max(delay, 0))
 
 
 def get_on_this_day_events(
         db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
+    today = date.today()
     try:
-        data = (db.query(WikipediaEvents).
-                filter(
-            func.date(WikipediaEvents.date_inserted) == date.today()).
-                one())
-
-    except NoResultFound:
-        data = insert_on_this_day_data(db)
+        data = get_stored_events(db, today)
     except (SQLAlchemyError, AttributeError) as e:
         logger.error(f'on this day failed with error: {e}')
-        data = {'events': [], 'wikipedia': 'https://en.wikipedia.org/'}
+        return {'events': [], 'wikipedia': NO_EVENTS_WIKIPEDIA}
+    if data is None:
+        _prefetch_in_background(today, db)
+        return {'events': [], 'wikipedia': NO_EVENTS_WIKIPEDIA}
     return data
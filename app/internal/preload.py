@@ -0,0 +1,76 @@
+"""Lazy loading of the NLP dependencies.
+
+NLTK, word_forms and TextBlob take most of the startup time and memory of
+a worker, and only a few features use them, so they are imported and their
+data is downloaded on first use. A deployment that prefers paying the cost
+at startup lists the features to load in PRELOAD_FEATURES, and they are
+loaded when the app starts.
+"""
+from typing import Callable, Dict, Iterable
+
+from loguru import logger
+
+from app.config import PRELOAD_FEATURES
+
+NLTK_RESOURCES = {
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+
+def ensure_nltk_data(*names: str) -> None:
+    """Downloads the NLTK data packages that are not installed yet."""
+    import nltk
+
+    for name in names:
+        try:
+            nltk.data.find(NLTK_RESOURCES[name])
+        except LookupError:
+            logger.info(f"Downloading the NLTK data package {name}")
+            nltk.download(name, quiet=True)
+
+
+def _load_emotion() -> None:
+    from app.internal.emotion import get_lexicon
+
+    get_lexicon().load()
+
+
+def _load_flairs() -> None:
+    from app.routers.event_images import get_flair_matcher
+
+    get_flair_matcher()
+
+
+def _load_translation() -> None:
+    import textblob  # noqa: F401
+
+    from app.internal.language_detection import get_detector
+
+    get_detector()
+
+
+PRELOADERS: Dict[str, Callable[[], None]] = {
+    "emotion": _load_emotion,
+    "flairs": _load_flairs,
+    "translation": _load_translation,
+}
+
+
+def preload(features: Iterable[str] = PRELOAD_FEATURES) -> None:
+    """Loads the dependencies of the features ahead of their first use.
+
+    Args:
+        features: Optional; The names of the features, out of PRELOADERS.
+            Defaults to PRELOAD_FEATURES.
+
+    Raises:
+        ValueError: If a feature is unknown.
+    """
+    features = list(features)
+    unknown = set(features) - PRELOADERS.keys()
+    if unknown:
+        raise ValueError(f"Unknown preload features: {sorted(unknown)}")
+    for feature in features:
+        logger.info(f"Preloading {feature}")
+        PRELOADERS[feature]()
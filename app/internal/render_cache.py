@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from datetime import date
+import hashlib
+from typing import Callable, Hashable, Optional
+
+
+class RenderCache:
+    """A least recently used cache of rendered html fragments.
+
+    A fragment is stored under a key with the version of the data it was
+    rendered from, and is replaced once it is requested with another version.
+    The key and version are expected to hold every input of the rendering
+    except the current date. The cache is cleared when the day rolls over,
+    since the fragments highlight "today".
+
+    Args:
+        maxsize: The number of fragments kept.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._fragments: OrderedDict = OrderedDict()
+        self._today: Optional[date] = None
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def clear(self) -> None:
+        self._fragments.clear()
+
+    def _check_day_rollover(self) -> None:
+        today = date.today()
+        if today != self._today:
+            self.clear()
+            self._today = today
+
+    def etag(self, key: Hashable, version: Hashable) -> str:
+        """Returns the entity tag of the fragment of the key and version."""
+        self._check_day_rollover()
+        tag = repr((self._today, key, version)).encode()
+        return f'"{hashlib.sha1(tag).hexdigest()}"'
+
+    def get_or_render(
+            self, key: Hashable, version: Hashable, render: Callable[[], str],
+    ) -> str:
+        """Returns the fragment of the key and version, rendering if needed."""
+        self._check_day_rollover()
+        cached = self._fragments.get(key)
+        if cached is not None and cached[0] == version:
+            self._fragments.move_to_end(key)
+            return cached[1]
+        fragment = render()
+        self._fragments[key] = (version, fragment)
+        self._fragments.move_to_end(key)
+        if len(self._fragments) > self.maxsize:
+            self._fragments.popitem(last=False)
+        return fragment
@@ -1,17 +1,76 @@
-from typing import Optional
+"""Translation of texts to the users' languages.
+
+The language of a text is detected offline, and only the translation is a
+round trip to the translation service. Translations are kept in a least
+recently used cache in memory, backed by the translations table, so a text
+is sent to the service once per source and target language. Texts whose
+language can't be detected with confidence, such as short titles, are
+left for the service to detect, and since their source language is
+unknown their translations are only cached in memory.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
 
 from fastapi import HTTPException, status
 from iso639 import languages
 from loguru import logger
-from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.session import Session
-from textblob import download_corpora, TextBlob
-from textblob.exceptions import NotTranslated
 
-from app.database.models import Language
-from app.routers.user import get_users
+from app.database.models import Language, Translation, User
+from app.internal.language_detection import detect_language
 
-download_corpora.download_all()
+TRANSLATION_CACHE_SIZE = 4096
+TRANSLATION_WORKERS = 4
+# The source language of the texts the service detects.
+AUTO_DETECT = "auto"
+
+TranslationKey = Tuple[str, str, str]
+
+
+class TranslationCache:
+    """A thread-safe least recently used cache of translations.
+
+    Args:
+        maxsize: Optional; The number of translations kept.
+            Defaults to TRANSLATION_CACHE_SIZE.
+    """
+
+    def __init__(self, maxsize: int = TRANSLATION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._translations: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._translations)
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            translation = self._translations.get(key)
+            if translation is not None:
+                self._translations.move_to_end(key)
+            return translation
+
+    def set(self, key: Hashable, translation: str) -> None:
+        with self._lock:
+            self._translations[key] = translation
+            self._translations.move_to_end(key)
+            if len(self._translations) > self.maxsize:
+                self._translations.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._translations.clear()
+
+
+translation_cache = TranslationCache()
+
+
+def get_text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
 
 
 def translate_text_for_user(text: str, session: Session, user_id: int) -> str:
@@ -28,12 +87,13 @@ def translate_text_for_user(text: str, session: Session, user_id: int) -> str:
     target_lang = _get_user_language(user_id, session)
     if not target_lang:
         return text
-    return translate_text(text, target_lang)
+    return translate_text(text, target_lang, session=session)
 
 
 def translate_text(text: str,
                    target_lang: str,
                    original_lang: Optional[str] = None,
+                   session: Optional[Session] = None,
                    ) -> str:
     """Translates text to the target language.
 
@@ -41,26 +101,144 @@ def translate_text(text: str,
         text: The text in the original language.
         target_lang: The language to translate the text into.
         original_lang: Optional; The language of the text.
+        session: Optional; The database connection of the persistent
+            translations cache.
 
     Returns:
         The translated text.
     """
-    if not text.strip():
-        return ""
-    if original_lang is None:
-        language_code = _detect_text_language(text)
-    else:
-        language_code = _get_language_code(original_lang)
+    return translate_many([text], target_lang, original_lang, session)[0]
 
-    if language_code == _get_language_code(target_lang):
-        return text
 
+def translate_many(texts: Iterable[str],
+                   target_lang: str,
+                   original_lang: Optional[str] = None,
+                   session: Optional[Session] = None,
+                   ) -> List[str]:
+    """Translates texts to the target language.
+
+    Each distinct text is translated once. The translations are looked up
+    in memory, then in the database, and the rest are translated
+    concurrently and saved in both, unless the service detected their
+    language.
+
+    Args:
+        texts: The texts in the original language.
+        target_lang: The language to translate the texts into.
+        original_lang: Optional; The language of the texts. If it is not
+            given, the language of each text is detected, offline or by
+            the service.
+        session: Optional; The database connection of the persistent
+            translations cache.
+
+    Returns:
+        The translated texts, in the order of the texts.
+    """
+    texts = list(texts)
+    target = _get_language_code(target_lang)
+    source = None if original_lang is None else _get_language_code(
+        original_lang)
+
+    keys: Dict[str, TranslationKey] = {}
+    for text in set(texts):
+        if not any(char.isalpha() for char in text):
+            continue
+        text_source = source or _detect_text_language(text) or AUTO_DETECT
+        if text_source != target:
+            keys[text] = (get_text_hash(text), text_source, target)
+
+    translations: Dict[str, str] = {}
+    missing: Dict[str, TranslationKey] = {}
+    for text, key in keys.items():
+        translation = translation_cache.get(key)
+        if translation is None:
+            missing[text] = key
+        else:
+            translations[text] = translation
+
+    if missing and session is not None:
+        stored = _get_stored_translations(session, target, (
+            key for key in missing.values() if key[1] != AUTO_DETECT))
+        for text, key in list(missing.items()):
+            if key in stored:
+                translations[text] = stored[key]
+                translation_cache.set(key, stored[key])
+                del missing[text]
+
+    if missing:
+        translated = _translate_remotely(missing)
+        for text, key in missing.items():
+            translations[text] = translated[text]
+            translation_cache.set(key, translated[text])
+        detected = {
+            text: key for text, key in missing.items()
+            if key[1] != AUTO_DETECT
+        }
+        if session is not None and detected:
+            _store_translations(session, detected, translated)
+
+    return [
+        translations.get(text, text) if text.strip() else ""
+        for text in texts
+    ]
+
+
+def _translate_remotely(texts: Dict[str, TranslationKey]) -> Dict[str, str]:
+    from textblob import TextBlob
+    from textblob.exceptions import NotTranslated
+
+    def translate(text: str, source: str, target: str) -> str:
+        try:
+            return str(TextBlob(text).translate(from_lang=source, to=target))
+        except NotTranslated:
+            return text
+
+    workers = min(TRANSLATION_WORKERS, len(texts))
+    with ThreadPoolExecutor(workers) as executor:
+        translated = executor.map(
+            lambda item: translate(item[0], *item[1][1:]), texts.items(),
+        )
+        return dict(zip(texts, translated))
+
+
+def _get_stored_translations(
+        session: Session, target: str, keys: Iterable[TranslationKey],
+) -> Dict[TranslationKey, str]:
+    keys = set(keys)
+    rows = session.query(
+        Translation.text_hash, Translation.source, Translation.translation,
+    ).filter(
+        Translation.target == target,
+        Translation.text_hash.in_([text_hash for text_hash, _, _ in keys]),
+    )
+    stored = {}
+    for row in rows:
+        key = (row.text_hash, row.source, target)
+        if key in keys:
+            stored[key] = row.translation
+    return stored
+
+
+def _store_translations(
+        session: Session,
+        keys: Dict[str, TranslationKey],
+        translations: Dict[str, str],
+) -> None:
+    session.add_all(
+        Translation(
+            text_hash=text_hash,
+            source=source,
+            target=target,
+            translation=translations[text],
+        )
+        for text, (text_hash, source, target) in keys.items()
+    )
     try:
-        return str(TextBlob(text).translate(
-            from_lang=language_code,
-            to=_get_language_code(target_lang)))
-    except NotTranslated:
-        return text
+        session.commit()
+    except IntegrityError as e:
+        # Another request stored some of the translations first.
+        session.rollback()
+        logger.warning(f"Storing {len(keys)} translations failed: {e}")
 
 
 def _get_user_language(user_id: int, session: Session) -> str:
@@ -74,38 +252,36 @@ def _get_user_language(user_id: int, session: Session) -> str:
         The language name.
 
     Raises:
-        HTTPException: If no language or multiple languages were
-            found for the user.
+        HTTPException: If no language was found for the user.
     """
-    try:
-        user = get_users(session, id=user_id)[0]
-    except IndexError:
-        logger.exception("User was not found in the database.")
+    user = session.query(User.language_id, Language.name).outerjoin(
+        Language, User.language_id == Language.id,
+    ).filter(User.id == user_id).first()
+    if user is None:
+        logger.error("User was not found in the database.")
         return ""
-    try:
-        return _get_language_by_id(user.language_id, session)
-    except (AttributeError, MultipleResultsFound, NoResultFound) as e:
-        logger.critical(e)
+    if user.name is None:
+        logger.critical(f"Language {user.language_id} was not found.")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail='Error raised',
         )
+    return user.name
 
 
-def _detect_text_language(text: str) -> str:
+def _detect_text_language(text: str) -> Optional[str]:
     """Returns the language code of the language a given text is written in.
 
-    The language is found using TextBlot to detect the language.
-    TextBlot requires an internet connection.
-
+    The language is detected offline, by the character n-grams of the text.
 
     Args:
         text: The text in the original language.
 
     Returns:
-        The language code of the language the text is written in.
+        The language code of the language the text is written in, or None
+        if it can't be told with confidence.
     """
-    return str(TextBlob(text).detect_language())
+    return detect_language(text)
 
 
 def _get_language_code(language_name: str) -> str:
@@ -118,21 +294,3 @@ def _get_language_code(language_name: str) -> str:
         The language code.
     """
     return languages.get(name=language_name.capitalize()).alpha2
-
-
-def _get_language_by_id(language_id: int, session: Session) -> str:
-    """Returns a language name from its ID.
-
-    Args:
-        language_id: The language ID.
-        session: The database connection.
-
-    Returns:
-        The language name.
-    """
-    try:
-        language = session.query(Language.name).filter_by(id=language_id).one()
-    except (AttributeError, MultipleResultsFound, NoResultFound) as e:
-        logger.critical(e)
-        raise AttributeError(e)
-    return language.name
@@ -1,10 +1,12 @@
+from collections import defaultdict
 import datetime
-import functools
 
-import frozendict
-import requests
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
 
 from app import config
+from app.database.models import WeatherDay
+from app.internal.http_client import http_client, ServiceUnavailableError
 
 # This feature requires an API KEY
 #  get yours free @ visual-crossing-weather.p.rapidapi.com
@@ -18,14 +20,25 @@
 FORECAST_TYPE = "forecast"
 INVALID_DATE_INPUT = "Invalid date input provided"
 INVALID_YEAR = "Year is out of supported range"
-HISTORY_URL = "https://visual-crossing-weather.p.rapidapi.com/history"
-FORECAST_URL = "https://visual-crossing-weather.p.rapidapi.com/forecast"
+WEATHER_API_URL = "https://visual-crossing-weather.p.rapidapi.com"
+HISTORY_URL = f"{WEATHER_API_URL}/history"
+FORECAST_URL = f"{WEATHER_API_URL}/forecast"
 HEADERS = {'x-rapidapi-host': "visual-crossing-weather.p.rapidapi.com"}
 BASE_QUERY_STRING = {"aggregateHours": "24", "unitGroup": "metric",
                      "dayStartTime": "00:00:01", "contentType": "json",
                      "dayEndTime": "23:59:59", "shortColumnNames": "True"}
 HISTORICAL_AVERAGE_NUM_OF_YEARS = 3
+# The days of a forecast, starting today.
+FORECAST_DAYS = 15
 NO_API_RESPONSE = "No response from server"
+NO_WEATHER_FOR_DATE = "No weather data for the requested date"
+# The days a stored day is fresh for, by its forecast type. History does
+# not change, and a forecast is fetched at most once a day.
+WEATHER_MAX_AGE_DAYS = {
+    HISTORY_TYPE: None,
+    FORECAST_TYPE: 0,
+    HISTORICAL_FORECAST_TYPE: 30,
+}
 
 
 def validate_date_input(requested_date):
@@ -43,26 +56,16 @@ def validate_date_input(requested_date):
             return False, INVALID_YEAR
 
 
-def freezeargs(func):
-    """Transform mutable dictionary into immutable
-    Credit to 'fast_cen' from 'stackoverflow'
-    https://stackoverflow.com/questions/6358481/
-    using-functools-lru-cache-with-dictionary-arguments
+def normalize_location(location):
+    """ return the key a location is stored under.
+    Args:
+        location (str) - location name.
+    Returns:
+        (str) - the location in lower case, with single spaces.
     """
+    return " ".join(location.casefold().split())
 
-    @functools.wraps(func)
-    def wrapped(*args, **kwargs):
-        args = tuple([frozendict.frozendict(arg)
-                      if isinstance(arg, dict) else arg for arg in args])
-        kwargs = {k: frozendict.frozendict(v) if isinstance(v, dict) else v
-                  for k, v in kwargs.items()}
-        return func(*args, **kwargs)
 
-    return wrapped
-
-
-@freezeargs
-@functools.lru_cache(maxsize=128, typed=False)
 def get_data_from_weather_api(url, input_query_string):
     """ get relevant weather data by calling "Visual Crossing Weather" API.
     Args:
@@ -72,11 +75,12 @@ def get_data_from_weather_api(url, input_query_string):
         (json) - JSON data returned by the API.
         (str) - error message.
     """
-    HEADERS['x-rapidapi-key'] = config.WEATHER_API_KEY
+    headers = dict(HEADERS)
+    headers['x-rapidapi-key'] = config.WEATHER_API_KEY
     try:
-        response = requests.request("GET", url,
-                                    headers=HEADERS, params=input_query_string)
-    except requests.exceptions.RequestException:
+        response = http_client.request_sync(
+            "weather", "GET", url, headers=headers, params=input_query_string)
+    except ServiceUnavailableError:
         return None, NO_API_RESPONSE
     if response.ok:
         try:
@@ -87,65 +91,9 @@ def get_data_from_weather_api(url, input_query_string):
         return None, NO_API_RESPONSE
 
 
-def get_historical_weather(input_date, location):
-    """ get the relevant weather from history by calling the API.
-    Args:
-        input_date (date) - date requested for forecast.
-        location (str) - location name.
-    Returns:
-        weather_data (json) - output weather data.
-        error_text (str) - error message.
-    """
-    input_query_string = BASE_QUERY_STRING
-    input_query_string["startDateTime"] = input_date.isoformat()
-    input_query_string["endDateTime"] = \
-        (input_date + datetime.timedelta(days=1)).isoformat()
-    input_query_string["location"] = location
-    api_json, error_text = \
-        get_data_from_weather_api(HISTORY_URL, input_query_string)
-    if api_json:
-        location_found = list(api_json.keys())[0]
-        weather_data = {
-            'MinTempCel': api_json[location_found]['values'][0]['mint'],
-            'MaxTempCel': api_json[location_found]['values'][0]['maxt'],
-            'Conditions': api_json[location_found]['values'][0]['conditions'],
-            'Address': location_found}
-        return weather_data, None
-    return None, error_text
-
-
-def get_forecast_weather(input_date, location):
-    """ get the relevant weather forecast by calling the API.
-    Args:
-        input_date (date) - date requested for forecast.
-        location (str) - location name.
-    Returns:
-        weather_data (json) - output weather data.
-        error_text (str) - error message.
-    """
-    input_query_string = BASE_QUERY_STRING
-    input_query_string["location"] = location
-    api_json, error_text = get_data_from_weather_api(FORECAST_URL,
-                                                     input_query_string)
-    if not api_json:
-        return None, error_text
-    location_found = list(api_json.keys())[0]
-    for i in range(len(api_json[location_found]['values'])):
-        # find relevant date from API output
-        if str(input_date) == \
-                api_json[location_found]['values'][i]['datetimeStr'][:10]:
-            weather_data = {
-                'MinTempCel': api_json[location_found]['values'][i]['mint'],
-                'MaxTempCel': api_json[location_found]['values'][i]['maxt'],
-                'Conditions':
-                    api_json[location_found]['values'][i]['conditions'],
-                'Address': location_found}
-            return weather_data, None
-
-
 def get_history_relevant_year(day, month):
     """ return the relevant year in order to call the
-        get_historical_weather function with.
+        get_historical_date function with.
         decided according to if date occurred this year or not.
     Args:
         day (int) - day part of date.
@@ -170,27 +118,21 @@ def get_history_relevant_year(day, month):
     return last_year
 
 
-def get_forecast_by_historical_data(day, month, location):
-    """ get historical average weather by calling the
-        get_historical_weather function.
+def get_historical_date(requested_date):
+    """ return the past date whose weather forecasts a future date.
     Args:
-        day (int) - day part of date.
-        month (int) - month part of date.
-        location (str) - location name.
+        requested_date (date) - date requested for forecast.
     Returns:
-        (json) - output weather data.
-        (str) - error message.
+        (date) - the same day in the relevant year.
     """
+    day, month = requested_date.day, requested_date.month
     relevant_year = get_history_relevant_year(day, month)
     try:
-        input_date = datetime.datetime(year=relevant_year, month=month,
-                                       day=day)
+        return datetime.date(year=relevant_year, month=month, day=day)
     except ValueError:
         # if date = 29.02 and there is no such date
         # on the relevant year
-        input_date = datetime.datetime(year=relevant_year, month=month,
-                                       day=day - 1)
-    return get_historical_weather(input_date, location)
+        return datetime.date(year=relevant_year, month=month, day=day - 1)
 
 
 def get_forecast_type(input_date):
@@ -203,42 +145,279 @@ def get_forecast_type(input_date):
     delta = (input_date - datetime.datetime.now().date()).days
     if delta < -1:
         return HISTORY_TYPE
-    elif delta > 15:
+    elif delta >= FORECAST_DAYS:
         return HISTORICAL_FORECAST_TYPE
     else:
         return FORECAST_TYPE
 
 
-def get_forecast(requested_date, location):
-    """ call relevant forecast function according to the relevant type:
-        "forecast" / "history" / "historical average".
+def _get_dates(start, end):
+    return [start + datetime.timedelta(days=offset)
+            for offset in range((end - start).days + 1)]
+
+
+def _get_values_by_date(api_json, start):
+    """ return the days of an API response by their dates.
+    Args:
+        api_json (json) - the locations returned by the API.
+        start (date) - the first date requested, for responses
+            without dates.
+    Returns:
+        (dict) - the weather of each date.
+    """
+    location_found = list(api_json.keys())[0]
+    values_by_date = {}
+    for i, values in enumerate(api_json[location_found]['values']):
+        if values.get('datetimeStr'):
+            day = datetime.date.fromisoformat(values['datetimeStr'][:10])
+        elif start is not None:
+            day = start + datetime.timedelta(days=i)
+        else:
+            continue
+        values_by_date[day] = {
+            'MinTempCel': values['mint'],
+            'MaxTempCel': values['maxt'],
+            'Conditions': values['conditions'],
+            'Address': location_found}
+    return values_by_date
+
+
+class WeatherStore:
+    """ the weather of days, fetched from the API by ranges and stored.
+
+    Each API call returns the weather of many days, such as the 15 days of
+    a forecast, and every day returned is stored by location and date.
+    Days are fetched again once stale, by their forecast type, and stale
+    days are served while the API is unavailable.
+
+    Args:
+        session (Session) - optional; the database connection. without it,
+            nothing is stored.
+        base_url (str) - optional; the url of the API. defaults to
+            WEATHER_API_URL.
+    """
+
+    def __init__(self, session=None, base_url=None):
+        self.session = session
+        base_url = base_url or WEATHER_API_URL
+        self.history_url = f"{base_url}/history"
+        self.forecast_url = f"{base_url}/forecast"
+
+    def get(self, requested_date, location):
+        """ get the weather of a date.
+        Args:
+            requested_date (date) - date requested for forecast.
+            location (str) - location name.
+        Returns:
+            weather_json (json) - output weather data.
+            error_text (str) - error message.
+        """
+        weather, error_text = self.get_range(
+            requested_date, requested_date, location)
+        if requested_date in weather:
+            return weather[requested_date], None
+        return None, error_text or NO_WEATHER_FOR_DATE
+
+    def get_range(self, start, end, location):
+        """ get the weather of each date from start to end, such as the
+            days of a visible week or month.
+        Args:
+            start (date) - first date.
+            end (date) - last date, inclusive.
+            location (str) - location name.
+        Returns:
+            weather (dict) - output weather data by date, for the dates
+                found.
+            error_text (str) - error message of the dates not found.
+        """
+        key = normalize_location(location)
+        dates = _get_dates(start, end)
+        stored = self._get_stored(key, start, end)
+        today = datetime.datetime.now().date()
+        weather = {}
+        missing = defaultdict(list)
+        for day in dates:
+            forecast_type = get_forecast_type(day)
+            row = stored.get(day)
+            if row is not None and _is_fresh(row, forecast_type, today):
+                weather[day] = _to_weather_json(row)
+            else:
+                missing[forecast_type].append(day)
+        if not missing:
+            return weather, None
+
+        fetched = {}
+        error_text = None
+        if missing[FORECAST_TYPE]:
+            found, error_text = self._fetch_forecast(location)
+            fetched.update(found)
+            # The forecast starts today, yesterday is in the history.
+            missing[HISTORY_TYPE].extend(
+                day for day in missing[FORECAST_TYPE]
+                if day not in found and day < today)
+        if missing[HISTORY_TYPE]:
+            found, history_error = self._fetch_history(
+                location, missing[HISTORY_TYPE])
+            for day, weather_json in found.items():
+                fetched.setdefault(day, weather_json)
+            error_text = history_error or error_text
+        if missing[HISTORICAL_FORECAST_TYPE]:
+            found, history_error = self._fetch_historical_forecast(
+                location, missing[HISTORICAL_FORECAST_TYPE])
+            fetched.update(found)
+            error_text = history_error or error_text
+
+        if self.session is not None and fetched:
+            self._store(key, fetched, stored)
+        for day in dates:
+            if day not in weather and day in fetched:
+                weather[day] = fetched[day]
+            elif day not in weather and day in stored:
+                # The API is unavailable, a stale day beats none.
+                weather[day] = _to_weather_json(stored[day])
+        return weather, error_text
+
+    def _fetch(self, url, location, start=None, end=None):
+        input_query_string = dict(BASE_QUERY_STRING, location=location)
+        if start is not None:
+            input_query_string["startDateTime"] = start.isoformat()
+            input_query_string["endDateTime"] = \
+                (end + datetime.timedelta(days=1)).isoformat()
+        api_json, error_text = get_data_from_weather_api(
+            url, input_query_string)
+        if not api_json:
+            return {}, error_text
+        return _get_values_by_date(api_json, start), None
+
+    def _fetch_forecast(self, location):
+        found, error_text = self._fetch(self.forecast_url, location)
+        for weather_json in found.values():
+            weather_json['ForecastType'] = FORECAST_TYPE
+        return found, error_text
+
+    def _fetch_history(self, location, dates):
+        found, error_text = self._fetch(
+            self.history_url, location, min(dates), max(dates))
+        for weather_json in found.values():
+            weather_json['ForecastType'] = HISTORY_TYPE
+        return found, error_text
+
+    def _fetch_historical_forecast(self, location, dates):
+        """ forecast the dates by the same days in past years, with a
+            history call per year."""
+        dates_by_year = defaultdict(list)
+        for day in dates:
+            historical_date = get_historical_date(day)
+            dates_by_year[historical_date.year].append((day, historical_date))
+        fetched = {}
+        error_text = None
+        for year_dates in dates_by_year.values():
+            historical_dates = [past for _, past in year_dates]
+            found, year_error = self._fetch(
+                self.history_url, location,
+                min(historical_dates), max(historical_dates))
+            error_text = year_error or error_text
+            for day, historical_date in year_dates:
+                if historical_date in found:
+                    fetched[day] = dict(
+                        found[historical_date],
+                        ForecastType=HISTORICAL_FORECAST_TYPE)
+        return fetched, error_text
+
+    def _get_stored(self, key, start, end):
+        if self.session is None:
+            return {}
+        rows = self.session.query(WeatherDay).filter(
+            WeatherDay.location == key,
+            WeatherDay.date.between(start, end),
+        )
+        return {row.date: row for row in rows}
+
+    def _store(self, key, fetched, stored):
+        outside_range = set(fetched) - set(stored)
+        if outside_range:
+            stored = dict(stored)
+            stored.update(
+                (row.date, row) for row in self.session.query(WeatherDay)
+                .filter(WeatherDay.location == key,
+                        WeatherDay.date.in_(list(outside_range))))
+        fetched_at = datetime.datetime.now()
+        for day, weather_json in fetched.items():
+            row = stored.get(day)
+            if row is None:
+                row = WeatherDay(location=key, date=day)
+                self.session.add(row)
+            row.forecast_type = weather_json['ForecastType']
+            row.min_temp = weather_json['MinTempCel']
+            row.max_temp = weather_json['MaxTempCel']
+            row.conditions = weather_json['Conditions']
+            row.address = weather_json['Address']
+            row.fetched_at = fetched_at
+        try:
+            self.session.commit()
+        except IntegrityError as e:
+            # Another request stored some of the days first.
+            self.session.rollback()
+            logger.warning(f"Storing the weather of {key} failed: {e}")
+
+
+def _is_fresh(row, forecast_type, today):
+    if row.forecast_type == HISTORY_TYPE:
+        return True
+    if row.forecast_type != forecast_type:
+        return False
+    max_age = WEATHER_MAX_AGE_DAYS[forecast_type]
+    return max_age is None or (today - row.fetched_at.date()).days <= max_age
+
+
+def _to_weather_json(row):
+    return {
+        'MinTempCel': row.min_temp,
+        'MaxTempCel': row.max_temp,
+        'Conditions': row.conditions,
+        'Address': row.address,
+        'ForecastType': row.forecast_type,
+    }
+
+
+def get_forecast(requested_date, location, session=None):
+    """ get the weather of the date from the store, which calls the
+        relevant forecast type: "forecast" / "history" / "historical
+        average".
     Args:
         requested_date (date) - date requested for forecast.
         location (str) - location name.
+        session (Session) - optional; the database connection.
     Returns:
         weather_json (json) - output weather data.
         error_text (str) - error message.
     """
-    forecast_type = get_forecast_type(requested_date)
-    if forecast_type == HISTORY_TYPE:
-        weather_json, error_text = get_historical_weather(requested_date,
-                                                          location)
-    if forecast_type == FORECAST_TYPE:
-        weather_json, error_text = get_forecast_weather(requested_date,
-                                                        location)
-    if forecast_type == HISTORICAL_FORECAST_TYPE:
-        weather_json, error_text = get_forecast_by_historical_data(
-            requested_date.day, requested_date.month, location)
-    if weather_json:
-        weather_json['ForecastType'] = forecast_type
-    return weather_json, error_text
-
-
-def get_weather_data(requested_date, location):
+    return WeatherStore(session).get(requested_date, location)
+
+
+def _get_output(weather_json, error_text):
+    output = {}
+    if weather_json is None:
+        output["Status"] = ERROR_STATUS
+        output["ErrorDescription"] = error_text
+    else:
+        output["Status"] = SUCCESS_STATUS
+        output["ErrorDescription"] = None
+        output["MinTempFar"] = round((weather_json['MinTempCel'] * 9 / 5)
+                                     + 32)
+        output["MaxTempFar"] = round((weather_json['MaxTempCel'] * 9 / 5)
+                                     + 32)
+        output.update(weather_json)
+    return output
+
+
+def get_weather_data(requested_date, location, session=None):
     """ get weather data for date & location - main function.
     Args:
         requested_date (date) - date requested for forecast.
         location (str) - location name.
+        session (Session) - optional; the database connection of the
+            weather store.
     Returns: dictionary with the following entries:
         Status - success / failure.
         ErrorDescription - error description (relevant only in case of error).
@@ -253,24 +432,34 @@ def get_weather_data(requested_date, location):
                             relevant for future dates (more then forecast).
         Address - The location found by the service.
     """
-    output = {}
     requested_date = datetime.date(requested_date.year, requested_date.month,
                                    requested_date.day)
     valid_input, error_text = validate_date_input(requested_date)
-    if valid_input:
-        weather_json, error_text = get_forecast(requested_date, location)
-        if error_text:
-            output["Status"] = ERROR_STATUS
-            output["ErrorDescription"] = error_text
-        else:
-            output["Status"] = SUCCESS_STATUS
-            output["ErrorDescription"] = None
-            output["MinTempFar"] = round((weather_json['MinTempCel'] * 9 / 5)
-                                         + 32)
-            output["MaxTempFar"] = round((weather_json['MaxTempCel'] * 9 / 5)
-                                         + 32)
-            output.update(weather_json)
-    else:
-        output["Status"] = ERROR_STATUS
-        output["ErrorDescription"] = error_text
-    return output
+    if not valid_input:
+        return _get_output(None, error_text)
+    return _get_output(*get_forecast(requested_date, location, session))
+
+
+def get_weather_range(start, end, location, session=None):
+    """ get weather data for each date of a range, such as a visible week
+        or month, with at most an API call per forecast type.
+    Args:
+        start (date) - first date.
+        end (date) - last date, inclusive.
+        location (str) - location name.
+        session (Session) - optional; the database connection of the
+            weather store.
+    Returns:
+        (dict) - the output of get_weather_data for each date.
+    """
+    dates = _get_dates(start, end)
+    for requested_date in (start, end):
+        valid_input, error_text = validate_date_input(requested_date)
+        if not valid_input:
+            return {day: _get_output(None, error_text) for day in dates}
+    weather, error_text = WeatherStore(session).get_range(
+        start, end, location)
+    return {
+        day: _get_output(weather.get(day), error_text or NO_WEATHER_FOR_DATE)
+        for day in dates
+    }
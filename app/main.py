@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import Depends, FastAPI, Request, status
 from fastapi.openapi.docs import (
     get_swagger_ui_html,
@@ -9,10 +11,15 @@
 from app import config
 from app.database import engine, models
 from app.dependencies import get_db, logger, MEDIA_PATH, STATIC_PATH, templates
-from app.internal import daily_quotes, json_data_loader
+from app.internal import (
+    daily_quotes, emotion_tagging, json_data_loader, on_this_day_events,
+)
+from app.internal.http_client import http_client
 from app.internal.languages import set_ui_language
+from app.internal.preload import preload
 from app.internal.security.ouath2 import auth_exception_handler
 from app.routers.salary import routes as salary
+from app.telegram.bot import telegram_dispatcher
 from app.utils.extending_openapi import custom_openapi
 
 
@@ -25,9 +32,14 @@ def create_tables(engine, psql_environment):
         )
     else:
         models.Base.metadata.create_all(bind=engine)
+        models.add_missing_columns(engine)
+        models.upgrade_wikipedia_events(engine)
+        models.upgrade_oauth_credentials(engine)
+        models.create_missing_indexes(engine)
 
 
 create_tables(engine, config.PSQL_ENVIRONMENT)
+emotion_tagging.register_listeners()
 
 app = FastAPI(title="Pylander", docs_url=None)
 app.mount("/static", StaticFiles(directory=STATIC_PATH), name="static")
@@ -42,13 +54,50 @@ def create_tables(engine, psql_environment):
 from app.routers import (  # noqa: E402
     about_us, agenda, calendar, categories, celebrity, credits,
     currency, dayview, email, event, export, four_o_four, friendview,
-    google_connect, invitation, login, logout, profile,
+    google_connect, import_jobs, invitation, login, logout, profile,
     register, search, telegram, user, weekview, whatsapp,
 )
 
 json_data_loader.load_to_database(next(get_db()))
 
 
+@app.on_event("startup")
+def preload_features():
+    preload(config.PRELOAD_FEATURES)
+
+
+@app.on_event("startup")
+async def start_prefetch_jobs():
+    app.state.on_this_day_job = None
+    if config.PREFETCH_ON_THIS_DAY:
+        app.state.on_this_day_job = asyncio.ensure_future(
+            on_this_day_events.run_prefetch_job())
+
+
+@app.on_event("shutdown")
+async def stop_prefetch_jobs():
+    job = app.state.on_this_day_job
+    if job is not None:
+        job.cancel()
+        await asyncio.gather(job, return_exceptions=True)
+    await on_this_day_events.cancel_prefetches()
+
+
+@app.on_event("shutdown")
+def stop_emotion_tagger():
+    emotion_tagging.emotion_tagger.close()
+
+
+@app.on_event("shutdown")
+async def stop_telegram_dispatcher():
+    await telegram_dispatcher.close()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
     return get_swagger_ui_html(
@@ -81,6 +130,7 @@ async def swagger_ui_redirect():
     export.router,
     four_o_four.router,
     google_connect.router,
+    import_jobs.router,
     invitation.router,
     login.router,
     logout.router,
@@ -1,3 +0,0 @@
-import nltk
-
-nltk.download('punkt')
@@ -1,12 +1,22 @@
+from datetime import date, timedelta
 from http import HTTPStatus
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
+from jinja2 import Markup
+from sqlalchemy.orm import Session
 from starlette.responses import Response
 
-from app.dependencies import templates
+from app.dependencies import get_db, templates
+from app.internal.event_changes import get_events_version
+from app.internal.render_cache import RenderCache
+from app.internal.security.dependancies import current_user
+from app.internal.security.schema import CurrentUser
 from app.routers import calendar_grid as cg
 
+WEEKS_CACHE_SIZE = 512
+WEEKS_CACHE_CONTROL = "private, no-cache"
+
 router = APIRouter(
     prefix="/calendar/month",
     tags=["calendar"],
@@ -14,29 +24,77 @@
     include_in_schema=False
 )
 
+weeks_cache = RenderCache(maxsize=WEEKS_CACHE_SIZE)
+
+
+def get_weeks_version(session: Session, user_id: int) -> int:
+    return get_events_version(session, user_id).version
+
+
+def render_weeks(
+    session: Session,
+    user_id: int,
+    last_day: date,
+    days: int,
+    version: int,
+) -> str:
+    """Returns the weeks of the n days after `last_day`, with the user's
+    events, rendered once per events version and day."""
+    def render() -> str:
+        weeks = cg.create_weeks(cg.get_n_days(last_day, days))
+        weeks = cg.add_user_events(session, user_id, weeks)
+        template = templates.get_template(
+            'partials/calendar/monthly_view/add_week.html')
+        return template.render(weeks_block=weeks)
+
+    return weeks_cache.get_or_render(
+        (user_id, last_day, days), version, render,
+    )
+
 
 @router.get("/")
-async def calendar(request: Request) -> Response:
+async def calendar(
+    request: Request,
+    session: Session = Depends(get_db),
+    user: CurrentUser = Depends(current_user),
+) -> Response:
     user_local_time = cg.Day.get_user_local_time()
     day = cg.create_day(user_local_time)
+    first_day = cg.get_first_day_month_block(day.date)
+    weeks_html = render_weeks(
+        session,
+        user.user_id,
+        first_day - timedelta(days=1),
+        cg.Week.WEEK_DAYS * cg.MONTH_BLOCK,
+        get_weeks_version(session, user.user_id),
+    )
     return templates.TemplateResponse(
         "calendar_monthly_view.html",
         {
             "request": request,
             "day": day,
             "week_days": cg.Week.DAYS_OF_THE_WEEK,
-            "weeks_block": cg.get_month_block(day)
+            "first_day": cg.create_day(first_day),
+            "weeks_html": Markup(weeks_html),
         }
     )
 
 
 @router.get("/add/{date}")
 async def update_calendar(
-    request: Request, date: str, days: int
-) -> HTMLResponse:
-    last_day = cg.Day.convert_str_to_date(date)
-    next_weeks = cg.create_weeks(cg.get_n_days(last_day, days))
-    template = templates.get_template(
-        'partials/calendar/monthly_view/add_week.html')
-    content = template.render(weeks_block=next_weeks)
-    return HTMLResponse(content=content, status_code=HTTPStatus.OK)
+    request: Request, date: str, days: int,
+    session: Session = Depends(get_db),
+    user: CurrentUser = Depends(current_user),
+) -> Response:
+    last_day = cg.Day.convert_str_to_date(date).date()
+    user_id = user.user_id
+    key = (user_id, last_day, days)
+    version = get_weeks_version(session, user_id)
+    etag = weeks_cache.etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": WEEKS_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    content = render_weeks(session, user_id, last_day, days, version)
+    return HTMLResponse(
+        content=content, status_code=HTTPStatus.OK, headers=headers,
+    )
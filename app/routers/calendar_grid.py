@@ -1,15 +1,39 @@
 import calendar
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import itertools
 import locale
-from typing import Dict, Iterator, List, Tuple
+from types import MappingProxyType
+from typing import Iterable, Iterator, List, Mapping, Sequence, Tuple
 
 import pytz
+from sqlalchemy.orm import Session
+
+from app.database.models import Event
+from app.internal.event_index import EventIntervalIndex
+from app.routers.user import get_user_events_in_range
 
 MONTH_BLOCK: int = 6
+EVENT_TIME_FORMAT: str = "%I%p"
+WEEKEND_DAYS: int = 2
 
 locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
 
+DAY_NAMES: Tuple[str, ...] = tuple(calendar.day_name)
+
+
+def _css_map(**classes: str) -> Mapping[str, str]:
+    """Returns a read-only css map shared by all days of a kind."""
+    css = {
+        'day_container': 'day',
+        'date': 'day-number',
+        'daily_event': 'month-event',
+        'daily_event_front': 'daily front background-warmyellow',
+        'daily_event_back': 'daily back text-darkblue background-lightgray',
+        'event': 'event',
+    }
+    css.update(classes)
+    return MappingProxyType(css)
+
 
 class Day:
     """A Day class.
@@ -23,35 +47,35 @@ class Day:
                             EX:  [("Front Info", "Back Info")]
         events      (List): List of tuples represent time event name.
                             EX: [("09AP", "Meeting with yam")]
-        css         (Dict): All css classes represent day.
+        css      (Mapping): All css classes represent day, shared by all
+                            the days of the same kind.
     """
 
+    __slots__ = ('date', 'sday', 'dailyevents', 'events')
+
+    css: Mapping[str, str] = _css_map()
+
     def __init__(self, date: datetime):
         self.date: datetime = date
-        self.sday: str = self.date.strftime("%A")
+        self.sday: str = DAY_NAMES[date.weekday()]
         self.dailyevents: List[Tuple] = []
         self.events: List[Tuple] = []
-        self.css: Dict[str, str] = {
-            'day_container': 'day',
-            'date': 'day-number',
-            'daily_event': 'month-event',
-            'daily_event_front': ' '.join([
-                'daily',
-                'front',
-                'background-warmyellow'
-            ]),
-            'daily_event_back': ' '.join([
-                'daily',
-                'back',
-                'text-darkblue',
-                'background-lightgray'
-            ]),
-            'event': 'event',
-        }
 
     def __str__(self) -> str:
         return self.date.strftime("%d")
 
+    def start_time(self) -> datetime:
+        """Returns the midnight that starts this day."""
+        return datetime.combine(self.date, time.min)
+
+    def add_event(self, event: Event) -> None:
+        """Adds an event overlapping this day to its events lists."""
+        if event.all_day:
+            self.dailyevents.append((event.title, event.content or ""))
+            return
+        start = max(event.start, self.start_time())
+        self.events.append((start.strftime(EVENT_TIME_FORMAT), event.title))
+
     def display(self) -> str:
         """Returns day date inf the format of 00 MONTH 00"""
         return self.date.strftime("%d %B %y").upper()
@@ -72,90 +96,41 @@ def convert_str_to_date(cls, date_string: str) -> datetime:
     @classmethod
     def is_weekend(cls, date: date) -> bool:
         """Returns true if this day is represent a weekend."""
-        return date.strftime("%A") in Week.DAYS_OF_THE_WEEK[-2:]
+        return date.weekday() >= Week.WEEK_DAYS - WEEKEND_DAYS
 
 
 class DayWeekend(Day):
-    def __init__(self, date: datetime):
-        super().__init__(date)
-        self.css = {
-            'day_container': 'day ',
-            'date': ' '.join(['day-number', 'text-gray']),
-            'daily_event': 'month-event',
-            'daily_event_front': ' '.join([
-                'daily',
-                'front',
-                'background-warmyellow'
-            ]),
-            'daily_event_back': ' '.join([
-                'daily',
-                'back',
-                'text-darkblue',
-                'background-lightgray'
-            ]),
-            'event': 'event',
-        }
+    __slots__ = ()
+
+    css = _css_map(date='day-number text-gray')
 
 
 class Today(Day):
-    def __init__(self, date: datetime):
-        super().__init__(date)
-        self.css = {
-            'day_container': ' '.join([
-                'day',
-                'text-darkblue',
-                'background-yellow'
-            ]),
-            'date': 'day-number',
-            'daily_event': 'month-event',
-            'daily_event_front': ' '.join([
-                'daily',
-                'front',
-                'text-lightgray',
-                'background-darkblue'
-            ]),
-            'daily_event_back': ' '.join([
-                'daily',
-                'back',
-                'text-darkblue',
-                'background-lightgray'
-            ]),
-            'event': 'event',
-        }
+    __slots__ = ()
+
+    css = _css_map(
+        day_container='day text-darkblue background-yellow',
+        daily_event_front='daily front text-lightgray background-darkblue',
+    )
 
 
 class FirstDayMonth(Day):
-    def __init__(self, date: datetime):
-        super().__init__(date)
-        self.css = {
-            'day_container': ' '.join([
-                'day',
-                'text-darkblue',
-                'background-lightgray'
-            ]),
-            'date': 'day-number',
-            'daily_event': 'month-event',
-            'daily_event_front': ' '.join([
-                'daily front',
-                'text-lightgray',
-                'background-red'
-            ]),
-            'daily_event_back': ' '.join([
-                'daily',
-                'back',
-                'text-darkblue',
-                'background-lightgray'
-            ]),
-            'event': 'event',
-        }
+    __slots__ = ()
+
+    css = _css_map(
+        day_container='day text-darkblue background-lightgray',
+        daily_event_front='daily front text-lightgray background-red',
+    )
 
     def __str__(self) -> str:
         return self.date.strftime("%d %b %y").upper()
 
 
 class Week:
+    __slots__ = ('days',)
+
     WEEK_DAYS: int = 7
-    DAYS_OF_THE_WEEK: List[str] = calendar.day_name
+    DAYS_OF_THE_WEEK: Tuple[str, ...] = DAY_NAMES
 
     def __init__(self, days: List[Day]):
         self.days: List[Day] = days
@@ -165,7 +140,7 @@ def create_day(day: datetime) -> Day:
     """Return the currect day object according to given date."""
     if day == date.today():
         return Today(day)
-    if int(day.day) == 1:
+    if day.day == 1:
         return FirstDayMonth(day)
     if Day.is_weekend(day):
         return DayWeekend(day)
@@ -211,3 +186,35 @@ def get_month_block(day: Day, n: int = MONTH_BLOCK) -> List[Week]:
     current = get_first_day_month_block(day.date) - timedelta(days=1)
     num_of_days = Week.WEEK_DAYS * n
     return create_weeks(get_n_days(current, num_of_days))
+
+
+def add_events_to_days(days: Sequence[Day], events: Iterable[Event]) -> None:
+    """Fills the days with the events overlapping them.
+
+    The events are expected to be the result of one range query for all
+    the days. Multi-day events are added to every day they cover.
+    """
+    events_index = EventIntervalIndex(events)
+    for day in days:
+        day_start = day.start_time()
+        day_end = day_start + timedelta(days=1)
+        for event in events_index.overlapping(day_start, day_end):
+            day.add_event(event)
+
+
+def add_user_events(
+        session: Session, user_id: int, weeks: List[Week],
+) -> List[Week]:
+    """Fills the days of the weeks with the user's events.
+
+    Runs a single range query for the whole block, however many days and
+    events it holds.
+    """
+    days = [day for week in weeks for day in week.days]
+    if not days:
+        return weeks
+    start = days[0].start_time()
+    end = days[-1].start_time() + timedelta(days=1)
+    events = get_user_events_in_range(session, user_id, start, end)
+    add_events_to_days(days, events)
+    return weeks
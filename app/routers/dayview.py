@@ -7,7 +7,7 @@
 from app.database.models import Event, User
 from app.dependencies import get_db, templates
 from app.internal import zodiac
-from app.routers.user import get_all_user_events
+from app.routers.user import get_user_events_in_range
 
 router = APIRouter()
 
@@ -138,11 +138,12 @@ def get_events_and_attributes(
     session,
     user_id: int,
 ) -> Iterator[Tuple[Event, DivAttributes]]:
-    events = get_all_user_events(session, user_id)
     day_end = day + timedelta(hours=24)
+    events = get_user_events_in_range(
+        session, user_id, day, day_end, all_day=False,
+    )
     for event in events:
-        if is_specific_time_event_in_day(event, day, day_end):
-            yield event, DivAttributes(event, day)
+        yield event, DivAttributes(event, day)
 
 
 def get_all_day_events(
@@ -150,11 +151,10 @@ def get_all_day_events(
     session,
     user_id: int,
 ) -> Iterator[Event]:
-    events = get_all_user_events(session, user_id)
     day_end = day + timedelta(hours=24)
-    for event in events:
-        if is_all_day_event_in_day(event=event, day=day, day_end=day_end):
-            yield (event)
+    yield from get_user_events_in_range(
+        session, user_id, day, day_end, all_day=True,
+    )
 
 
 @router.get("/day/{date}", include_in_schema=False)
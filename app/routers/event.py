@@ -21,7 +21,7 @@
     raise_if_zoom_link_invalid,
 )
 from app.internal import comment as cmt
-from app.internal.emotion import get_emotion
+from app.routers.event_images import get_event_flair
 from app.internal.utils import create_model, get_current_user
 
 
@@ -287,13 +287,12 @@ def get_event_with_editable_fields_only(
 def _update_event(db: Session, event_id: int, event_to_update: Dict) -> Event:
     try:
         # Update database
-        db.query(Event).filter(Event.id == event_id).update(
-            event_to_update,
-            synchronize_session=False,
-        )
+        event = by_id(db, event_id)
+        for field, value in event_to_update.items():
+            setattr(event, field, value)
 
         db.commit()
-        return by_id(db, event_id)
+        return event
     except (AttributeError, SQLAlchemyError) as e:
         logger.exception(str(e))
         raise HTTPException(
@@ -310,6 +309,11 @@ def update_event(event_id: int, event: Dict, db: Session) -> Optional[Event]:
     check_change_dates_allowed(old_event, event_to_update)
     if not event_to_update:
         return None
+    if "title" in event_to_update or "content" in event_to_update:
+        event_to_update["flair"] = get_event_flair(
+            event_to_update.get("title", old_event.title),
+            event_to_update.get("content", old_event.content),
+        )
     event_updated = _update_event(db, event_id, event_to_update)
     # TODO: Send emails to recipients.
     return event_updated
@@ -346,7 +350,7 @@ def create_event(
         location=location,
         vc_link=vc_link,
         color=color,
-        emotion=get_emotion(title, content),
+        flair=get_event_flair(title, content),
         invitees=invitees_concatenated,
         all_day=all_day,
         category_id=category_id,
@@ -389,12 +393,9 @@ def get_participants_emails_by_event(db: Session, event_id: int) -> List[str]:
 
 def _delete_event(db: Session, event: Event):
     try:
-        # Delete event
+        # Delete event, and its user_event rows with it
         db.delete(event)
 
-        # Delete user_event
-        db.query(UserEvent).filter(UserEvent.event_id == event.id).delete()
-
         db.commit()
 
     except (SQLAlchemyError, AttributeError) as e:
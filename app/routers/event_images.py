@@ -1,14 +1,15 @@
 from functools import lru_cache
 import re
-from typing import Optional
-
-from nltk.tokenize import word_tokenize
-from word_forms.lemmatizer import lemmatize
+from typing import Any, Dict, List, Optional
 
 from app import config
+from app.internal.preload import ensure_nltk_data
 
 FLAIRS_EXTENSION = '.jpg'
 FLAIRS_REL_PATH = f'{config.STATIC_ABS_PATH}\\event_flairs'
+NO_FLAIR_LINK = '#'
+NON_ALPHABET_REGEX = re.compile('[^a-zA-Z]')
+PHRASE_WORD_REGEX = re.compile(r"[a-z]+(?:['-][a-z]+)*")
 IMAGES_RELATED_WORDS_MAP = {
     'birthday': 'birthday',
     'coffee': 'coffee',
@@ -160,8 +161,108 @@ def remove_non_alphabet_chars(text: str) -> str:
     Returns:
         str: The string after the removal.
     """
-    regex = re.compile('[^a-zA-Z]')
-    return regex.sub('', text)
+    return NON_ALPHABET_REGEX.sub('', text)
+
+
+def get_phrase_words(text: str) -> List[str]:
+    """Split a text into lowercase words of alphabet chars only.
+
+    Hyphens and apostrophes inside a word are dropped, so "X-Mas" and
+    "xmas" are the same word, while other chars separate words.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The words of the text.
+    """
+    return [
+        remove_non_alphabet_chars(word)
+        for word in PHRASE_WORD_REGEX.findall(text.lower())
+    ]
+
+
+class PhraseMatcher:
+    """A trie of phrases, keyed by their words.
+
+    A text is matched in one pass over its words: the phrases that start at
+    each word are followed down the trie, which is as deep as the longest
+    phrase.
+    """
+
+    _VALUE = ''  # Words are never empty, so this key can't be a word.
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self._max_words = 0
+
+    def add(self, phrase: str, value: str, replace: bool = True) -> None:
+        """Add a phrase, matching to the given value.
+
+        Args:
+            phrase (str): The phrase.
+            value (str): The value of the phrase.
+            replace (bool): Whether to replace the value of a phrase that
+                was already added.
+        """
+        words = get_phrase_words(phrase)
+        if not words:
+            return
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        if replace or self._VALUE not in node:
+            node[self._VALUE] = value
+        self._max_words = max(self._max_words, len(words))
+
+    def find(self, text: str) -> Optional[str]:
+        """Find the value of the first phrase in a text.
+
+        Of the phrases that start at the same word, the longest is taken.
+
+        Args:
+            text (str): The text to search.
+
+        Returns:
+            str: The value of the phrase, or None if there is none.
+        """
+        words = get_phrase_words(text)
+        for start in range(len(words)):
+            node = self._root
+            value = None
+            for word in words[start:start + self._max_words]:
+                node = node.get(word)
+                if node is None:
+                    break
+                value = node.get(self._VALUE, value)
+            if value is not None:
+                return value
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_flair_matcher() -> PhraseMatcher:
+    """Build the matcher of the flairs' related words and phrases.
+
+    The word forms of each flair name, such as "drink" and "drinking" for
+    "drank", match it too, unless they are related words of another flair.
+    The word forms are loaded on first use, since they are slow to load.
+
+    Returns:
+        PhraseMatcher: The matcher of the flair names.
+    """
+    ensure_nltk_data("wordnet")
+    from word_forms.word_forms import get_word_forms
+
+    matcher = PhraseMatcher()
+    for phrase, image_name in IMAGES_RELATED_WORDS_MAP.items():
+        matcher.add(phrase, image_name)
+    for image_name in set(IMAGES_RELATED_WORDS_MAP.values()):
+        matcher.add(image_name, image_name, replace=False)
+        for forms in get_word_forms(image_name).values():
+            for form in forms:
+                matcher.add(form, image_name, replace=False)
+    return matcher
 
 
 def get_image_name(related_word: str) -> Optional[str]:
@@ -201,17 +302,25 @@ def attach_image_to_event(event_content: str) -> str:
     Returns:
         str: The link to the suitable image of a given token content.
     """
-    event_tokens = word_tokenize(event_content)
-    for token in event_tokens:
-        if token.isalnum():
-            try:
-                base_word = lemmatize(remove_non_alphabet_chars(token).lower())
-            except ValueError:
-                base_word = token
-            if base_word in IMAGES_RELATED_WORDS_MAP.values():
-                return generate_flare_link_from_lemmatized_word(base_word)
-            link = search_token_in_related_words(token)
-            if link:
-                return link
-            link = '#'
+    image_name = get_flair_matcher().find(event_content)
+    if image_name is None:
+        return NO_FLAIR_LINK
+    return generate_flare_link_from_lemmatized_word(image_name)
+
+
+def get_event_flair(title: str, content: Optional[str] = None,
+                    ) -> Optional[str]:
+    """Get the link to the flair of an event, to store on the event.
+
+    Args:
+        title (str): The event title.
+        content (str): The event content.
+
+    Returns:
+        str: The link to the flair, or None if there is no suitable one.
+    """
+    text = ' '.join(part for part in (title, content) if part)
+    link = attach_image_to_event(text)
+    if link == NO_FLAIR_LINK:
+        return None
     return link
@@ -1,14 +1,21 @@
 from datetime import date
-from io import BytesIO
-from typing import Union
+from typing import Dict, Optional, Union
 
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_db
-from app.internal.agenda_events import get_events_in_time_frame
-from app.internal.export import get_icalendar_with_multiple_events
+from app.internal.agenda_events import get_dates_range_bounds
+from app.internal.calendar_feed import (
+    get_feed_headers,
+    get_feed_token,
+    get_feed_user_id,
+    is_not_modified,
+    render_feed,
+)
+from app.internal.event_changes import get_events_version
+from app.internal.export import iter_user_icalendar
 from app.internal.utils import get_current_user
 
 router = APIRouter(
@@ -36,13 +43,72 @@ def export(
     """
     # TODO: connect to real user
     user = get_current_user(db)
-    events = get_events_in_time_frame(start_date, end_date, user.id, db)
-    file = BytesIO(get_icalendar_with_multiple_events(db, list(events)))
+    start, end = get_dates_range_bounds(start_date, end_date)
     return StreamingResponse(
-        content=file,
+        content=iter_user_icalendar(db, user.id, start, end),
         media_type="text/calendar",
         headers={
             # Change filename to "pylandar.ics".
             "Content-Disposition": "attachment;filename=pylandar.ics",
         },
     )
+
+
+@router.get("/feed")
+def get_feed_url(
+        request: Request, db: Session = Depends(get_db),
+) -> Dict[str, str]:
+    """Returns the url of the user's calendar subscription feed.
+
+    Args:
+        request: The HTTP request.
+        db: Optional; The database connection.
+
+    Returns:
+        The webcal url of the feed.
+    """
+    # TODO: connect to real user
+    user = get_current_user(db)
+    url = request.url_for("calendar_feed", token=get_feed_token(user.id))
+    return {"url": "webcal" + url[url.index("://"):]}
+
+
+@router.get("/feed/{token}.ics")
+def calendar_feed(
+        token: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+        db: Session = Depends(get_db),
+) -> Response:
+    """Returns the user's calendar subscription feed.
+
+    Args:
+        token: The user's feed token.
+        start_date: Optional; The first date of the events.
+        end_date: Optional; The last date of the events.
+        if_none_match: Optional; The ETag of the client's copy.
+        if_modified_since: Optional; The date of the client's copy.
+        db: Optional; The database connection.
+
+    Returns:
+        The iCalendar of the user's events, or 304 Not Modified if the
+        client's copy is current.
+    """
+    user_id = get_feed_user_id(token)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Feed not found",
+        )
+    version = get_events_version(db, user_id)
+    headers = get_feed_headers(user_id, start_date, end_date, version)
+    if is_not_modified(headers, if_none_match, if_modified_since):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers,
+        )
+    return Response(
+        content=render_feed(db, user_id, start_date, end_date, version),
+        media_type="text/calendar",
+        headers=headers,
+    )
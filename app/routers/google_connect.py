@@ -15,8 +15,8 @@
 
 
 @router.get("/sync")
-async def google_sync(request: Request,
-                      session=Depends(get_db)) -> RedirectResponse:
+def google_sync(request: Request,
+                session=Depends(get_db)) -> RedirectResponse:
     '''Sync with Google - if user never synced with google this funcion will take
     the user to a consent screen to use his google calendar data with the app.
     '''
@@ -0,0 +1,131 @@
+from pathlib import Path
+import tempfile
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, status
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from app.database import get_session_factory
+from app.dependencies import get_db
+from app.internal.import_jobs import (
+    jobs,
+    run_events_import,
+    TooManyImportsError,
+)
+from app.internal.security.dependancies import current_user
+from app.internal.security.schema import CurrentUser
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+router = APIRouter(
+    prefix="/import",
+    tags=["import"],
+    responses={status.HTTP_404_NOT_FOUND: {"description": _("Not found")}},
+)
+
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def import_file(
+        file: UploadFile = File(...),
+        columns: Optional[str] = Form(None),
+        db: Session = Depends(get_db),
+        user: CurrentUser = Depends(current_user),
+) -> Dict[str, str]:
+    """Queues the import of an events file.
+
+    Args:
+        file: The uploaded file.
+        columns: Optional; The comma separated fields of the columns of
+            a *.csv file without a header.
+        db: Optional; The database connection.
+        user: Optional; The logged in user.
+
+    Returns:
+        The id of the import job, and the url of its progress.
+
+    Raises:
+        HTTPException: If the user already runs the maximum number of
+            imports.
+    """
+    suffix = Path(file.filename or "").suffix
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as upload:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+    csv_columns = None
+    if columns is not None:
+        csv_columns = [column.strip() for column in columns.split(",")]
+    session_factory = get_session_factory(db)
+    try:
+        job = jobs.submit(
+            user.user_id, run_events_import, upload.name, session_factory,
+            csv_columns, session_factory=session_factory,
+        )
+    except TooManyImportsError as e:
+        Path(upload.name).unlink()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+        )
+    return {
+        "job_id": job.id,
+        "url": router.url_path_for("get_import_job", job_id=job.id),
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_import_job(
+        job_id: str,
+        db: Session = Depends(get_db),
+        user: CurrentUser = Depends(current_user),
+) -> Dict[str, Any]:
+    """Returns the progress of an import job of the user.
+
+    Args:
+        job_id: The import job id.
+        db: Optional; The database connection.
+        user: Optional; The logged in user.
+
+    Returns:
+        The job status, the rows parsed and inserted so far, the rejected
+        rows with the reasons, and the seconds elapsed.
+    """
+    progress = jobs.get_progress(db, job_id, user.user_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found",
+        )
+    return progress
+
+
+@router.delete("/jobs/{job_id}", status_code=status.HTTP_202_ACCEPTED)
+def cancel_import_job(
+        job_id: str,
+        db: Session = Depends(get_db),
+        user: CurrentUser = Depends(current_user),
+) -> Dict[str, Any]:
+    """Cancels an import job of the user that is not finished yet.
+
+    Args:
+        job_id: The import job id.
+        db: Optional; The database connection.
+        user: Optional; The logged in user.
+
+    Returns:
+        The progress of the job.
+    """
+    cancelled = jobs.cancel(db, job_id, user.user_id)
+    if cancelled is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found",
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Import job is already finished",
+        )
+    return jobs.get_progress(db, job_id, user.user_id)
@@ -1,18 +1,20 @@
 import io
 
-from loguru import logger
-from fastapi import APIRouter, Depends, File, Request, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Request
+from fastapi import status, UploadFile
 from PIL import Image
 from starlette.responses import RedirectResponse
 from starlette.status import HTTP_302_FOUND
-from sqlalchemy.exc import SQLAlchemyError
 
 from app import config
+from app.database import get_session_factory
 from app.database.models import User
 from app.dependencies import get_db, MEDIA_PATH, templates, GOOGLE_ERROR
 from app.internal.on_this_day_events import get_on_this_day_events
-from app.internal.import_holidays import (get_holidays_from_file,
-                                          save_holidays_to_db)
+from app.internal.import_jobs import (
+    jobs, run_holidays_import, TooManyImportsError,
+)
+from app.internal.utils import get_current_user
 
 PICTURE_EXTENSION = config.PICTURE_EXTENSION
 PICTURE_SIZE = config.AVATAR_SIZE
@@ -186,11 +188,17 @@ def get_image_crop_area(width, height):
 async def update(
         file: UploadFile = File(...), session=Depends(get_db)):
     icsfile = await file.read()
-    holidays = get_holidays_from_file(icsfile.decode(), session)
+    user = get_current_user(session)
+    session_factory = get_session_factory(session)
     try:
-        save_holidays_to_db(holidays, session)
-    except SQLAlchemyError as ex:
-        logger.exception(ex)
-    finally:
-        url = router.url_path_for("profile")
-        return RedirectResponse(url=url, status_code=HTTP_302_FOUND)
+        job = jobs.submit(
+            user.id, run_holidays_import, icsfile.decode(), session_factory,
+            session_factory=session_factory,
+        )
+    except TooManyImportsError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+        )
+    url = router.url_path_for("profile")
+    return RedirectResponse(
+        url=f"{url}?import_job={job.id}", status_code=HTTP_302_FOUND)
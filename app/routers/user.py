@@ -1,9 +1,11 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel, Field
+from sqlalchemy import or_
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
 from starlette.responses import RedirectResponse
 from starlette.status import HTTP_200_OK
 
@@ -98,6 +100,82 @@ def get_all_user_events(session: Session, user_id: int) -> List[Event]:
     )
 
 
+def _get_user_events_query(
+        session: Session,
+        user_id: int,
+        all_day: Optional[bool] = None,
+) -> Query:
+    """Returns a query of the user's events, optionally by all-day flag."""
+    query = (
+        session.query(Event).join(UserEvent)
+        .filter(UserEvent.user_id == user_id)
+    )
+    if all_day is not None:
+        if all_day:
+            query = query.filter(Event.all_day.is_(True))
+        else:
+            query = query.filter(Event.all_day.isnot(True))
+    return query
+
+
+def get_user_events_in_range(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        all_day: Optional[bool] = None,
+) -> List[Event]:
+    """Returns the user's events overlapping [start, end), sorted by start.
+
+    The overlap predicate and the ordering run in the database, so the
+    cost depends on the size of the window and not on the user's history.
+    A missing bound leaves that side of the range open. Zero length events
+    are returned when they start inside the range.
+    If `all_day` is given, only all-day (or only timed) events are returned.
+    """
+    query = _get_user_events_query(session, user_id, all_day)
+    if end is not None:
+        query = query.filter(Event.start < end)
+    if start is not None:
+        query = query.filter(or_(Event.end > start, Event.start >= start))
+    return query.order_by(Event.start, Event.id).all()
+
+
+def get_user_events_starting_in_range(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+) -> List[Event]:
+    """Returns the user's events starting in [start, end), sorted by start.
+
+    Used by listings that group events by their start date, such as the
+    agenda and the export. A missing bound leaves that side of the range open.
+    """
+    return get_user_events_starting_in_range_query(
+        session, user_id, start, end,
+    ).all()
+
+
+def get_user_events_starting_in_range_query(
+        session: Session,
+        user_id: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+) -> Query:
+    """Returns a query of the user's events starting in [start, end).
+
+    The query is sorted by start, and may be streamed or narrowed to some
+    of the columns.
+    """
+    query = _get_user_events_query(session, user_id)
+    if start is not None:
+        query = query.filter(Event.start >= start)
+    if end is not None:
+        query = query.filter(Event.start < end)
+    return query.order_by(Event.start, Event.id)
+
+
 @router.post("/disable")
 def disable_logged_user(
         request: Request, session: Session = Depends(get_db)):
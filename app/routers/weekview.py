@@ -1,16 +1,15 @@
 from datetime import datetime, timedelta
 from itertools import accumulate
-from typing import Iterator, NamedTuple, Tuple
+from typing import Iterator, List, NamedTuple, Sequence, Tuple
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm.session import Session
 
 from app.database.models import Event, User
 from app.dependencies import get_db, TEMPLATES_PATH
-from app.routers.dayview import (
-    DivAttributes, dayview, get_events_and_attributes
-)
+from app.internal.event_index import EventIntervalIndex
+from app.routers.dayview import DivAttributes
+from app.routers.user import get_user_events_in_range
 
 
 templates = Jinja2Templates(directory=TEMPLATES_PATH)
@@ -21,8 +20,7 @@
 
 class DayEventsAndAttrs(NamedTuple):
     day: datetime
-    template: Jinja2Templates.TemplateResponse
-    events_and_attrs: Tuple[Event, DivAttributes]
+    events_and_attrs: List[Tuple[Event, DivAttributes]]
 
 
 def get_week_dates(firstday: datetime) -> Iterator[datetime]:
@@ -31,18 +29,23 @@ def get_week_dates(firstday: datetime) -> Iterator[datetime]:
     return accumulate(rest_of_days)
 
 
-async def get_day_events_and_attributes(
-        request: Request, day: datetime, session: Session, user: User,
-      ) -> DayEventsAndAttrs:
-    template = await dayview(
-        request=request,
-        date=day.strftime('%Y-%m-%d'),
-        view='week',
-        session=session
-    )
-    events_and_attrs = get_events_and_attributes(
-            day=day, session=session, user_id=user.id)
-    return DayEventsAndAttrs(day, template, events_and_attrs)
+def get_week_events_and_attributes(
+        days: Sequence[datetime], events: List[Event],
+) -> List[DayEventsAndAttrs]:
+    """Buckets the events into the days they cover.
+
+    The events are expected to be the result of one range query for the
+    whole week. They are indexed once, and the DivAttributes are computed
+    once per (event, day).
+    """
+    events_index = EventIntervalIndex(events)
+    week = []
+    for day in days:
+        day_events = events_index.overlapping(day, day + timedelta(days=1))
+        week.append(DayEventsAndAttrs(
+            day, [(event, DivAttributes(event, day)) for event in day_events],
+        ))
+    return week
 
 
 @router.get('/week/{firstday}')
@@ -51,11 +54,16 @@ async def weekview(
       ):
     user = session.query(User).filter_by(username='test_username').first()
     firstday = datetime.strptime(firstday, '%Y-%m-%d')
-    week_days = get_week_dates(firstday)
-    week = [await get_day_events_and_attributes(
-                request, day, session, user
-            ) for day in week_days]
+    week_days = list(get_week_dates(firstday))
+    week_end = week_days[-1] + timedelta(days=1)
+    events = []
+    if user:
+        events = get_user_events_in_range(
+            session, user.id, firstday, week_end, all_day=False,
+        )
+    week = get_week_events_and_attributes(week_days, events)
     return templates.TemplateResponse("weekview.html", {
         "request": request,
         "week": week,
+        "view": "week",
         })
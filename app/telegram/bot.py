@@ -2,6 +2,7 @@
 
 from app import config
 from app.dependencies import get_settings
+from .dispatcher import MessageDispatcher
 from .models import Bot
 
 settings: config.Settings = get_settings()
@@ -10,6 +11,7 @@
 WEBHOOK_URL = settings.webhook_url
 
 telegram_bot = Bot(BOT_API, WEBHOOK_URL)
+telegram_dispatcher = MessageDispatcher(telegram_bot)
 
 loop = asyncio.get_event_loop()
 asyncio.set_event_loop(loop)
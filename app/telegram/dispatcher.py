@@ -0,0 +1,194 @@
+"""The queue of the messages the bot sends.
+
+Handlers enqueue their messages and return at once, so the webhook is
+answered without waiting for Telegram. Each chat's messages are delivered
+in order by a background task, within Telegram's rate limits: about one
+message a second per chat, and 30 a second overall. Both limits are token
+buckets, so short bursts go out without waiting.
+"""
+import asyncio
+from collections import deque
+import time
+from typing import (
+    Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional,
+)
+
+from loguru import logger
+
+# https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+MESSAGE_MAX_LENGTH = 4096
+MESSAGES_SEPARATOR = '\n\n'
+MAX_SEND_ATTEMPTS = 3
+TOO_MANY_REQUESTS = 429
+CLOSE_TIMEOUT = 5
+
+OutboundMessage = NamedTuple('OutboundMessage', [
+    ('text', str), ('reply_markup', Optional[Dict[str, Any]])])
+
+
+class TokenBucket:
+    """Allows `rate` calls a second, and bursts of `capacity` calls."""
+
+    def __init__(
+            self, rate: float, capacity: float,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    @property
+    def is_full(self) -> bool:
+        """Whether the bucket refilled, so dropping it changes nothing."""
+        refilled = self.tokens + (self.clock() - self.updated) * self.rate
+        return refilled >= self.capacity
+
+    def reserve(self) -> float:
+        """Takes a token, which may be owed.
+
+        Returns:
+            The seconds to wait before the token is available.
+        """
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def batch_texts(
+        texts: Iterable[str], separator: str = MESSAGES_SEPARATOR,
+        limit: int = MESSAGE_MAX_LENGTH,
+) -> List[str]:
+    """Joins texts into as few messages as fit Telegram's length limit.
+
+    A text too long for a single message is split.
+    """
+    messages: List[str] = []
+    for text in texts:
+        for start in range(0, max(len(text), 1), limit):
+            part = text[start:start + limit]
+            if messages and len(messages[-1] + separator + part) <= limit:
+                messages[-1] += separator + part
+            else:
+                messages.append(part)
+    return messages
+
+
+class MessageDispatcher:
+    """Delivers the messages of a bot in the background.
+
+    Args:
+        bot: The bot, whose send_message returns Telegram's response.
+    """
+
+    def __init__(
+            self, bot: Any, global_rate: float = GLOBAL_RATE,
+            chat_rate: float = CHAT_RATE, chat_burst: float = CHAT_BURST,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, Deque[OutboundMessage]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def send(
+            self, chat_id: str, text: str,
+            reply_markup: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Enqueues a message to the chat, without waiting for it."""
+        queue = self._queues.setdefault(chat_id, deque())
+        queue.append(OutboundMessage(text, reply_markup))
+        loop = asyncio.get_event_loop()
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.get_loop() is not loop:
+            self._workers[chat_id] = loop.create_task(self._deliver(chat_id))
+
+    def send_many(self, chat_id: str, texts: Iterable[str]) -> None:
+        """Enqueues texts to the chat, batched into few messages."""
+        for text in batch_texts(texts):
+            self.send(chat_id, text)
+
+    async def join(self) -> None:
+        """Waits until the enqueued messages are delivered."""
+        while self._get_loop_workers():
+            await asyncio.wait(self._get_loop_workers())
+
+    async def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """Delivers the enqueued messages for up to `timeout` seconds, and
+        drops the rest."""
+        workers = self._get_loop_workers()
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+
+    def _get_loop_workers(self) -> List[asyncio.Task]:
+        loop = asyncio.get_event_loop()
+        return [worker for worker in self._workers.values()
+                if worker.get_loop() is loop]
+
+    def _get_chat_bucket(self, chat_id: str) -> TokenBucket:
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate, self.chat_burst)
+        return self._chat_buckets[chat_id]
+
+    def _drop_idle_chat_buckets(self) -> None:
+        """Drops the buckets of the chats with no queued messages, once they
+        refilled."""
+        idle = [
+            chat_id for chat_id, bucket in self._chat_buckets.items()
+            if chat_id not in self._queues and bucket.is_full
+        ]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    async def _deliver(self, chat_id: str) -> None:
+        queue = self._queues[chat_id]
+        worker = asyncio.current_task()
+        try:
+            while queue:
+                await self._send(chat_id, queue[0])
+                queue.popleft()
+        finally:
+            if self._workers.get(chat_id) is worker:
+                del self._workers[chat_id]
+                if not queue:
+                    del self._queues[chat_id]
+                    self._drop_idle_chat_buckets()
+
+    async def _send(self, chat_id: str, message: OutboundMessage) -> None:
+        for _ in range(MAX_SEND_ATTEMPTS):
+            await self._get_chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                response = await self.bot.send_message(
+                    chat_id=chat_id, text=message.text,
+                    reply_markup=message.reply_markup)
+            except Exception as e:
+                logger.error(f'Sending a telegram message failed: {e}')
+                return
+            if response.status_code != TOO_MANY_REQUESTS:
+                if response.status_code >= 400:
+                    logger.error(f'Sending a telegram message failed: '
+                                 f'status {response.status_code}')
+                return
+            retry_after = response.json().get(
+                'parameters', {}).get('retry_after', 1)
+            await asyncio.sleep(retry_after)
+        logger.error('Sending a telegram message failed: too many requests')
@@ -1,12 +1,13 @@
-import asyncio
 import datetime
 
 import dateparser
+from sqlalchemy.orm import object_session
 
 from app.database.models import User
 from app.dependencies import get_db
 from app.routers.event import create_event
-from .bot import telegram_bot
+from app.routers.user import get_user_events_in_range
+from .bot import telegram_bot, telegram_dispatcher
 from .keyboards import (
     DATE_FORMAT, field_kb, gen_inline_keyboard,
     get_this_week_buttons, new_event_kb, show_events_kb)
@@ -39,42 +40,45 @@ async def process_callback(self):
 
     async def default_handler(self):
         answer = "Unknown command."
-        await telegram_bot.send_message(chat_id=self.chat.user_id, text=answer)
+        telegram_dispatcher.send(chat_id=self.chat.user_id, text=answer)
         return answer
 
     async def start_handler(self):
         answer = f'''Hello, {self.chat.first_name}!
 Welcome to PyLendar telegram client!'''
-        await telegram_bot.send_message(chat_id=self.chat.user_id, text=answer)
+        telegram_dispatcher.send(chat_id=self.chat.user_id, text=answer)
         return answer
 
     async def show_events_handler(self):
         answer = 'Choose events day.'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=show_events_kb)
         return answer
 
+    def _get_events_on_day(self, day: datetime.datetime):
+        session = object_session(self.user)
+        if session is None:
+            return []
+        day = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = day + datetime.timedelta(days=1)
+        return get_user_events_in_range(session, self.user.id, day, day_end)
+
     async def today_handler(self):
         today = datetime.datetime.today()
-        events = [
-            _.events for _ in self.user.events
-            if _.events.start <= today <= _.events.end]
+        events = self._get_events_on_day(today)
 
         if not events:
             return await self._process_no_events_today()
 
         answer = f"{today.strftime('%A, %B %d')}:\n"
-        await telegram_bot.send_message(
-            chat_id=self.chat.user_id, text=answer)
-        for event in events:
-            await self._send_event(event)
+        self._send_events(answer, events)
         return answer
 
     async def _process_no_events_today(self):
         answer = "There're no events today."
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id, text=answer)
         return answer
 
@@ -82,7 +86,7 @@ async def this_week_handler(self):
         answer = 'Choose a day.'
         this_week_kb = gen_inline_keyboard(get_this_week_buttons())
 
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=this_week_kb)
@@ -91,27 +95,29 @@ async def this_week_handler(self):
     async def chosen_day_handler(self):
         chosen_date = datetime.datetime.strptime(
             self.chat.message, DATE_FORMAT)
-        events = [
-            _.events for _ in self.user.events
-            if _.events.start <= chosen_date <= _.events.end]
+        events = self._get_events_on_day(chosen_date)
 
         if not events:
             return await self._process_no_events_on_date(chosen_date)
 
         answer = f"{chosen_date.strftime('%A, %B %d')}:\n"
-        await telegram_bot.send_message(
-            chat_id=self.chat.user_id, text=answer)
-        for event in events:
-            await self._send_event(event)
+        self._send_events(answer, events)
         return answer
 
     async def _process_no_events_on_date(self, date):
         answer = f"There're no events on {date.strftime('%B %d')}."
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id, text=answer)
         return answer
 
-    async def _send_event(self, event):
+    def _send_events(self, title, events):
+        """Sends the events in as few messages as they fit in."""
+        texts = [title.rstrip()]
+        texts.extend(self._format_event(event) for event in events)
+        telegram_dispatcher.send_many(self.chat.user_id, texts)
+
+    @staticmethod
+    def _format_event(event):
         start = event.start.strftime("%d %b %Y %H:%M")
         end = event.end.strftime("%d %b %Y %H:%M")
         text = f'Title:\n{event.title}\n\n'
@@ -119,9 +125,7 @@ async def _send_event(self, event):
         text += f'Location:\n{event.location}\n\n'
         text += f'Starts on:\n{start}\n\n'
         text += f'Ends on:\n{end}'
-        await telegram_bot.send_message(
-            chat_id=self.chat.user_id, text=text)
-        await asyncio.sleep(1)
+        return text
 
     async def process_new_event(self, memo_dict):
         if self.chat.message == 'cancel':
@@ -144,7 +148,7 @@ async def process_new_event(self, memo_dict):
     async def new_event_handler(self):
         telegram_bot.MEMORY[self.chat.user_id] = {}
         answer = 'Please, give your event a title.'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -153,7 +157,7 @@ async def new_event_handler(self):
     async def _cancel_new_event_processing(self):
         del telegram_bot.MEMORY[self.chat.user_id]
         answer = '🚫 The process was canceled.'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id, text=answer)
         return answer
 
@@ -165,7 +169,7 @@ async def _process_title(self, memo_dict):
         memo_dict['title'] = self.chat.message
         answer = f'Title:\n{memo_dict["title"]}\n\n'
         answer += 'Add a description of the event.'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -175,7 +179,7 @@ async def _process_content(self, memo_dict):
         memo_dict['content'] = self.chat.message
         answer = f'Content:\n{memo_dict["content"]}\n\n'
         answer += 'Where the event will be held?'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -185,7 +189,7 @@ async def _process_location(self, memo_dict):
         memo_dict['location'] = self.chat.message
         answer = f'Location:\n{memo_dict["location"]}\n\n'
         answer += 'When does it start?'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -201,7 +205,7 @@ async def _add_start_date(self, memo_dict, date):
         memo_dict['start'] = date
         answer = f'Starts on:\n{date.strftime("%d %b %Y %H:%M")}\n\n'
         answer += 'And when does it end?'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -209,7 +213,7 @@ async def _add_start_date(self, memo_dict, date):
 
     async def _process_bad_date_input(self):
         answer = '❗️ Please, enter a valid date/time.'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=field_kb)
@@ -229,7 +233,7 @@ async def _add_end_date(self, memo_dict, date):
         answer += f'Location:\n{memo_dict["location"]}\n\n'
         answer += f'Starts on:\n{start_time}\n\n'
         answer += f'Ends on:\n{date.strftime("%d %b %Y %H:%M")}'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id,
             text=answer,
             reply_markup=new_event_kb)
@@ -237,7 +241,7 @@ async def _add_end_date(self, memo_dict, date):
 
     async def _submit_new_event(self, memo_dict):
         answer = 'New event was successfully created 🎉'
-        await telegram_bot.send_message(
+        telegram_dispatcher.send(
             chat_id=self.chat.user_id, text=answer)
         # Save to database
         create_event(
@@ -266,5 +270,5 @@ async def reply_unknown_user(chat):
 
 https://calendar.pythonic.guru/profile/
 '''
-    await telegram_bot.send_message(chat_id=chat.user_id, text=answer)
+    telegram_dispatcher.send(chat_id=chat.user_id, text=answer)
     return answer
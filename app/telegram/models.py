@@ -1,6 +1,8 @@
 from typing import Any, Dict, Optional
 
-from httpx import AsyncClient
+import httpx
+
+from app.internal.http_client import http_client
 
 
 class Chat:
@@ -38,23 +40,23 @@ def _set_base_url(self, bot_api: str) -> str:
     def _set_webhook_setter_url(self, webhook_url: str) -> str:
         return f'{self.base}setWebhook?url={webhook_url}/telegram/'
 
-    async def set_webhook(self):
-        async with AsyncClient() as ac:
-            return await ac.get(self.webhook_setter_url)
+    async def set_webhook(self) -> httpx.Response:
+        return await http_client.request(
+            'telegram', 'GET', self.webhook_setter_url)
 
-    async def drop_webhook(self):
-        async with AsyncClient() as ac:
-            data = {'drop_pending_updates': True}
-            return await ac.post(url=f'{self.base}deleteWebhook', data=data)
+    async def drop_webhook(self) -> httpx.Response:
+        data = {'drop_pending_updates': True}
+        return await http_client.request(
+            'telegram', 'POST', f'{self.base}deleteWebhook', data=data)
 
     async def send_message(
             self, chat_id: str,
             text: str,
-            reply_markup: Optional[Dict[str, Any]] = None):
-        async with AsyncClient(base_url=self.base) as ac:
-            message = {
-                'chat_id': chat_id,
-                'text': text}
-            if reply_markup:
-                message.update(reply_markup)
-            return await ac.post('sendMessage', data=message)
+            reply_markup: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        message = {
+            'chat_id': chat_id,
+            'text': text}
+        if reply_markup:
+            message.update(reply_markup)
+        return await http_client.request(
+            'telegram', 'POST', f'{self.base}sendMessage', data=message)
@@ -4,8 +4,11 @@
 import pytest
 from sqlalchemy.orm import Session
 
-from app import main
+from app import config, main
 from app.database.models import Base, User
+from app.dependencies import get_db
+from app.internal.security.dependancies import current_user
+from app.internal.security.schema import CurrentUser
 from app.routers import (
     agenda, event, friendview, google_connect, invitation, profile
 )
@@ -14,6 +17,8 @@
 from tests.conftest import get_test_db, test_engine
 
 main.app.include_router(security_testing_routes.router)
+# The clients' startup must not fetch from the On This Day service.
+config.PREFETCH_ON_THIS_DAY = False
 
 
 def get_test_placeholder_user() -> User:
@@ -43,6 +48,34 @@ def create_test_client(get_db_function) -> Generator[Session, None, None]:
     Base.metadata.drop_all(bind=test_engine)
 
 
+@pytest.fixture
+def test_db_client(session: Session) -> Iterator[TestClient]:
+    """A client whose requests use the test database of `session`."""
+    previous_override = main.app.dependency_overrides.get(get_db)
+    main.app.dependency_overrides[get_db] = get_test_db
+    yield TestClient(main.app)
+    if previous_override is None:
+        del main.app.dependency_overrides[get_db]
+    else:
+        main.app.dependency_overrides[get_db] = previous_override
+
+
+def log_in_as(user: User) -> None:
+    """Makes the current_user dependency return the user."""
+    main.app.dependency_overrides[current_user] = lambda: CurrentUser(
+        user_id=user.id, username=user.username)
+
+
+@pytest.fixture
+def logged_in_client(
+        test_db_client: TestClient, user: User,
+) -> Iterator[TestClient]:
+    """A test_db_client logged in as `user`."""
+    log_in_as(user)
+    yield test_db_client
+    main.app.dependency_overrides.pop(current_user, None)
+
+
 @pytest.fixture(scope="session")
 def agenda_test_client() -> Generator[TestClient, None, None]:
     yield from create_test_client(agenda.get_db)
@@ -1,11 +1,15 @@
 import calendar
+from contextlib import contextmanager
+from typing import Iterator, List
 
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from app.config import PSQL_ENVIRONMENT
 from app.database.models import Base
+from app.internal.emotion_tagging import emotion_tagger, register_listeners
+from app.internal.http_client import http_client
 
 pytest_plugins = [
     'tests.user_fixture',
@@ -23,6 +27,23 @@
     'tests.comment_fixture',
 ]
 
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark", action="store_true",
+        help="Run the benchmarks, which are skipped by default.",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="Run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 # When testing in a PostgreSQL environment please make sure that:
 #   - Base string is a PSQL string
 #   - app.config.PSQL_ENVIRONMENT is set to True
@@ -44,6 +65,7 @@
 
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=test_engine)
+register_listeners()
 
 
 def get_test_db():
@@ -57,9 +79,45 @@ def session():
     yield session
     session.rollback()
     session.close()
+    emotion_tagger.wait()
     Base.metadata.drop_all(bind=test_engine)
 
 
+@pytest.fixture
+def count_queries():
+    """Returns a context manager that collects the statements run on the
+    test database:
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) == 1
+    """
+    @contextmanager
+    def count() -> Iterator[List[str]]:
+        statements: List[str] = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        # Saving the scored emotions runs statements in the background.
+        emotion_tagger.wait()
+        event.listen(
+            test_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(
+                test_engine, "before_cursor_execute", before_cursor_execute)
+
+    return count
+
+
+@pytest.fixture(autouse=True)
+def reset_http_client():
+    yield
+    http_client.reset()
+
+
 @pytest.fixture
 def sqlite_engine():
     SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
@@ -3,6 +3,7 @@
 from fastapi import status
 import pytest
 
+from app.telegram import handlers
 from app.telegram.handlers import MessageHandler, reply_unknown_user
 from app.telegram.keyboards import DATE_FORMAT
 from app.telegram.models import Bot, Chat
@@ -79,6 +80,12 @@ def gen_callback(text):
             'data': f'{text}'}}
 
 
+@pytest.fixture(autouse=True)
+def telegram_dispatcher(mocker):
+    """Keeps the handlers' replies from being sent to Telegram."""
+    return mocker.patch.object(handlers, 'telegram_dispatcher')
+
+
 class TestChatModel:
 
     @staticmethod
@@ -157,13 +164,14 @@ class TestHandlers:
     TEST_USER = get_test_placeholder_user()
 
     @pytest.mark.asyncio
-    async def test_start_handlers(self):
+    async def test_start_handlers(self, telegram_dispatcher):
         chat = Chat(gen_message('/start'))
         message = MessageHandler(chat, self.TEST_USER)
 
         assert '/start' in message.handlers
         assert await message.process_callback() == '''Hello, Moshe!
 Welcome to PyLendar telegram client!'''
+        telegram_dispatcher.send.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_default_handlers(self):
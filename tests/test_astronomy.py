@@ -7,8 +7,10 @@
 import responses
 import respx
 
+from app.internal import astronomy
 from app.internal.astronomy import ASTRONOMY_URL
 from app.internal.astronomy import get_astronomical_data
+from app.internal.astronomy import get_astronomical_data_range
 
 RESPONSE_FROM_MOCK = {
     "location": {
@@ -40,12 +42,65 @@
 }
 
 
+@pytest.fixture(autouse=True)
+def clear_api_cache():
+    astronomy._api_cache.clear()
+    yield
+    astronomy._api_cache.clear()
+
+
 @pytest.mark.asyncio
 async def test_get_astronomical_data(httpx_mock):
     requested_date = datetime.datetime(day=4, month=4, year=2020)
     httpx_mock.add_response(method="GET", json=RESPONSE_FROM_MOCK)
-    output = await get_astronomical_data(requested_date, "tel aviv")
+    output = await get_astronomical_data(requested_date, "32.07,34.76")
+    assert output['success']
+    assert output['astronomy']['moon_phase'] == "Waxing Gibbous"
+
+
+@pytest.mark.asyncio
+async def test_get_astronomical_data_caches_api_responses(httpx_mock):
+    requested_date = datetime.datetime(day=4, month=4, year=2020)
+    httpx_mock.add_response(method="GET", json=RESPONSE_FROM_MOCK)
+    first = await get_astronomical_data(requested_date, "32.07,34.76")
+    second = await get_astronomical_data(requested_date, "32.07,34.76")
+    assert first == second
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_astronomical_data_locally():
+    requested_date = datetime.datetime(day=23, month=1, year=2021)
+    output = await get_astronomical_data(requested_date, "Tel Aviv")
     assert output['success']
+    assert output['name'] == "Tel Aviv-Yafo"
+    assert output['tz_id'] == "Asia/Jerusalem"
+    assert output['astronomy'] == {
+        "sunrise": "06:40 AM",
+        "sunset": "05:07 PM",
+        "moonrise": "12:36 PM",
+        "moonset": "01:55 AM",
+        "moon_phase": "Waxing Gibbous",
+        "moon_illumination": "73",
+    }
+
+
+def test_get_astronomical_data_range():
+    output = get_astronomical_data_range(
+        datetime.date(2021, 1, 1), datetime.date(2021, 12, 31), "london")
+    assert len(output['astronomy']) == 365
+    assert output['astronomy']['2021-06-21']['sunrise'] == "04:44 AM"
+    assert output['astronomy']['2021-06-21']['sunset'] == "09:22 PM"
+    no_moonrise = [
+        day for day in output['astronomy'].values()
+        if day['moonrise'] == "No moonrise"
+    ]
+    assert 10 <= len(no_moonrise) <= 14
+
+
+def test_get_astronomical_data_range_of_unknown_location():
+    assert get_astronomical_data_range(
+        datetime.date(2021, 1, 1), datetime.date(2021, 1, 31), "123") is None
 
 
 @respx.mock
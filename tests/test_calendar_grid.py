@@ -1,6 +1,11 @@
 import datetime
+import time
+import tracemalloc
+
+import pytest
 
 import app.routers.calendar_grid as cg
+from app.routers.event import create_event
 
 DATE = datetime.date(1988, 5, 3)
 DAY = cg.Day(datetime.date(1988, 5, 3))
@@ -14,24 +19,70 @@
 ]
 DAY_TYPES = [cg.Day, cg.DayWeekend, cg.Today, cg.FirstDayMonth]
 WEEK_DAYS = cg.Week.WEEK_DAYS
+EVENTS_WEEK_START = datetime.date(2021, 1, 31)
+DATE_2021 = datetime.date(2021, 2, 1)
+
+
+BENCHMARK_BLOCKS = 200
+
+
+class DictDay:
+    """The grid day as it was before __slots__ and the shared css maps."""
+
+    def __init__(self, date):
+        self.date = date
+        self.sday = date.strftime("%A")
+        self.dailyevents = []
+        self.events = []
+        self.css = {
+            'day_container': 'day',
+            'date': 'day-number',
+            'daily_event': 'month-event',
+            'daily_event_front': ' '.join([
+                'daily', 'front', 'background-warmyellow']),
+            'daily_event_back': ' '.join([
+                'daily', 'back', 'text-darkblue', 'background-lightgray']),
+            'event': 'event',
+        }
+
+
+def get_events_week() -> cg.Week:
+    return cg.create_weeks(
+        cg.get_n_days(EVENTS_WEEK_START - datetime.timedelta(days=1), 7))[0]
 
 
 class TestCalendarGrid:
     @staticmethod
-    def test_get_calendar(client):
-        response = client.get("/calendar/month")
+    def test_get_calendar(logged_in_client):
+        response = logged_in_client.get("/calendar/month")
         assert response.ok
         assert b"SUNDAY" in response.content
 
     @staticmethod
-    def test_get_calendar_extends(client):
+    def test_get_calendar_requires_login(test_db_client):
+        response = test_db_client.get(
+            "/calendar/month/", allow_redirects=False)
+        assert response.headers["location"].startswith("/login")
+
+    @staticmethod
+    def test_get_calendar_extends(logged_in_client):
         days = 42
-        response = client.get(
+        response = logged_in_client.get(
             f"/calendar/month/add/{DAY.set_id()}?days={days}"
         )
         assert response.ok
         assert b"08-May" in response.content
 
+    @staticmethod
+    def test_get_calendar_extends_not_modified(logged_in_client):
+        path = f"/calendar/month/add/{DAY.set_id()}?days=42"
+        response = logged_in_client.get(path)
+        etag = response.headers["ETag"]
+        assert "no-cache" in response.headers["Cache-Control"]
+        response = logged_in_client.get(path, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert not response.content
+
     @staticmethod
     def test_create_day():
         dates_to_check = {
@@ -117,3 +168,97 @@ def test_display_str():
     @staticmethod
     def test_create_week_object():
         assert cg.Week(NEXT_N_DAYS)
+
+    @staticmethod
+    def test_add_events_to_days(event1, multiday_event, all_day_event1):
+        week = get_events_week()
+        cg.add_events_to_days(
+            week.days, [event1, multiday_event, all_day_event1])
+        assert [len(day.events) for day in week.days] == [0, 2, 1, 1, 0, 0, 0]
+        assert week.days[1].events == [
+            ("07AM", "test1"), ("01PM", "test_multiday"),
+        ]
+        assert week.days[2].events == [("12AM", "test_multiday")]
+        assert week.days[3].dailyevents == [("test3", "test")]
+
+    @staticmethod
+    def test_add_user_events_single_query(
+        session, count_queries, user, event1, event2, event3, multiday_event,
+    ):
+        for event in [event1, event2, event3, multiday_event]:
+            create_event(
+                db=session,
+                title=event.title,
+                start=event.start,
+                end=event.end,
+                owner_id=user.id,
+            )
+        user_id = user.id
+        weeks_block = cg.get_month_block(cg.Day(DATE_2021))
+        with count_queries() as statements:
+            weeks = cg.add_user_events(session, user_id, weeks_block)
+        assert len(statements) == 1
+        events_count = sum(len(day.events) for w in weeks for day in w.days)
+        assert events_count == 6
+
+    @staticmethod
+    def test_day_has_no_instance_dict():
+        with pytest.raises(AttributeError):
+            DAY.__dict__
+        with pytest.raises(AttributeError):
+            cg.Week(NEXT_N_DAYS).__dict__
+
+    @staticmethod
+    def test_css_is_shared_and_read_only():
+        assert cg.Day(DATE).css is cg.Day(N_DAYS_BEFORE).css
+        assert WEEKEND.css['date'] == 'day-number text-gray'
+        with pytest.raises(TypeError):
+            DAY.css['date'] = 'day-number text-gray'
+
+    @staticmethod
+    def test_day_names():
+        assert DAY.sday == 'Tuesday'
+        assert WEEKEND.sday == 'Saturday'
+        assert list(cg.Week.DAYS_OF_THE_WEEK) == [
+            'Monday', 'Tuesday', 'Wednesday', 'Thursday',
+            'Friday', 'Saturday', 'Sunday',
+        ]
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return duration, peak
+
+
+@pytest.mark.benchmark
+def test_benchmark_month_blocks():
+    num_of_days = WEEK_DAYS * cg.MONTH_BLOCK * BENCHMARK_BLOCKS
+
+    def build_dict_days():
+        days = (
+            DictDay(DATE + datetime.timedelta(days=i))
+            for i in range(num_of_days)
+        )
+        return cg.create_weeks(days)
+
+    def build_month_blocks():
+        return [
+            cg.get_month_block(cg.Day(DATE + datetime.timedelta(weeks=i)))
+            for i in range(0, BENCHMARK_BLOCKS * cg.MONTH_BLOCK,
+                           cg.MONTH_BLOCK)
+        ]
+
+    dict_time, dict_peak = measure(build_dict_days)
+    slots_time, slots_peak = measure(build_month_blocks)
+    print(
+        f"\n{num_of_days} grid days: dict based {dict_time:.3f}s "
+        f"{dict_peak / 1024:.0f}KiB, slots {slots_time:.3f}s "
+        f"{slots_peak / 1024:.0f}KiB"
+    )
+    assert slots_peak < dict_peak
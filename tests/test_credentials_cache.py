@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+
+from app.internal.credentials_cache import CredentialsCache, needs_refresh
+
+
+def make_credentials(token='token', expires_in=timedelta(hours=1)):
+    return Credentials(token=token, expiry=datetime.utcnow() + expires_in)
+
+
+def test_needs_refresh():
+    assert not needs_refresh(make_credentials())
+    assert needs_refresh(make_credentials(expires_in=timedelta(minutes=4)))
+    assert needs_refresh(make_credentials(token=None))
+    assert not needs_refresh(Credentials(token='token'))
+
+
+def test_cache_drops_expiring_credentials():
+    cache = CredentialsCache()
+    credentials = make_credentials()
+    cache.set(1, credentials)
+    assert cache.get(1) is credentials
+    assert cache.get(2) is None
+
+    credentials.expiry = datetime.utcnow() + timedelta(minutes=1)
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_cache_ttl():
+    cache = CredentialsCache(ttl=0)
+    cache.set(1, make_credentials())
+    assert cache.get(1) is None
+
+
+def test_cache_lock_per_user():
+    cache = CredentialsCache()
+    assert cache.lock(1) is cache.lock(1)
+    assert cache.lock(1) is not cache.lock(2)
@@ -1,14 +1,21 @@
 import datetime
+import json
+import operator
+import time
 
 import pytest
 
+from app.config import CONTENT_WEIGHTS, RESOURCES_DIR, TITLE_WEIGHTS
 from app.internal.emotion import (
+    EMOTIONS,
     Emoticon,
     is_emotion_above_significance,
     get_dominant_emotion,
     get_emotion,
+    get_emotions,
     get_html_emoticon)
 
+from app.internal.emotion_tagging import emotion_tagger
 from app.routers.event import create_event
 
 
@@ -95,4 +102,87 @@ def test_create_event(title, start, end, all_day,
                       owner_id, content, location, result, session):
     event = create_event(session, title, start,
                          end, all_day, owner_id, content, location)
+    emotion_tagger.wait()
+    session.refresh(event)
     assert event.emotion == result
+
+
+BENCHMARK_TEXTS = 300
+
+
+def test_get_emotions_batch():
+    pairs = [
+        (HAPPY_MESSAGE, None),
+        (SAD_MESSAGE, SAD_MESSAGE),
+        (HAPPY_MESSAGE, SAD_MESSAGE),
+        (" ", " "),
+    ]
+    assert get_emotions(pairs) == [
+        get_emotion(title, content) for title, content in pairs
+    ]
+
+
+@pytest.mark.parametrize("text, result", [
+    ("not bad at all", Emoticon('Happy', 1.0, '&#128515')),
+    ("I cannot stand it", Emoticon('Fear', 0.67, '&#128561')),
+    ("lunch \U0001F600", Emoticon('Happy', 1.0, '&#128515')),
+    ("ugh", Emoticon('Sad', 1.0, '&#128577')),
+])
+def test_lexicon_normalizes_words(text, result):
+    assert get_dominant_emotion(text, None) == result
+
+
+def text2emotion_emotion(title, content):
+    """The emotion of an event as it was scored with text2emotion."""
+    te = pytest.importorskip("text2emotion")
+    title_emotion = te.get_emotion(title)
+    content_emotion = None
+    if content is not None and content.strip() != "":
+        content_emotion = te.get_emotion(content)
+    dominant = Emoticon(dominant=None, score=0, code=None)
+    duplicate = False
+    for emotion, code in EMOTIONS.items():
+        score = title_emotion[emotion]
+        if content_emotion:
+            score = (score * TITLE_WEIGHTS
+                     + content_emotion[emotion] * CONTENT_WEIGHTS)
+        if score > dominant.score:
+            dominant, duplicate = Emoticon(emotion, score, code), False
+        elif score == dominant.score:
+            duplicate = True
+    if duplicate or not is_emotion_above_significance(dominant):
+        return None
+    return dominant.code
+
+
+def get_quote_pairs():
+    quotes = [quote["text"] for quote in json.loads(
+        (RESOURCES_DIR / "quotes.json").read_text())][:BENCHMARK_TEXTS + 1]
+    return [
+        (quotes[i], quotes[i + 1] if i % 2 else None)
+        for i in range(BENCHMARK_TEXTS)
+    ]
+
+
+def test_lexicon_scorer_agrees_with_text2emotion():
+    pairs = get_quote_pairs()
+    expected = [text2emotion_emotion(*pair) for pair in pairs]
+    agreement = sum(map(operator.eq, get_emotions(pairs), expected))
+    assert agreement / len(pairs) >= 0.99
+
+
+@pytest.mark.benchmark
+def test_benchmark_lexicon_scorer():
+    pairs = get_quote_pairs()
+    start = time.perf_counter()
+    for pair in pairs:
+        text2emotion_emotion(*pair)
+    text2emotion_time = time.perf_counter() - start
+    start = time.perf_counter()
+    get_emotions(pairs)
+    lexicon_time = time.perf_counter() - start
+    print(
+        f"\n{len(pairs)} events: text2emotion {text2emotion_time:.3f}s, "
+        f"lexicon {lexicon_time:.3f}s"
+    )
+    assert lexicon_time < text2emotion_time
@@ -0,0 +1,142 @@
+from datetime import datetime
+import threading
+
+from app.database.models import Event
+from app.internal import emotion_tagging
+from app.internal.emotion_tagging import EmotionTagger, emotion_tagger
+from app.internal.event_changes import get_events_version
+from app.routers.event import create_event, update_event
+
+HAPPY_MESSAGE = "This is great"
+SAD_MESSAGE = "I'm so lonely and feel bad"
+START = datetime(2021, 2, 1, 10)
+END = datetime(2021, 2, 1, 11)
+
+
+def add_event(session, user, title, content=None):
+    return create_event(session, title, START, END, user.id, content=content)
+
+
+def test_score_emotions():
+    assert emotion_tagging.score_emotions([
+        (HAPPY_MESSAGE, None), (SAD_MESSAGE, SAD_MESSAGE), (" ", " "),
+    ]) == ["&#128515", "&#128577", None]
+
+
+def test_changed_title_is_tagged_again(session, user):
+    event = add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.wait()
+    session.refresh(event)
+    assert event.emotion == "&#128515"
+
+    event.title = SAD_MESSAGE
+    session.commit()
+    emotion_tagger.wait()
+    session.refresh(event)
+    assert event.emotion == "&#128577"
+
+
+def test_rolled_back_events_are_not_tagged(session, user, mocker):
+    tag = mocker.spy(emotion_tagger, "tag")
+    session.add(Event(
+        title=HAPPY_MESSAGE, start=START, end=END, owner_id=user.id,
+    ))
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert tag.call_count == 0
+
+
+def test_deleted_event_is_skipped(session, user):
+    event = add_event(session, user, HAPPY_MESSAGE)
+    session.delete(event)
+    session.commit()
+    emotion_tagger.wait()
+    assert session.query(Event).count() == 0
+
+
+def test_backfill(session, user):
+    tagger = EmotionTagger(max_workers=1)
+    session.add_all([
+        Event(title=title, start=START, end=END, owner_id=user.id)
+        for title in [HAPPY_MESSAGE, SAD_MESSAGE, " "] * 3
+    ])
+    session.flush()
+    session.info.pop(emotion_tagging.PENDING_TAGS_KEY)
+    session.commit()
+
+    assert tagger.backfill(session, chunk_size=2) == 9
+    emotions = [
+        emotion for emotion, in session.query(Event.emotion).order_by(Event.id)
+    ]
+    assert emotions == ["&#128515", "&#128577", None] * 3
+    assert tagger.backfill(session, chunk_size=2) == 0
+
+
+def test_changed_title_is_backfilled_again(session, user):
+    tagger = EmotionTagger(max_workers=1)
+    event = add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.wait()
+    session.refresh(event)
+    assert event.emotion_scored_at is not None
+
+    event.title = SAD_MESSAGE
+    session.flush()
+    session.info.pop(emotion_tagging.PENDING_TAGS_KEY)
+    session.commit()
+    assert event.emotion_scored_at is None
+    assert tagger.backfill(session) == 1
+    session.refresh(event)
+    assert event.emotion == "&#128577"
+
+
+def test_updated_title_is_tagged_again(session, user):
+    event = add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.wait()
+    update_event(event.id, {"title": SAD_MESSAGE}, session)
+    emotion_tagger.wait()
+    session.refresh(event)
+    assert event.emotion == "&#128577"
+
+
+def test_tagging_bumps_only_the_event_users(session, user, sender):
+    event = add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.wait()
+    version = get_events_version(session, user.id)
+    sender_version = get_events_version(session, sender.id)
+    emotion_tagger.tag(session.get_bind(), [(event.id, SAD_MESSAGE, None)])
+    emotion_tagger.wait()
+    assert get_events_version(session, user.id) > version
+    assert get_events_version(session, sender.id) == sender_version
+
+
+def test_scored_events_are_saved_on_the_saver_thread(session, user, mocker):
+    threads = []
+    save_emotions = emotion_tagging._save_emotions
+
+    def record_thread(*args):
+        threads.append(threading.current_thread().name)
+        save_emotions(*args)
+
+    mocker.patch.object(emotion_tagging, "_save_emotions", record_thread)
+    add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.wait()
+    assert len(threads) == 1
+    assert threads[0].startswith("emotion-saver")
+
+
+def test_register_listeners_once(session, user, mocker):
+    tag = mocker.spy(emotion_tagger, "tag")
+    emotion_tagging.register_listeners()
+    add_event(session, user, HAPPY_MESSAGE)
+    assert tag.call_count == 1
+
+
+def test_closed_tagger_starts_again(session, user):
+    add_event(session, user, HAPPY_MESSAGE)
+    emotion_tagger.close()
+    assert emotion_tagger._executor is None
+    event = add_event(session, user, SAD_MESSAGE)
+    emotion_tagger.wait()
+    session.refresh(event)
+    assert event.emotion == "&#128577"
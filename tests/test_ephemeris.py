@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytz
+
+from app.internal.ephemeris import (
+    get_astronomical_day, get_astronomical_days, get_moon_illumination,
+    get_moon_phase_name, get_moon_times, get_sun_times,
+)
+
+LONDON = (51.51, -0.13, pytz.timezone("Europe/London"))
+NEW_YORK = (40.71, -74.01, pytz.timezone("America/New_York"))
+SVALBARD = (78.22, 15.65, pytz.timezone("Arctic/Longyearbyen"))
+
+
+def minutes_between(first: datetime, second: datetime) -> float:
+    return abs((first - second).total_seconds()) / 60
+
+
+def test_get_sun_times():
+    sunrise, sunset = get_sun_times(date(2021, 6, 21), *LONDON)
+    tz = LONDON[2]
+    assert minutes_between(
+        sunrise, tz.localize(datetime(2021, 6, 21, 4, 43))) < 3
+    assert minutes_between(
+        sunset, tz.localize(datetime(2021, 6, 21, 21, 21))) < 3
+
+
+@pytest.mark.parametrize("day", [date(2021, 6, 21), date(2021, 12, 21)])
+def test_get_sun_times_in_polar_day_and_night(day):
+    assert get_sun_times(day, *SVALBARD) == (None, None)
+
+
+def test_get_moon_times():
+    moonrise, moonset = get_moon_times(date(2021, 1, 28), *NEW_YORK)
+    tz = NEW_YORK[2]
+    assert minutes_between(
+        moonrise, tz.localize(datetime(2021, 1, 28, 16, 51))) < 10
+    assert minutes_between(
+        moonset, tz.localize(datetime(2021, 1, 28, 7, 23))) < 10
+
+
+@pytest.mark.parametrize("moment, phase_name, illumination", [
+    (datetime(2021, 1, 28, 19, 16), "Full Moon", 1),
+    (datetime(2021, 1, 13, 5, 0), "New Moon", 0),
+    (datetime(2021, 1, 20, 21, 2), "First Quarter", 0.5),
+])
+def test_get_moon_illumination(moment, phase_name, illumination):
+    phase, fraction = get_moon_illumination(pytz.utc.localize(moment))
+    assert get_moon_phase_name(phase) == phase_name
+    assert fraction == pytest.approx(illumination, abs=0.03)
+
+
+def test_get_astronomical_days_matches_single_days():
+    start = date(2021, 3, 1)
+    days = get_astronomical_days(start, date(2021, 3, 31), *LONDON)
+    assert [day.date for day in days] == [
+        start + timedelta(days=offset) for offset in range(31)
+    ]
+    assert days[27] == get_astronomical_day(date(2021, 3, 28), *LONDON)
+    assert days[27].sunrise.tzinfo.zone == "Europe/London"
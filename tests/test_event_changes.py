@@ -0,0 +1,92 @@
+from datetime import datetime
+
+from app.database.models import Event, UserEvent
+from app.internal.event_changes import get_events_version
+from app.routers.event import create_event, delete_event, update_event
+
+EVENT_START = datetime(2021, 2, 1, 10)
+
+
+def test_event_writes_bump_version(session, user, sender):
+    user_id, sender_id = user.id, sender.id
+    assert get_events_version(session, user_id) == (0, None)
+    event = create_event(
+        db=session,
+        title='test',
+        start=EVENT_START,
+        end=EVENT_START,
+        owner_id=sender_id,
+    )
+    sender_version = get_events_version(session, sender_id)
+    assert sender_version.version > 0
+    assert sender_version.changed_at is not None
+    assert get_events_version(session, user_id) == (0, None)
+
+    session.add(UserEvent(user_id=user_id, event_id=event.id))
+    session.commit()
+    version = get_events_version(session, user_id)
+    assert version.version > 0
+    assert get_events_version(session, sender_id) == sender_version
+
+    update_event(event.id, {'title': 'updated'}, session)
+    assert get_events_version(session, user_id) > version
+    assert get_events_version(session, sender_id) > sender_version
+
+
+def test_event_writes_keep_other_users_version(session, user, sender):
+    event = create_event(
+        db=session,
+        title='test',
+        start=EVENT_START,
+        end=EVENT_START,
+        owner_id=user.id,
+    )
+    version = get_events_version(session, user.id)
+    sender_version = get_events_version(session, sender.id)
+
+    update_event(event.id, {'title': 'updated'}, session)
+    updated_version = get_events_version(session, user.id)
+    assert updated_version > version
+    assert get_events_version(session, sender.id) == sender_version
+
+    delete_event(event.id, session)
+    assert get_events_version(session, user.id) > updated_version
+    assert get_events_version(session, sender.id) == sender_version
+
+
+def test_rolled_back_writes_keep_version(session, user, event):
+    user_id = user.id
+    version = get_events_version(session, user_id)
+    session.add(UserEvent(user_id=user_id, event_id=event.id))
+    session.flush()
+    session.rollback()
+    assert get_events_version(session, user_id) == version
+
+
+def test_version_of_missing_user(session):
+    assert get_events_version(session, 404) == (0, None)
+
+
+def test_bulk_writes_bump_every_version(session, user, sender):
+    version = get_events_version(session, user.id)
+    sender_version = get_events_version(session, sender.id)
+    session.query(Event).filter(Event.id < 0).delete()
+    session.commit()
+    assert get_events_version(session, user.id) > version
+    assert get_events_version(session, sender.id) > sender_version
+
+
+def test_version_is_shared_by_sessions(session, user):
+    create_event(
+        db=session,
+        title='test',
+        start=EVENT_START,
+        end=EVENT_START,
+        owner_id=user.id,
+    )
+    other_session = type(session)(bind=session.get_bind())
+    try:
+        assert get_events_version(other_session, user.id) == (
+            get_events_version(session, user.id))
+    finally:
+        other_session.close()
@@ -1,9 +1,14 @@
+from datetime import datetime
+
 import pytest
 
 from app import config
+from app.routers.event import create_event, update_event
 from app.routers.event_images import (attach_image_to_event,
                                       generate_flare_link_from_lemmatized_word,
+                                      get_event_flair,
                                       get_image_name,
+                                      PhraseMatcher,
                                       remove_non_alphabet_chars,
                                       search_token_in_related_words)
 
@@ -76,3 +81,44 @@ def test_search_token_in_related_words(token, link):
 @pytest.mark.parametrize('event_content, link', event_contents)
 def test_attach_image_to_event(event_content, link):
     assert attach_image_to_event(event_content) == link
+
+
+phrases = [
+    (r"Family meal at grandma's", f'{static}\\event_flairs\\food.jpg'),
+    (r"table tennis with Dana", f'{static}\\event_flairs\\pingpong.jpg'),
+    (r"TENNIS, then table tennis", f'{static}\\event_flairs\\tennis.jpg'),
+    (r"All Saints' Eve party", f'{static}\\event_flairs\\halloween.jpg'),
+    (r"X-Mas shopping", f'{static}\\event_flairs\\christmas.jpg'),
+    (r"drinking with friends", f'{static}\\event_flairs\\drank.jpg'),
+    (r"family", r'#'),
+    (r"", r'#'),
+]
+
+
+@pytest.mark.parametrize('event_content, link', phrases)
+def test_attach_image_to_event_phrases(event_content, link):
+    assert attach_image_to_event(event_content) == link
+
+
+def test_phrase_matcher_leftmost_longest():
+    matcher = PhraseMatcher()
+    matcher.add('tennis', 'tennis')
+    matcher.add('table tennis', 'pingpong')
+    matcher.add('table', 'furniture', replace=False)
+    assert matcher.find('new table') == 'furniture'
+    assert matcher.find('a table tennis match') == 'pingpong'
+    assert matcher.find('tennis table') == 'tennis'
+    assert matcher.find('nothing here') is None
+
+
+def test_event_flair_is_stored(session, user):
+    event = create_event(
+        session, 'Lunch', datetime(2021, 2, 1, 12), datetime(2021, 2, 1, 13),
+        user.id, content='and then yoga',
+    )
+    assert event.flair == f'{static}\\event_flairs\\food.jpg'
+    event = update_event(event.id, {'title': 'Meeting'}, session)
+    assert event.flair == f'{static}\\event_flairs\\yoga.jpg'
+    event = update_event(event.id, {'content': None}, session)
+    assert event.flair is None
+    assert get_event_flair('Meeting') is None
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import random
+import time
+
+import pytest
+
+from app.database.models import Event
+from app.internal.event_index import EventIntervalIndex
+
+FIRST_DAY = datetime(2021, 1, 1)
+BENCHMARK_EVENTS = 10_000
+BENCHMARK_DAYS = 365
+
+
+def make_event(start: datetime, duration: timedelta) -> Event:
+    return Event(title='event', start=start, end=start + duration)
+
+
+def overlapping_linear_scan(events, start, end):
+    return [
+        event for event in events
+        if event.start < end and (event.end > start or event.start >= start)
+    ]
+
+
+@pytest.fixture
+def random_events():
+    rand = random.Random(2021)
+    events = [
+        make_event(
+            FIRST_DAY + timedelta(minutes=rand.randrange(60 * 24 * 365)),
+            timedelta(minutes=rand.choice([0, 15, 60, 60 * 30, 60 * 24 * 3])),
+        )
+        for _ in range(BENCHMARK_EVENTS)
+    ]
+    return sorted(events, key=lambda event: event.start)
+
+
+def days_of_year(days=BENCHMARK_DAYS):
+    for i in range(days):
+        day = FIRST_DAY + timedelta(days=i)
+        yield day, day + timedelta(days=1)
+
+
+def test_empty_index():
+    index = EventIntervalIndex([])
+    assert len(index) == 0
+    assert index.overlapping(FIRST_DAY, FIRST_DAY + timedelta(days=1)) == []
+
+
+def test_overlapping_edges():
+    day_end = FIRST_DAY + timedelta(days=1)
+    ends_at_midnight = make_event(FIRST_DAY - timedelta(hours=1),
+                                  timedelta(hours=1))
+    zero_length = make_event(FIRST_DAY, timedelta(0))
+    multiday = make_event(FIRST_DAY - timedelta(days=1), timedelta(days=3))
+    starts_at_day_end = make_event(day_end, timedelta(hours=1))
+    index = EventIntervalIndex(
+        [multiday, ends_at_midnight, zero_length, starts_at_day_end])
+    assert len(index) == 4
+    assert index.overlapping(FIRST_DAY, day_end) == [multiday, zero_length]
+
+
+def test_overlapping_matches_linear_scan(random_events):
+    index = EventIntervalIndex(random_events)
+    for start, end in days_of_year(days=31):
+        expected = overlapping_linear_scan(random_events, start, end)
+        assert index.overlapping(start, end) == expected
+
+
+@pytest.mark.benchmark
+def test_benchmark_against_linear_scan(random_events):
+    index = EventIntervalIndex(random_events)
+
+    linear_start = time.perf_counter()
+    for start, end in days_of_year():
+        overlapping_linear_scan(random_events, start, end)
+    linear_time = time.perf_counter() - linear_start
+
+    index_start = time.perf_counter()
+    for start, end in days_of_year():
+        index.overlapping(start, end)
+    index_time = time.perf_counter() - index_start
+
+    print(
+        f"\n{BENCHMARK_DAYS} day lookups over {BENCHMARK_EVENTS} events: "
+        f"linear scan {linear_time:.3f}s, interval index {index_time:.3f}s"
+    )
+    assert index_time < linear_time
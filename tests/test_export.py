@@ -1,12 +1,17 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from icalendar import vCalAddress
+from icalendar import Calendar, vCalAddress
+import pytest
 
 from app.config import ICAL_VERSION, PRODUCT_ID
-from app.internal import export
+from app.database.models import UserEvent
+from app.internal import calendar_feed, export
 from app.internal.agenda_events import filter_dates
+from app.routers.event import create_event
 from app.routers.user import get_all_user_events
 
+EVENT_START = datetime(2021, 2, 1, 10)
+
 
 class TestExport:
 
@@ -119,3 +124,114 @@ def test_get_icalendar_with_multiple_events(
                 session, [event, today_event])
 
             assert icalendar
+
+        @staticmethod
+        @pytest.mark.parametrize("batch_size, queries", [(1, 3), (1000, 2)])
+        def test_iter_user_icalendar(
+                session, count_queries, sender, user, today_event,
+                next_month_event, batch_size, queries):
+            session.add(UserEvent(user_id=user.id, event_id=today_event.id))
+            session.commit()
+            sender_id = sender.id
+            with count_queries() as statements:
+                icalendar = b"".join(export.iter_user_icalendar(
+                    session, sender_id, batch_size=batch_size))
+
+            assert len(statements) == queries
+            calendar = Calendar.from_ical(icalendar)
+            assert calendar.get('prodid') == PRODUCT_ID
+            ievents = calendar.walk('VEVENT')
+            assert [str(e.get('summary')) for e in ievents] == [
+                today_event.title, next_month_event.title,
+            ]
+            assert sender.email in ievents[0].get('organizer')
+            assert ievents[0].get('attendee') == f'MAILTO:{user.email}'
+            assert ievents[1].get('attendee') is None
+
+
+class TestCalendarFeed:
+
+    @staticmethod
+    def get_feed_path(client):
+        url = client.get('/export/feed').json()['url']
+        assert url.startswith('webcal://')
+        return url[url.index('/export'):]
+
+    @staticmethod
+    def test_feed(test_db_client, session, user):
+        path = TestCalendarFeed.get_feed_path(test_db_client)
+        create_event(
+            db=session, title='feed event', start=EVENT_START,
+            end=EVENT_START, owner_id=user.id,
+        )
+        response = test_db_client.get(path)
+        assert response.ok
+        assert response.headers['content-type'].startswith('text/calendar')
+        assert b'SUMMARY:feed event' in response.content
+        assert 'no-cache' in response.headers['Cache-Control']
+
+    @staticmethod
+    def test_feed_not_modified(test_db_client, session, user):
+        path = TestCalendarFeed.get_feed_path(test_db_client)
+        response = test_db_client.get(path)
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        response = test_db_client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert not response.content
+        response = test_db_client.get(
+            path, headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+        create_event(
+            db=session, title='new event', start=EVENT_START,
+            end=EVENT_START, owner_id=user.id,
+        )
+        response = test_db_client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert b'SUMMARY:new event' in response.content
+
+    @staticmethod
+    def test_feed_validators_survive_restart(test_db_client, session, user):
+        path = TestCalendarFeed.get_feed_path(test_db_client)
+        create_event(
+            db=session, title='feed event', start=EVENT_START,
+            end=EVENT_START, owner_id=user.id,
+        )
+        response = test_db_client.get(path)
+        calendar_feed.feed_cache.clear()
+        headers = {
+            'If-None-Match': response.headers['ETag'],
+            'If-Modified-Since': response.headers['Last-Modified'],
+        }
+        assert test_db_client.get(path, headers=headers).status_code == 304
+
+    @staticmethod
+    def test_feed_range(test_db_client, session, user):
+        path = TestCalendarFeed.get_feed_path(test_db_client)
+        create_event(
+            db=session, title='feed event', start=EVENT_START,
+            end=EVENT_START, owner_id=user.id,
+        )
+        day = EVENT_START.date()
+        response = test_db_client.get(
+            f'{path}?start_date={day + timedelta(days=1)}')
+        assert b'feed event' not in response.content
+        response = test_db_client.get(
+            f'{path}?start_date={day}&end_date={day}')
+        assert b'feed event' in response.content
+
+    @staticmethod
+    @pytest.mark.parametrize('token', ['1-wrong', 'wrong', '-'])
+    def test_feed_token_not_valid(test_db_client, token):
+        response = test_db_client.get(f'/export/feed/{token}.ics')
+        assert response.status_code == 404
+
+    @staticmethod
+    def test_feed_token():
+        token = calendar_feed.get_feed_token(7)
+        assert calendar_feed.get_feed_user_id(token) == 7
+        assert calendar_feed.get_feed_user_id(
+            token.replace('7', '8', 1)) is None
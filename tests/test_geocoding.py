@@ -0,0 +1,17 @@
+import pytest
+
+from app.internal.geocoding import get_location
+
+
+@pytest.mark.parametrize("name", [
+    "Tel Aviv-Yafo", "tel aviv", "TEL-AVIV", " Jaffa ",
+])
+def test_get_location_by_name_or_alias(name):
+    location = get_location(name)
+    assert location.name == "Tel Aviv-Yafo"
+    assert location.country == "Israel"
+    assert location.tz_id == "Asia/Jerusalem"
+
+
+def test_get_location_of_unknown_name():
+    assert get_location("Atlantis") is None
@@ -1,16 +1,98 @@
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+import httplib2
 import pytest
 from loguru import logger
 
 import app.internal.google_connect as google_connect
 from app.routers.event import create_event
-from app.database.models import OAuthCredentials
+from app.database.models import (
+    Event, GoogleEvent, GoogleSyncState, OAuthCredentials, UserEvent,
+)
+from app.database.models import User
 from app.routers.user import create_user
+from tests.conftest import TestingSessionLocal
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import HttpMock
 
+DISCOVERY_FILE = './tests/calendar-discovery.json'
+
+
+class FakeCalendarApi:
+    """A local fake of the Calendar API, built on its discovery doc.
+
+    The calendar list holds the given calendars, and the pages of each
+    calendar's events are answered in order. The requested uris are kept.
+    """
+
+    def __init__(self, calendars):
+        with open(DISCOVERY_FILE, 'rb') as discovery:
+            self.discovery = discovery.read()
+        self.pages = {
+            calendar_id: deque(pages)
+            for calendar_id, pages in calendars.items()
+        }
+        self.uris = []
+        self.lock = threading.Lock()
+
+    def service(self):
+        return build('calendar', 'v3', http=FakeCalendarHttp(self))
+
+    def respond(self, uri):
+        with self.lock:
+            self.uris.append(uri)
+            path = urlparse(uri).path
+            if path.endswith('/users/me/calendarList'):
+                page = {'items': [{'id': key} for key in self.pages]}
+            else:
+                calendar_id = unquote(path.split('/')[-2])
+                page = dict(self.pages[calendar_id].popleft())
+        status = page.pop('status', '200')
+        return httplib2.Response({'status': status}), json.dumps(page).encode()
+
+
+class FakeCalendarHttp(HttpMock):
+    def __init__(self, api):
+        super().__init__(headers={'status': '200'})
+        self.api = api
+        self.discovered = False
+
+    def request(self, uri, *args, **kwargs):
+        if not self.discovered:
+            self.discovered = True
+            return httplib2.Response({'status': '200'}), self.api.discovery
+        return self.api.respond(uri)
+
+
+def sync_token_of(session, user, calendar_id='primary'):
+    state = session.query(GoogleSyncState).get((user.id, calendar_id))
+    return state and state.sync_token
+
+
+def google_event(google_id, title, day=25, status='confirmed'):
+    return {
+        'id': google_id,
+        'status': status,
+        'summary': title,
+        'start': {'dateTime': f'2021-02-{day}T13:00:00'},
+        'end': {'dateTime': f'2021-02-{day}T14:00:00'},
+    }
+
+
+def get_google_events(session, user):
+    return (
+        session.query(Event).join(UserEvent)
+        .filter(UserEvent.user_id == user.id, Event.is_google_event)
+        .order_by(Event.title).all()
+    )
+
 
 @pytest.fixture
 def google_events_mock():
@@ -77,6 +159,24 @@ def google_events_mock():
     ]
 
 
+@pytest.fixture(autouse=True)
+def clear_credentials_cache():
+    google_connect.credentials_cache.clear()
+    yield
+    google_connect.credentials_cache.clear()
+
+
+def valid_credentials(token='token', expires_in=timedelta(hours=1)):
+    return Credentials(
+        token=token,
+        refresh_token="refresh",
+        token_uri="some_uri",
+        client_id="somecode",
+        client_secret="some_secret",
+        expiry=datetime.utcnow() + expires_in,
+    )
+
+
 @pytest.fixture
 def credentials():
     cred = Credentials(
@@ -91,52 +191,48 @@ def credentials():
     return cred
 
 
-@pytest.mark.usefixtures("user", "session", "google_events_mock")
-def test_push_events_to_db(google_events_mock, user, session):
-    assert google_connect.push_events_to_db(google_events_mock, user, session)
-
-
-@pytest.mark.usefixtures("user", "session", "google_events_mock")
-def test_db_cleanup(google_events_mock, user, session):
-    for event in google_events_mock:
-        location = None
-        title = event['summary']
-        # support for all day events
-        if 'dateTime' in event['start'].keys():
-            # part time event
-            start = datetime.fromisoformat(event['start']['dateTime'])
-            end = datetime.fromisoformat(event['end']['dateTime'])
-        else:
-            # all day event
-            start = event['start']['date'].split('-')
-            start = datetime(
-                year=int(start[0]),
-                month=int(start[1]),
-                day=int(start[2])
-            )
-
-            end = event['end']['date'].split('-')
-            end = datetime(
-                year=int(end[0]),
-                month=int(end[1]),
-                day=int(end[2])
-            )
-
-        if 'location' in event.keys():
-            location = event['location']
-
-        create_event(
-            db=session,
-            title=title,
-            start=start,
-            end=end,
-            owner_id=user.id,
-            location=location,
-            is_google_event=True
-        )
-
-        assert google_connect.cleanup_user_google_calendar_events(
-            user, session)
+def test_save_google_events(google_events_mock, user, session):
+    links = google_connect.save_google_events(
+        google_events_mock, user, session)
+    session.commit()
+    assert [link.google_event_id for link in links] == [
+        'somecode', 'somecode',
+    ]
+    events = get_google_events(session, user)
+    assert [(e.title, e.location) for e in events] == [
+        ('some title to all day event', 'somelocation'),
+    ]
+    assert events[0].start == datetime(2021, 2, 25)
+
+    google_connect.save_google_events(
+        [google_event('somecode', 'renamed')], user, session)
+    session.commit()
+    assert [e.title for e in get_google_events(session, user)] == ['renamed']
+    assert session.query(GoogleEvent).count() == 1
+
+
+def test_delete_stale_google_events(user, session):
+    old_event = create_event(
+        db=session, title='old', start=datetime(2021, 2, 1),
+        end=datetime(2021, 2, 1), owner_id=user.id, is_google_event=True,
+    )
+    create_event(
+        db=session, title='local', start=datetime(2021, 2, 1),
+        end=datetime(2021, 2, 1), owner_id=user.id,
+    )
+    links = google_connect.save_google_events(
+        [google_event('a', 'a'), google_event('b', 'b')], user, session)
+    google_connect.save_google_events(
+        [google_event('c', 'c')], user, session, 'other')
+    session.flush()
+
+    google_connect.delete_stale_google_events(
+        user, session, 'primary', {links[0].event.id})
+    session.commit()
+    assert session.query(Event).get(old_event.id) is None
+    assert [e.title for e in get_google_events(session, user)] == ['a', 'c']
+    assert session.query(Event).filter_by(title='local').count() == 1
+    assert session.query(GoogleEvent).count() == 2
 
 
 @pytest.mark.usefixtures("session")
@@ -182,46 +278,22 @@ def test_refresh_token(mocker, session, user, credentials):
     assert google_connect.refresh_token(credentials, user, session)
 
 
-@pytest.mark.usefixtures("session", "user", "credentials")
-def test_get_current_year_events(mocker, user, session, credentials):
-    class mock_events:
-        def __init__(self, service):
-            self.service = service
-
-        def list(self, *args):
-            request = self.service.events().list(calendarId='primary',
-                                                 timeMin=datetime(
-                                                     2021, 1, 1).isoformat(),
-                                                 timeMax=datetime(
-                                                     2022, 1, 1).isoformat(),
-                                                 singleEvents=True,
-                                                 orderBy='startTime'
-                                                 )
-            http = HttpMock(
-                'calendar-linux.json',
-                {'status': '200'}
-            )
-            response = request.execute(http=http)
-            return response
-
-    http = HttpMock(
-        './tests/calendar-discovery.json',
-        {'status': '200'}
-    )
-
-    service = build('calendar', 'v3', http=http)
-
-    mocker.patch(
-        'googleapiclient.discovery.build',
-        return_value=service,
-        events=service
-    )
-    mocker.patch(
-        'googleapiclient.discovery.Resource',
-        events=mock_events(service)
-    )
-
-    assert google_connect.get_current_year_events(credentials, user, session)
+def test_full_sync_fetches_current_year_pages():
+    api = FakeCalendarApi({'primary': [
+        {'items': [google_event('a', 'a')], 'nextPageToken': 'page2'},
+        {'items': [google_event('b', 'b')], 'nextSyncToken': 'token'},
+    ]})
+    pages = list(google_connect.iter_changed_events_pages(api.service()))
+    assert [[item['id'] for item in page.items] for page in pages] == [
+        ['a'], ['b'],
+    ]
+    assert all(page.full_sync for page in pages)
+    assert [page.is_last for page in pages] == [False, True]
+    assert pages[-1].next_sync_token == 'token'
+    current_year = datetime.now().year
+    assert f'timeMin={current_year}-01-01' in unquote(api.uris[0])
+    assert f'timeMax={current_year + 1}-01-01' in unquote(api.uris[0])
+    assert 'pageToken=page2' in api.uris[1]
 
 
 @pytest.mark.usefixtures("user", "session",
@@ -296,26 +368,6 @@ def test_get_credentials_from_consent_screen(mocker, session,
                                                 user, session) == credentials
 
 
-@pytest.mark.usefixtures("session")
-def test_create_google_event(session):
-    user = create_user(session=session,
-                       username='new_test_username',
-                       password='new_test_password',
-                       email='new_test.email@gmail.com',
-                       language_id=1)
-
-    event = google_connect.create_google_event(
-            'title',
-            datetime(2021, 1, 1, 15, 15),
-            datetime(2021, 1, 1, 15, 30),
-            user,
-            'location',
-            session
-            )
-
-    assert event.title == 'title'
-
-
 @pytest.mark.usefixtures("session", "user", 'credentials')
 def test_get_credentials(mocker, session, user, credentials):
     user = create_user(
@@ -352,15 +404,187 @@ def test_get_credentials(mocker, session, user, credentials):
 def test_fetch_save_events(mocker, session, user, credentials,
                            google_events_mock):
 
+    api = FakeCalendarApi({'primary': [
+        {'items': google_events_mock, 'nextSyncToken': 'token'},
+    ]})
     mocker.patch(
-        'app.internal.google_connect.get_current_year_events',
-        return_value=google_events_mock
+        'app.internal.google_connect.get_calendar_service',
+        side_effect=lambda credentials: api.service()
     )
 
     assert google_connect.fetch_save_events(credentials,
                                             user, session) is None
+    assert [event.title for event in get_google_events(session, user)] == [
+        'some title to all day event',
+    ]
 
 
 @pytest.mark.usefixtures("session", "user", 'credentials')
 def test_push_credentials_to_db(session, user, credentials):
     assert google_connect.push_credentials_to_db(credentials, user, session)
+
+
+def test_sync_calendars_incrementally(session, user):
+    api = FakeCalendarApi({'primary': [
+        {
+            'items': [google_event('a', 'first'), google_event('b', 'b')],
+            'nextPageToken': 'page2',
+        },
+        {'items': [google_event('c', 'c')], 'nextSyncToken': 'token1'},
+    ]})
+    google_connect.sync_calendars(api.service, user, session)
+    assert [e.title for e in get_google_events(session, user)] == [
+        'b', 'c', 'first',
+    ]
+    assert 'pageToken=page2' in api.uris[-1]
+    assert sync_token_of(session, user) == 'token1'
+
+    api = FakeCalendarApi({'primary': [{
+        'items': [
+            google_event('a', 'updated', day=26),
+            google_event('b', 'b', status='cancelled'),
+            google_event('d', 'd'),
+        ],
+        'nextSyncToken': 'token2',
+    }]})
+    google_connect.sync_calendars(api.service, user, session)
+    assert 'syncToken=token1' in api.uris[-1]
+    events = get_google_events(session, user)
+    assert [e.title for e in events] == ['c', 'd', 'updated']
+    assert events[2].start == datetime(2021, 2, 26, 13)
+    assert session.query(GoogleEvent).count() == 3
+    assert sync_token_of(session, user) == 'token2'
+
+
+def test_sync_calendars_expired_token(session, user):
+    api = FakeCalendarApi({'primary': [
+        {'items': [google_event('a', 'a'), google_event('b', 'b')],
+         'nextSyncToken': 'token1'},
+    ]})
+    google_connect.sync_calendars(api.service, user, session)
+
+    api = FakeCalendarApi({'primary': [
+        {'status': '410', 'error': {'code': 410, 'message': 'Gone'}},
+        {'items': [google_event('b', 'b')], 'nextSyncToken': 'token2'},
+    ]})
+    google_connect.sync_calendars(api.service, user, session)
+    assert 'syncToken=token1' in api.uris[-2]
+    assert 'syncToken' not in api.uris[-1]
+    assert [e.title for e in get_google_events(session, user)] == ['b']
+    assert session.query(GoogleEvent).count() == 1
+
+
+def test_first_sync_replaces_old_google_events(session, user):
+    create_event(
+        db=session, title='old', start=datetime(2021, 2, 1),
+        end=datetime(2021, 2, 1), owner_id=user.id, is_google_event=True,
+    )
+    api = FakeCalendarApi({'primary': [
+        {'items': [google_event('a', 'a')], 'nextSyncToken': 'token'},
+    ]})
+    google_connect.sync_calendars(api.service, user, session)
+    assert [e.title for e in get_google_events(session, user)] == ['a']
+
+
+def test_sync_all_calendars_concurrently(session, user):
+    calendars = ['primary', 'work@group.calendar.google.com', 'home']
+    api = FakeCalendarApi({
+        calendar_id: [
+            {'items': [google_event(f'{calendar_id}1', f'{i}1')],
+             'nextPageToken': 'page2'},
+            {'items': [google_event(f'{calendar_id}2', f'{i}2')],
+             'nextSyncToken': f'token{i}'},
+        ]
+        for i, calendar_id in enumerate(calendars)
+    })
+    google_connect.sync_calendars(api.service, user, session, max_workers=2)
+    assert [e.title for e in get_google_events(session, user)] == [
+        '01', '02', '11', '12', '21', '22',
+    ]
+    for i, calendar_id in enumerate(calendars):
+        assert sync_token_of(session, user, calendar_id) == f'token{i}'
+
+
+def test_failed_calendar_keeps_its_token(session, user):
+    api = FakeCalendarApi({
+        'primary': [
+            {'items': [google_event('a', 'a')], 'nextSyncToken': 'token'},
+        ],
+        'broken': [
+            {'status': '500', 'error': {'code': 500, 'message': 'Error'}},
+        ],
+    })
+    google_connect.sync_calendars(api.service, user, session)
+    assert [e.title for e in get_google_events(session, user)] == ['a']
+    assert sync_token_of(session, user) == 'token'
+    assert sync_token_of(session, user, 'broken') is None
+
+
+def test_push_credentials_upserts_single_row(session, user):
+    google_connect.push_credentials_to_db(
+        valid_credentials('new1'), user, session)
+    google_connect.push_credentials_to_db(
+        valid_credentials('new2'), user, session)
+    rows = session.query(OAuthCredentials).filter_by(user_id=user.id).all()
+    assert [row.token for row in rows] == ['new2']
+
+
+def test_get_credentials_cached(mocker, session, user):
+    google_connect.push_credentials_to_db(valid_credentials(), user, session)
+    from_db = mocker.spy(google_connect, 'get_credentials_from_db')
+    credentials = google_connect.get_credentials(user, session)
+    assert credentials.token == 'token'
+    assert google_connect.get_credentials(user, session) is credentials
+    assert from_db.call_count == 0
+
+
+def test_get_credentials_refreshes_before_expiry(mocker, session, user):
+    google_connect.push_credentials_to_db(
+        valid_credentials(expires_in=timedelta(minutes=2)), user, session)
+    google_connect.credentials_cache.clear()
+
+    def refresh(credentials, request):
+        credentials.token = 'refreshed'
+        credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    mocker.patch.object(Credentials, 'refresh', autospec=True,
+                        side_effect=refresh)
+    credentials = google_connect.get_credentials(user, session)
+    assert credentials.token == 'refreshed'
+    Credentials.refresh.assert_called_once()
+    saved = session.query(OAuthCredentials).filter_by(user_id=user.id).one()
+    assert saved.token == 'refreshed'
+
+
+def test_concurrent_get_credentials_refresh_once(mocker, session, user):
+    google_connect.push_credentials_to_db(
+        valid_credentials(expires_in=timedelta(0)), user, session)
+    google_connect.credentials_cache.clear()
+    user_id = user.id
+
+    def refresh(credentials, request):
+        time.sleep(0.05)
+        credentials.token = 'refreshed'
+        credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    mocker.patch.object(Credentials, 'refresh', autospec=True,
+                        side_effect=refresh)
+    tokens = []
+
+    def sync():
+        thread_session = TestingSessionLocal()
+        try:
+            thread_user = thread_session.query(User).get(user_id)
+            credentials = google_connect.get_credentials(
+                thread_user, thread_session)
+            tokens.append(credentials.token)
+        finally:
+            thread_session.close()
+
+    threads = [threading.Thread(target=sync) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokens == ['refreshed'] * 5
+    Credentials.refresh.assert_called_once()
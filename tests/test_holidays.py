@@ -1,6 +1,6 @@
 import os
 from app.database.models import Event, User
-from app.routers import profile
+from app.internal import import_holidays
 from sqlalchemy.orm import Session
 
 
@@ -19,8 +19,9 @@ def test_get_holidays(self, session: Session, user: User):
         test_file = os.path.join(resource_folder, 'ics_example.txt')
         with open(test_file) as file:
             ics_content = file.read()
-            holidays = profile.get_holidays_from_file(ics_content, session)
-            profile.save_holidays_to_db(holidays, session)
+            holidays = import_holidays.get_holidays_from_file(
+                ics_content, session)
+            import_holidays.save_holidays_to_db(holidays, session)
         assert len(session.query(Event).all()) == 4
 
     def test_wrong_file_get_holidays(self, session: Session, user: User):
@@ -29,6 +30,7 @@ def test_wrong_file_get_holidays(self, session: Session, user: User):
         test_file = os.path.join(resource_folder, 'wrong_ics_example.txt')
         with open(test_file) as file:
             ics_content = file.read()
-            holidays = profile.get_holidays_from_file(ics_content, session)
-            profile.save_holidays_to_db(holidays, session)
+            holidays = import_holidays.get_holidays_from_file(
+                ics_content, session)
+            import_holidays.save_holidays_to_db(holidays, session)
         assert len(session.query(Event).all()) == 0
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.internal.http_client import (
+    CircuitBreaker, CircuitOpenError, DEFAULT_SERVICE, HttpClient,
+    ServicePolicy, ServiceUnavailableError,
+)
+
+URL = "https://service.test/data"
+POLICIES = {DEFAULT_SERVICE: ServicePolicy(
+    timeout=1, retries=2, backoff=0, failure_threshold=2, reset_seconds=30)}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client():
+    return HttpClient(POLICIES)
+
+
+def refuse_connection(request, *args, **kwargs):
+    raise httpx.ConnectError("Connection refused", request=request)
+
+
+def test_circuit_breaker_opens_after_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(2, 30, clock)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_circuit_breaker_lets_a_single_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(1, 30, clock)
+    breaker.record_failure()
+    clock.now = 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    clock.now = 59
+    assert not breaker.allow_request()
+    clock.now = 60
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_request_retries_unavailable_responses(client, httpx_mock):
+    httpx_mock.add_response(url=URL, status_code=503)
+    httpx_mock.add_response(url=URL, json={"ok": True})
+    response = await client.request("service", "GET", URL)
+    assert response.json() == {"ok": True}
+    assert len(httpx_mock.get_requests()) == 2
+    assert client.get_stats()["service.test"]["requests"] == 2
+    assert client.get_stats()["service.test"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_does_not_resend_posts(client, httpx_mock):
+    httpx_mock.add_response(url=URL, method="POST", status_code=503)
+    response = await client.request("service", "POST", URL, data={"a": 1})
+    assert response.status_code == 503
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_request_fails_fast_while_the_circuit_is_open(
+        client, httpx_mock):
+    httpx_mock.add_callback(refuse_connection)
+    for _ in range(2):
+        with pytest.raises(ServiceUnavailableError):
+            await client.request("service", "POST", URL)
+    assert len(httpx_mock.get_requests()) == 6
+    with pytest.raises(CircuitOpenError):
+        await client.request("service", "POST", URL)
+    assert len(httpx_mock.get_requests()) == 6
+    assert client.get_stats()["service.test"]["errors"] == 6
+
+
+@pytest.mark.asyncio
+async def test_request_retries_the_half_open_trial(client, httpx_mock):
+    clock = FakeClock()
+    breaker = client.get_breaker("service")
+    breaker.clock = clock
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 30
+    httpx_mock.add_callback(refuse_connection)
+    with pytest.raises(ServiceUnavailableError):
+        await client.request("service", "GET", URL)
+    assert len(httpx_mock.get_requests()) == 3
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        await client.request("service", "GET", URL)
+
+
+@pytest.mark.asyncio
+async def test_request_closes_the_circuit_after_a_retried_trial(
+        client, httpx_mock):
+    clock = FakeClock()
+    breaker = client.get_breaker("service")
+    breaker.clock = clock
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now = 30
+    httpx_mock.add_response(url=URL, status_code=503)
+    httpx_mock.add_response(url=URL, json={"ok": True})
+    response = await client.request("service", "GET", URL)
+    assert response.json() == {"ok": True}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_the_clients_of_every_loop(client, httpx_mock):
+    httpx_mock.add_response(url=URL, json={"ok": True})
+    httpx_mock.add_response(url=URL, json={"ok": True})
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    try:
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            client.request("service", "GET", URL), other_loop))
+        await client.request("service", "GET", URL)
+        clients = list(client._async_clients.values())
+        assert len(clients) == 2
+        await client.aclose()
+        assert all(async_client.is_closed for async_client in clients)
+        assert not client._async_clients
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+
+@pytest.mark.asyncio
+async def test_request_serves_stale_responses(client, httpx_mock):
+    httpx_mock.add_response(url=f"{URL}?day=1", json={"day": 1})
+    httpx_mock.add_callback(refuse_connection)
+    response = await client.request("service", "GET", URL, params={"day": 1})
+    assert response.json() == {"day": 1}
+    stale = await client.request("service", "GET", URL, params={"day": 1})
+    assert stale.json() == {"day": 1}
+    with pytest.raises(ServiceUnavailableError):
+        await client.request("service", "GET", URL, params={"day": 2})
+
+
+def test_request_sync_retries_and_serves_stale_responses(
+        client, requests_mock):
+    requests_mock.get(URL, [
+        {"status_code": 503}, {"json": {"ok": True}}, {"status_code": 500},
+    ])
+    assert client.request_sync("service", "GET", URL).json() == {"ok": True}
+    assert client.request_sync("service", "GET", URL).json() == {"ok": True}
+    assert requests_mock.call_count == 3
+    assert client.get_stats()["service.test"]["errors"] == 2
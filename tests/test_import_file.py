@@ -1,7 +1,9 @@
 from datetime import datetime
+import time
 
 import pytest
 
+from app.database.models import Event, UserEvent
 from app.internal import import_file
 
 FILE_TXT_SAMPLE = r"tests/files_for_import_file_tests/sample_calendar_data.txt"
@@ -245,14 +247,22 @@ def test_is_event_text_valid(text, expected):
     assert import_file._is_event_text_valid(text) == expected
 
 
+def get_valid_events(path):
+    events = import_file._get_valid_events(path, import_file.ImportStats())
+    try:
+        return list(events)
+    except import_file.InvalidImportDataError:
+        return []
+
+
 @pytest.mark.parametrize("test_file, expected", IMPORT_TXT_FILE_TESTS)
-def test_get_data_from_txt_file(test_file, expected):
-    assert import_file._get_data_from_txt_file(test_file) == expected
+def test_get_valid_events_from_txt_file(test_file, expected):
+    assert get_valid_events(test_file) == expected
 
 
 @pytest.mark.parametrize("test_file, expected", IMPORT_ICS_FILE_TESTS)
-def test_get_data_from_ics_file(test_file, expected):
-    assert import_file._get_data_from_ics_file(test_file) == expected
+def test_get_valid_events_from_ics_file(test_file, expected):
+    assert get_valid_events(test_file) == expected
 
 
 @pytest.mark.parametrize(
@@ -273,3 +283,191 @@ def test_is_file_valid_to_import(test_file, expected):
 @pytest.mark.parametrize("test_file, user_id, expected", IMPORT_EVENTS_TESTS)
 def test_import_events(test_file, user_id, expected, session):
     assert import_file.import_events(test_file, user_id, session) == expected
+
+
+def get_user_events(session, user_id):
+    return (
+        session.query(Event).join(UserEvent)
+        .filter(UserEvent.user_id == user_id)
+        .order_by(Event.start).all()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 500])
+def test_save_events_to_database_in_chunks(session, user, chunk_size):
+    stats = import_file.ImportStats()
+    import_file._save_events_to_database(
+        iter(IMPORT_TXT_FILE_RESULT_DATA), user.id, session, stats,
+        chunk_size,
+    )
+    events = get_user_events(session, user.id)
+    assert [event.title for event in events] == ['Head2', 'Head1', 'Head3']
+    assert all(event.owner_id == user.id for event in events)
+    assert stats.saved_events == len(IMPORT_TXT_FILE_RESULT_DATA)
+
+
+def test_save_events_to_database_links_only_its_events(session, user):
+    other_event = Event(
+        title='other', start=datetime(2021, 1, 1), end=datetime(2021, 1, 1),
+        owner_id=user.id,
+    )
+    session.add(other_event)
+    session.flush()
+    session.query(UserEvent).delete()
+    import_file._save_events_to_database(
+        iter(IMPORT_TXT_FILE_RESULT_DATA), user.id, session,
+        import_file.ImportStats(),
+    )
+    events = get_user_events(session, user.id)
+    assert other_event not in events
+    assert len(events) == len(IMPORT_TXT_FILE_RESULT_DATA)
+    assert len({event.import_batch_id for event in events}) == 1
+
+
+def test_import_events_reports_stages(session, user):
+    stats = import_file.ImportStats()
+    assert import_file.import_events(FILE_ICS, user.id, session, stats)
+    assert len(get_user_events(session, user.id)) == 2
+    for stage in import_file.IMPORT_STAGES:
+        assert stats[stage].items == 2
+    assert "parse: 2 in" in str(stats)
+
+
+def test_failed_import_saves_nothing(session, user):
+    assert not import_file.import_events(FILE_TXT_MIX_DATE, user.id, session)
+    assert get_user_events(session, user.id) == []
+
+
+def test_get_event_components_from_ics_file_streams(tmp_path):
+    ics_file = tmp_path / "stream.ics"
+    ics_file.write_text(open(FILE_ICS).read().replace(
+        "END:VCALENDAR", "BEGIN:VEVENT\nEND:VCALENDAR"))
+    components = import_file._get_event_components_from_ics_file(
+        str(ics_file))
+    assert str(next(components).get('summary')) == 'HeadA'
+    assert str(next(components).get('summary')) == 'HeadB'
+    with pytest.raises(import_file.InvalidImportDataError):
+        next(components)
+
+
+def test_check_same_date_events():
+    same_date_events = import_file._check_same_date_events(2)
+    next(same_date_events)
+    for event in IMPORT_TXT_FILE_RESULT_DATA * 2:
+        assert same_date_events.send(event["S_Date"])
+    assert not same_date_events.send(datetime(2019, 5, 21))
+
+
+def test_import_events_reports_rejected_rows(session, user):
+    stats = import_file.ImportStats()
+    assert not import_file.import_events(
+        FILE_TXT_INVALID, user.id, session, stats)
+    assert stats.rejected == [(2, "Invalid event text")]
+    assert stats.parsed_events == 3
+    assert get_user_events(session, user.id) == []
+
+
+def test_cancelled_import_saves_nothing(session, user):
+    stats = import_file.ImportStats()
+    stats.cancel()
+    assert not import_file.import_events(FILE_ICS, user.id, session, stats)
+    assert get_user_events(session, user.id) == []
+
+
+CSV_WITH_HEADER = """Subject,Start Date,Start Time,End Date,End Time,Location
+Team meeting,05/21/2019,10:30 AM,05/21/2019,11:00 AM,"Tel Aviv, Israel"
+
+Lunch,05/22/2019,12:00 PM,05/22/2019,01:00 PM,
+"""
+BENCHMARK_ROWS = 20000
+
+
+def test_csv_file_with_header(tmp_path):
+    csv_file = tmp_path / "google.csv"
+    csv_file.write_text(CSV_WITH_HEADER)
+    reader = import_file.CsvEventReader(str(csv_file))
+    events = [reader.get_event_data(row) for row in reader]
+    assert events == [
+        {
+            'Head': 'Team meeting',
+            'Content': '',
+            'S_Date': datetime(2019, 5, 21, 10, 30),
+            'E_Date': datetime(2019, 5, 21, 11),
+            'Location': 'Tel Aviv, Israel',
+        },
+        {
+            'Head': 'Lunch',
+            'Content': '',
+            'S_Date': datetime(2019, 5, 22, 12),
+            'E_Date': datetime(2019, 5, 22, 13),
+            'Location': '',
+        },
+    ]
+    assert reader.date_formats[0] == "%m/%d/%Y %I:%M %p"
+
+
+def test_csv_file_with_columns(tmp_path):
+    csv_file = tmp_path / "columns.csv"
+    csv_file.write_text("2019-05-21;2019-05-22;Head1;ignored\n")
+    reader = import_file.CsvEventReader(
+        str(csv_file), ["start", "end", "title", ""])
+    [event] = [reader.get_event_data(row) for row in reader]
+    assert event["Head"] == "Head1"
+    assert event["S_Date"] == datetime(2019, 5, 21)
+    assert event["E_Date"] == datetime(2019, 5, 22)
+
+
+def test_csv_file_with_missing_columns():
+    with pytest.raises(import_file.InvalidImportDataError):
+        import_file.CsvEventReader(FILE_CSV_SAMPLE, ["title", "content"])
+
+
+@pytest.mark.parametrize("row", [
+    ["", "Content", "05-21-2019", "05-21-2019"],
+    ["Head", "Content", "05-21-2019", "05-20-2019"],
+    ["Head", "Content", "21.05.2019", "21.05.2019"],
+    ["Head", "Content", "05-21-2019"],
+])
+def test_csv_row_not_valid(row):
+    reader = import_file.CsvEventReader(FILE_CSV_SAMPLE)
+    with pytest.raises(import_file.InvalidImportDataError):
+        reader.get_event_data(row)
+
+
+def test_import_csv_events(session, user):
+    stats = import_file.ImportStats()
+    assert import_file.import_events(FILE_CSV_SAMPLE, user.id, session, stats)
+    events = get_user_events(session, user.id)
+    assert [event.title for event in events] == ['Head2', 'Head1', 'Head3']
+    assert stats.parsed_events == 3
+
+
+def test_benchmark_csv_parse(tmp_path):
+    rows = "".join(
+        f"Head{i}, Content{i}, 05-21-2019 10:{i % 60:02}, "
+        f"05-21-2019 11:{i % 60:02}, Tel-Aviv\n"
+        for i in range(BENCHMARK_ROWS)
+    )
+    txt_file = tmp_path / "benchmark.txt"
+    txt_file.write_text(rows)
+    csv_file = tmp_path / "benchmark.csv"
+    csv_file.write_text(rows)
+
+    def parse(path):
+        start = time.perf_counter()
+        reader = (
+            import_file.CsvEventReader(path) if path.endswith(".csv")
+            else import_file._get_event_from_txt_file(path)
+        )
+        get_event_data = getattr(
+            reader, "get_event_data",
+            import_file._get_valid_event_data_from_text,
+        )
+        events = [get_event_data(record) for record in reader]
+        return events, time.perf_counter() - start
+
+    txt_events, txt_time = parse(str(txt_file))
+    csv_events, csv_time = parse(str(csv_file))
+    print(f"\n{BENCHMARK_ROWS} rows: txt {txt_time:.3f}s, "
+          f"csv {csv_time:.3f}s")
+    assert csv_events == txt_events
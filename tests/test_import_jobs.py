@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+import shutil
+import threading
+import uuid
+
+import pytest
+
+from app.database.models import Event, ImportJobProgress
+from app.internal import import_jobs
+from app.internal.import_file import ImportCancelledError
+from tests.client_fixture import log_in_as
+from tests.conftest import get_test_db
+
+FILE_ICS = "tests/files_for_import_file_tests/sample.ics"
+FILE_TXT_INVALID = "tests/files_for_import_file_tests/sample_data_invalid.txt"
+WAIT_SECONDS = 10
+
+
+@pytest.fixture
+def manager():
+    manager = import_jobs.ImportJobManager(max_workers=2, max_user_jobs=1)
+    yield manager
+    manager._executor.shutdown()
+
+
+def upload(client, path):
+    with open(path, "rb") as file:
+        return client.post("/import/", files={"file": (path, file)})
+
+
+def test_upload_returns_job_with_progress(logged_in_client, session, user):
+    response = upload(logged_in_client, FILE_ICS)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    import_jobs.jobs.get(job_id).wait(WAIT_SECONDS)
+
+    progress = logged_in_client.get(response.json()["url"]).json()
+    assert progress["status"] == import_jobs.DONE
+    assert progress["rows_parsed"] == 2
+    assert progress["rows_inserted"] == 2
+    assert progress["rejected"] == []
+    assert progress["elapsed"] >= 0
+    assert session.query(Event).count() == 2
+
+
+def test_upload_reports_rejected_rows(logged_in_client, session, user):
+    response = upload(logged_in_client, FILE_TXT_INVALID)
+    job = import_jobs.jobs.get(response.json()["job_id"])
+    job.wait(WAIT_SECONDS)
+
+    progress = logged_in_client.get(f"/import/jobs/{job.id}").json()
+    assert progress["status"] == import_jobs.FAILED
+    assert progress["rows_inserted"] == 0
+    assert progress["rejected"] == [{"row": 2, "reason": "Invalid event text"}]
+    assert session.query(Event).count() == 0
+
+
+def test_unknown_job(logged_in_client):
+    assert logged_in_client.get("/import/jobs/nope").status_code == 404
+    assert logged_in_client.delete("/import/jobs/nope").status_code == 404
+
+
+def test_other_users_job_is_not_found(logged_in_client, user, sender):
+    response = upload(logged_in_client, FILE_ICS)
+    job = import_jobs.jobs.get(response.json()["job_id"])
+    job.wait(WAIT_SECONDS)
+    log_in_as(sender)
+    assert logged_in_client.get(f"/import/jobs/{job.id}").status_code == 404
+    assert logged_in_client.delete(f"/import/jobs/{job.id}").status_code == 404
+
+
+def test_job_of_another_worker(logged_in_client, session, user):
+    response = upload(logged_in_client, FILE_ICS)
+    job_id = response.json()["job_id"]
+    import_jobs.jobs.get(job_id).wait(WAIT_SECONDS)
+    del import_jobs.jobs._jobs[job_id]
+
+    progress = logged_in_client.get(f"/import/jobs/{job_id}").json()
+    assert progress["status"] == import_jobs.DONE
+    assert progress["rows_inserted"] == 2
+    assert logged_in_client.delete(f"/import/jobs/{job_id}").status_code == 409
+
+
+def test_finished_job_cannot_be_cancelled(logged_in_client, session, user):
+    response = upload(logged_in_client, FILE_ICS)
+    job = import_jobs.jobs.get(response.json()["job_id"])
+    job.wait(WAIT_SECONDS)
+    assert logged_in_client.delete(f"/import/jobs/{job.id}").status_code == 409
+
+
+def test_user_imports_are_limited(manager):
+    release = threading.Event()
+
+    def run(job):
+        return release.wait(WAIT_SECONDS)
+
+    job = manager.submit(1, run)
+    with pytest.raises(import_jobs.TooManyImportsError):
+        manager.submit(1, run)
+    other_user_job = manager.submit(2, run)
+    release.set()
+    job.wait(WAIT_SECONDS)
+    other_user_job.wait(WAIT_SECONDS)
+    assert job.status == import_jobs.DONE
+    manager.submit(1, run).wait(WAIT_SECONDS)
+
+
+def test_cancel_job(manager, session, user, tmp_path):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(job, path, session_factory):
+        started.set()
+        release.wait(WAIT_SECONDS)
+        return import_jobs.run_events_import(job, path, session_factory)
+
+    path = shutil.copy(FILE_ICS, tmp_path)
+    job = manager.submit(user.id, run, path, get_test_db)
+    started.wait(WAIT_SECONDS)
+    assert job.cancel()
+    release.set()
+    job.wait(WAIT_SECONDS)
+    assert job.status == import_jobs.CANCELLED
+    assert not job.cancel()
+    assert session.query(Event).count() == 0
+
+
+def test_cancel_job_of_another_worker(manager, session, user, monkeypatch):
+    monkeypatch.setattr(import_jobs, "CANCEL_POLL_SECONDS", 0)
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def run(job):
+        started.set()
+        cancelled.wait(WAIT_SECONDS)
+        try:
+            job.stats.check_cancelled()
+        except ImportCancelledError:
+            return False
+        return True
+
+    job = manager.submit(user.id, run, session_factory=get_test_db)
+    started.wait(WAIT_SECONDS)
+    other_worker = import_jobs.ImportJobManager()
+    assert other_worker.cancel(session, job.id, user.id)
+    cancelled.set()
+    job.wait(WAIT_SECONDS)
+    assert job.status == import_jobs.CANCELLED
+    session.expire_all()
+    record = session.query(ImportJobProgress).get(job.id)
+    assert record.status == import_jobs.CANCELLED
+    other_worker._executor.shutdown()
+
+
+def test_failing_job(manager):
+    def run(job):
+        raise ValueError("broken")
+
+    job = manager.submit(1, run)
+    job.wait(WAIT_SECONDS)
+    assert job.to_dict()["status"] == import_jobs.FAILED
+    assert job.error == "broken"
+
+
+def test_finished_jobs_are_forgotten():
+    manager = import_jobs.ImportJobManager(max_finished_jobs=1)
+    first = manager.submit(1, lambda job: True)
+    first.wait(WAIT_SECONDS)
+    second = manager.submit(1, lambda job: True)
+    second.wait(WAIT_SECONDS)
+    manager.submit(1, lambda job: True).wait(WAIT_SECONDS)
+    assert manager.get(first.id) is None
+    assert manager.get(second.id) is second
+    manager._executor.shutdown()
+
+
+def test_user_imports_are_limited_across_workers(manager, session, user):
+    release = threading.Event()
+
+    def run(job):
+        return release.wait(WAIT_SECONDS)
+
+    job = manager.submit(user.id, run, session_factory=get_test_db)
+    other_worker = import_jobs.ImportJobManager(max_user_jobs=1)
+    with pytest.raises(import_jobs.TooManyImportsError):
+        other_worker.submit(user.id, run, session_factory=get_test_db)
+    release.set()
+    job.wait(WAIT_SECONDS)
+    other_worker.submit(
+        user.id, run, session_factory=get_test_db).wait(WAIT_SECONDS)
+    other_worker._executor.shutdown()
+
+
+def add_job_progress(session, user, status, age):
+    record = ImportJobProgress(
+        id=uuid.uuid4().hex, user_id=user.id, status=status,
+        progress={"status": status, "rows_inserted": 1, "error": None},
+        updated_at=datetime.utcnow() - age,
+    )
+    session.add(record)
+    session.commit()
+    return record.id
+
+
+def test_clean_up_stored_jobs(session, user):
+    old_job = add_job_progress(
+        session, user, import_jobs.DONE, timedelta(days=2))
+    recent_job = add_job_progress(
+        session, user, import_jobs.DONE, timedelta(hours=1))
+    stale_job = add_job_progress(
+        session, user, import_jobs.RUNNING, timedelta(hours=2))
+    running_job = add_job_progress(
+        session, user, import_jobs.RUNNING, timedelta(minutes=1))
+
+    assert import_jobs.clean_up_stored_jobs(session) == 2
+    session.expire_all()
+    assert session.query(ImportJobProgress).get(old_job) is None
+    assert session.query(ImportJobProgress).get(recent_job) is not None
+    stale = session.query(ImportJobProgress).get(stale_job)
+    assert stale.status == import_jobs.FAILED
+    assert stale.progress["status"] == import_jobs.FAILED
+    assert stale.progress["rows_inserted"] == 0
+    running = session.query(ImportJobProgress).get(running_job)
+    assert running.status == import_jobs.RUNNING
+    assert import_jobs.clean_up_stored_jobs(session) == 0
+
+
+def test_stale_job_does_not_count_against_the_user(manager, session, user):
+    add_job_progress(session, user, import_jobs.RUNNING, timedelta(hours=2))
+    manager.submit(
+        user.id, lambda job: True,
+        session_factory=get_test_db).wait(WAIT_SECONDS)
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from app.internal import import_profile
+from app.internal.import_profile import (
+    get_package_times, get_report, ImportProfileError, ImportTime,
+    parse_import_times, profile_imports,
+)
+
+IMPORT_TIME_LINES = [
+    "import time: self [us] | cumulative | imported package",
+    "import time:       120 |        120 |   encodings.aliases",
+    "import time:       300 |        420 | encodings",
+    "import time:        50 |         50 |     app.config",
+    "import time:        70 |        120 |   app.database",
+    "import time:        10 |        130 | app",
+    "some warning printed while importing",
+]
+
+
+def test_parse_import_times():
+    times = parse_import_times(IMPORT_TIME_LINES)
+    assert times[0] == ImportTime(
+        name="encodings.aliases", self_us=120, cumulative_us=120, depth=1)
+    assert times[-1] == ImportTime(
+        name="app", self_us=10, cumulative_us=130, depth=0)
+    assert [import_time.depth for import_time in times] == [1, 0, 2, 1, 0]
+
+
+def test_get_package_times():
+    times = parse_import_times(IMPORT_TIME_LINES)
+    assert get_package_times(times) == {"encodings": 420, "app": 130}
+
+
+def test_get_report():
+    report = get_report(parse_import_times(IMPORT_TIME_LINES), limit=2)
+    assert report.startswith("Imported 5 modules in 0.6 ms")
+    modules = report.split("\n\n")[1].splitlines()
+    assert modules[1].split() == ["0.4", "0.3", "encodings"]
+    assert modules[2].split() == ["0.1", "0.0", "app"]
+    assert len(modules) == 3
+
+
+def test_profile_imports_loads_nlp_lazily():
+    names = {
+        import_time.name
+        for import_time in profile_imports("app.internal.translation")
+    }
+    assert "app.internal.translation" in names
+    assert "textblob" not in names
+    assert "nltk" not in names
+
+
+def test_profile_imports_of_missing_module():
+    with pytest.raises(ImportProfileError):
+        profile_imports("app.no_such_module")
+
+
+def test_main_prints_json(monkeypatch, capsys):
+    monkeypatch.setattr(
+        import_profile, "profile_imports",
+        lambda module: parse_import_times(IMPORT_TIME_LINES))
+    import_profile.main(["--json"])
+    times = json.loads(capsys.readouterr().out)
+    assert times[1] == {
+        "name": "encodings", "self_us": 300, "cumulative_us": 420,
+        "depth": 0,
+    }
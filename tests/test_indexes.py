@@ -0,0 +1,41 @@
+import pytest
+
+from app.config import PSQL_ENVIRONMENT
+from app.database.models import create_missing_indexes
+from tests.conftest import test_engine
+
+HOT_PATH_QUERIES = [
+    (
+        "SELECT events.* FROM events JOIN user_event "
+        "ON events.id = user_event.event_id WHERE user_event.user_id = 1",
+        "ix_user_event_user_id_event_id",
+    ),
+    (
+        "SELECT * FROM events WHERE owner_id = 1 "
+        "AND start >= '2021-01-01' ORDER BY start",
+        "ix_events_owner_id_start",
+    ),
+    (
+        "SELECT * FROM comments WHERE event_id = 1 ORDER BY time DESC",
+        "ix_comments_event_id_time",
+    ),
+    (
+        "SELECT * FROM invitations WHERE recipient_id = 1",
+        "ix_invitations_recipient_id",
+    ),
+]
+
+
+@pytest.mark.skipif(PSQL_ENVIRONMENT, reason="SQLite query plan syntax")
+@pytest.mark.parametrize("query, index_name", HOT_PATH_QUERIES)
+def test_hot_path_query_uses_index(session, query, index_name):
+    plan = session.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+    assert index_name in " ".join(row[-1] for row in plan)
+
+
+def test_create_missing_indexes_is_idempotent(session):
+    assert create_missing_indexes(test_engine) == []
+    session.execute("DROP INDEX ix_events_owner_id_start")
+    session.commit()
+    assert create_missing_indexes(test_engine) == ["ix_events_owner_id_start"]
+    assert create_missing_indexes(test_engine) == []
@@ -1,14 +1,15 @@
-from app.database.models import WikipediaEvents
-from app.internal.on_this_day_events import (get_on_this_day_events,
-                                             insert_on_this_day_data)
+import asyncio
+from datetime import date, timedelta
 
+import pytest
 
-def test_insert_on_this_day_data(session):
-    is_exists_data = session.query(WikipediaEvents).all()
-    assert not is_exists_data
-    insert_on_this_day_data(session)
-    is_exists_data = session.query(WikipediaEvents).all()
-    assert is_exists_data is not None
+from app.database import get_session_factory
+from app.database.models import WikipediaEvents
+from app.internal import on_this_day_events
+from app.internal.on_this_day_events import (
+    cancel_prefetches, get_on_this_day_events, prefetch_on_this_day,
+    prune_on_this_day_data, run_prefetch_job, store_on_this_day_data,
+)
 
 
 def test_get_on_this_day_events(session):
@@ -27,3 +28,111 @@ def test_get_on_this_day_events_exists(session):
     assert fake_data.events[0] == 'fake'
     assert fake_data.wikipedia == 'www.fake.com'
     assert fake_data.date_ == 'not a date string'
+
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    calls = []
+    sleep = asyncio.sleep
+
+    async def fetch(day):
+        calls.append(day)
+        await sleep(0.01)
+        return {'events': [f'event of {day}'], 'date': day.strftime('%B %d'),
+                'wikipedia': f'https://wikipedia.org/{day}'}
+
+    monkeypatch.setattr(on_this_day_events, 'fetch_on_this_day_data', fetch)
+    return calls
+
+
+def test_store_on_this_day_data_once_per_date(session):
+    today = date.today()
+    store_on_this_day_data(session, today, {'events': ['first'],
+                                            'date': 'x', 'wikipedia': 'y'})
+    stored = store_on_this_day_data(session, today, {'events': ['second'],
+                                                     'date': 'x',
+                                                     'wikipedia': 'y'})
+    assert stored.events == ['first']
+    assert session.query(WikipediaEvents).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_on_this_day_fetches_once(fake_service, session):
+    tomorrow = date.today() + timedelta(days=1)
+    factory = get_session_factory(session)
+    await asyncio.gather(*(
+        prefetch_on_this_day(tomorrow, factory) for _ in range(3)
+    ))
+    await prefetch_on_this_day(tomorrow, factory)
+    assert fake_service == [tomorrow]
+    stored = session.query(WikipediaEvents).one()
+    assert stored.day == tomorrow
+    assert stored.events == [f'event of {tomorrow}']
+
+
+@pytest.mark.asyncio
+async def test_get_on_this_day_events_does_not_wait(fake_service, session):
+    data = get_on_this_day_events(session)
+    assert data == {'events': [], 'wikipedia': 'https://en.wikipedia.org/'}
+    assert fake_service == []
+    await asyncio.sleep(0.05)
+    assert fake_service == [date.today()]
+    data = get_on_this_day_events(session)
+    assert data.events == [f'event of {date.today()}']
+
+
+def test_prune_on_this_day_data(session):
+    today = date.today()
+    for days_ago in (0, 7, 8, 30):
+        session.add(WikipediaEvents(
+            events=[], wikipedia='w', date_='d',
+            day=today - timedelta(days=days_ago)))
+    session.commit()
+    assert prune_on_this_day_data(session, keep_days=7) == 2
+    days = sorted(row.day for row in session.query(WikipediaEvents))
+    assert days == [today - timedelta(days=7), today]
+
+
+@pytest.mark.asyncio
+async def test_run_prefetch_job(fake_service, session, monkeypatch):
+    async def stop(delay):
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(on_this_day_events.asyncio, 'sleep', stop)
+    with pytest.raises(asyncio.CancelledError):
+        await run_prefetch_job(get_session_factory(session))
+    today = date.today()
+    assert fake_service == [today, today + timedelta(days=1)]
+    assert session.query(WikipediaEvents).count() == 2
+
+
+@pytest.mark.asyncio
+async def test_cancel_prefetches(fake_service, session):
+    tomorrow = date.today() + timedelta(days=1)
+    prefetch = asyncio.ensure_future(
+        prefetch_on_this_day(tomorrow, get_session_factory(session)))
+    await asyncio.sleep(0)
+    await cancel_prefetches()
+    assert on_this_day_events._get_loop_fetches() == {}
+    with pytest.raises(asyncio.CancelledError):
+        await prefetch
+    assert session.query(WikipediaEvents).count() == 0
+
+
+def test_prefetches_are_kept_per_loop(fake_service, session):
+    tomorrow = date.today() + timedelta(days=1)
+    factory = get_session_factory(session)
+    loop = asyncio.new_event_loop()
+    try:
+        # A fetch left in flight when its loop stops.
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.create_task(prefetch_on_this_day(tomorrow, factory))
+        loop.run_until_complete(asyncio.sleep(0))
+    finally:
+        loop.close()
+    other_loop = asyncio.new_event_loop()
+    try:
+        other_loop.run_until_complete(prefetch_on_this_day(tomorrow, factory))
+    finally:
+        other_loop.close()
+    assert session.query(WikipediaEvents).one().day == tomorrow
@@ -0,0 +1,44 @@
+import pytest
+
+from app.internal import preload
+
+
+def test_preload_runs_the_features_loaders(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(preload, "PRELOADERS", {
+        "emotion": lambda: loaded.append("emotion"),
+        "flairs": lambda: loaded.append("flairs"),
+    })
+    preload.preload(["flairs"])
+    assert loaded == ["flairs"]
+
+
+def test_preload_nothing_by_default(monkeypatch):
+    monkeypatch.setattr(preload, "PRELOADERS", {})
+    preload.preload(())
+
+
+def test_preload_unknown_feature():
+    with pytest.raises(ValueError):
+        preload.preload(["emotion", "telepathy"])
+
+
+def test_preload_emotion():
+    preload.preload(["emotion"])
+    from app.internal.emotion import get_lexicon
+    assert get_lexicon()._lemmatizer is not None
+
+
+def test_ensure_nltk_data_downloads_missing_packages(monkeypatch):
+    import nltk
+
+    downloaded = []
+
+    def find(resource):
+        raise LookupError(resource)
+
+    monkeypatch.setattr(nltk.data, "find", find)
+    monkeypatch.setattr(
+        nltk, "download", lambda name, quiet: downloaded.append(name))
+    preload.ensure_nltk_data("stopwords", "wordnet")
+    assert downloaded == ["stopwords", "wordnet"]
@@ -0,0 +1,69 @@
+from datetime import date
+
+from app.internal import render_cache
+from app.internal.render_cache import RenderCache
+
+KEY = ("user", date(2021, 2, 1), 42)
+
+
+class Renderer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"fragment {self.calls}"
+
+
+class FakeDate(date):
+    today_date = date(2021, 2, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.today_date
+
+
+def test_renders_once_per_version():
+    cache = RenderCache()
+    render = Renderer()
+    assert cache.get_or_render(KEY, "v1", render) == "fragment 1"
+    assert cache.get_or_render(KEY, "v1", render) == "fragment 1"
+    assert cache.get_or_render(KEY, "v2", render) == "fragment 2"
+    assert render.calls == 2
+    assert len(cache) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = RenderCache(maxsize=2)
+    render = Renderer()
+    cache.get_or_render("first", "v", render)
+    cache.get_or_render("second", "v", render)
+    cache.get_or_render("first", "v", render)
+    cache.get_or_render("third", "v", render)
+    assert len(cache) == 2
+    cache.get_or_render("first", "v", render)
+    assert render.calls == 3
+    cache.get_or_render("second", "v", render)
+    assert render.calls == 4
+
+
+def test_clears_on_day_rollover(monkeypatch):
+    monkeypatch.setattr(render_cache, "date", FakeDate)
+    cache = RenderCache()
+    render = Renderer()
+    cache.get_or_render(KEY, "v", render)
+    etag = cache.etag(KEY, "v")
+    monkeypatch.setattr(FakeDate, "today_date", date(2021, 2, 2))
+    assert cache.etag(KEY, "v") != etag
+    assert len(cache) == 0
+    cache.get_or_render(KEY, "v", render)
+    assert render.calls == 2
+
+
+def test_etag_depends_on_key_and_version():
+    cache = RenderCache()
+    etag = cache.etag(KEY, "v1")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == cache.etag(KEY, "v1")
+    assert etag != cache.etag(KEY, "v2")
+    assert etag != cache.etag(("other", KEY[1], KEY[2]), "v1")
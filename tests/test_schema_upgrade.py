@@ -0,0 +1,149 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import (
+    add_missing_columns, Base, Event, OAuthCredentials,
+    upgrade_oauth_credentials, upgrade_wikipedia_events, WikipediaEvents,
+)
+from app.main import create_tables
+
+# The events table as created before the flair column was added.
+OLD_EVENTS_TABLE = """
+CREATE TABLE events (
+    id INTEGER NOT NULL,
+    title VARCHAR NOT NULL,
+    start DATETIME NOT NULL,
+    "end" DATETIME NOT NULL,
+    content VARCHAR,
+    location VARCHAR,
+    is_google_event BOOLEAN,
+    vc_link VARCHAR,
+    color VARCHAR,
+    all_day BOOLEAN,
+    invitees VARCHAR,
+    emotion VARCHAR,
+    availability BOOLEAN NOT NULL,
+    owner_id INTEGER,
+    category_id INTEGER,
+    PRIMARY KEY (id)
+)
+"""
+# The wikipedia_events table as created before the day column was added.
+OLD_WIKIPEDIA_EVENTS_TABLE = """
+CREATE TABLE wikipedia_events (
+    id INTEGER NOT NULL,
+    date_ VARCHAR NOT NULL,
+    wikipedia VARCHAR NOT NULL,
+    events JSON,
+    date_inserted DATETIME,
+    PRIMARY KEY (id)
+)
+"""
+OLD_WIKIPEDIA_EVENTS = [
+    (1, "2021-01-04 08:00:00"),
+    (2, "2021-01-04 09:00:00"),
+    (3, "2021-01-05 08:00:00"),
+]
+# The oauth_credentials table as created before user_id was made unique,
+# when a row was added on every token refresh.
+OLD_OAUTH_CREDENTIALS_TABLE = """
+CREATE TABLE oauth_credentials (
+    id INTEGER NOT NULL,
+    token VARCHAR,
+    refresh_token VARCHAR,
+    token_uri VARCHAR,
+    client_id VARCHAR,
+    client_secret VARCHAR,
+    expiry DATETIME,
+    user_id INTEGER,
+    PRIMARY KEY (id)
+)
+"""
+OLD_OAUTH_CREDENTIALS = [
+    (1, "old", 1),
+    (2, "new", 1),
+    (3, "only", 2),
+]
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.execute(OLD_EVENTS_TABLE)
+        connection.execute(
+            "INSERT INTO events (id, title, start, \"end\", availability) "
+            "VALUES (1, 'Old', '2021-01-01 10:00:00', "
+            "'2021-01-01 11:00:00', 1)")
+        connection.execute(OLD_WIKIPEDIA_EVENTS_TABLE)
+        for row_id, date_inserted in OLD_WIKIPEDIA_EVENTS:
+            connection.execute(
+                "INSERT INTO wikipedia_events "
+                "(id, date_, wikipedia, events, date_inserted) "
+                "VALUES (?, 'January', 'https://en.wikipedia.org/', '[]', ?)",
+                (row_id, date_inserted))
+        connection.execute(OLD_OAUTH_CREDENTIALS_TABLE)
+        connection.execute(
+            "CREATE INDEX ix_oauth_credentials_user_id "
+            "ON oauth_credentials (user_id)")
+        for row_id, token, user_id in OLD_OAUTH_CREDENTIALS:
+            connection.execute(
+                "INSERT INTO oauth_credentials (id, token, user_id) "
+                "VALUES (?, ?, ?)",
+                (row_id, token, user_id))
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+def test_create_tables_adds_missing_columns(old_engine):
+    create_tables(old_engine, False)
+    session = sessionmaker(bind=old_engine)()
+    event = session.query(Event).one()
+    assert event.title == "Old"
+    assert event.flair is None
+    session.close()
+
+
+def test_add_missing_columns_is_idempotent(old_engine):
+    assert "events.flair" in add_missing_columns(old_engine)
+    assert add_missing_columns(old_engine) == []
+
+
+def test_create_tables_upgrades_wikipedia_events(old_engine):
+    create_tables(old_engine, False)
+    session = sessionmaker(bind=old_engine)()
+    rows = session.query(WikipediaEvents).order_by(WikipediaEvents.id).all()
+    assert [(row.id, row.day) for row in rows] == [
+        (2, date(2021, 1, 4)), (3, date(2021, 1, 5))]
+    indexes = inspect(old_engine).get_indexes("wikipedia_events")
+    assert {"name": "ix_wikipedia_events_day", "column_names": ["day"],
+            "unique": 1} in indexes
+    session.add(WikipediaEvents(
+        date_="January", wikipedia="", day=date(2021, 1, 4)))
+    with pytest.raises(IntegrityError):
+        session.commit()
+    session.rollback()
+    session.close()
+    assert upgrade_wikipedia_events(old_engine) == 0
+
+
+def test_create_tables_upgrades_oauth_credentials(old_engine):
+    create_tables(old_engine, False)
+    session = sessionmaker(bind=old_engine)()
+    rows = session.query(OAuthCredentials).order_by(OAuthCredentials.id)
+    assert [(row.token, row.user_id) for row in rows] == [
+        ("new", 1), ("only", 2)]
+    indexes = inspect(old_engine).get_indexes("oauth_credentials")
+    assert {"name": "ix_oauth_credentials_user_id",
+            "column_names": ["user_id"], "unique": 1} in indexes
+    session.add(OAuthCredentials(token="another", user_id=1))
+    with pytest.raises(IntegrityError):
+        session.commit()
+    session.rollback()
+    session.close()
+    assert upgrade_oauth_credentials(old_engine) == 0
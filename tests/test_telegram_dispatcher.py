@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from app.telegram.dispatcher import (
+    batch_texts, MessageDispatcher, TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    def __init__(self, statuses=()):
+        self.sent = []
+        self.statuses = list(statuses)
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((chat_id, text))
+        status_code = self.statuses.pop(0) if self.statuses else 200
+        return SimpleNamespace(
+            status_code=status_code,
+            json=lambda: {'parameters': {'retry_after': 0}})
+
+
+def test_token_bucket_allows_bursts():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 1
+    assert bucket.reserve() == 2
+    clock.now = 10
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_is_full():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    assert bucket.is_full
+    bucket.reserve()
+    assert not bucket.is_full
+    clock.now = 1
+    assert bucket.is_full
+
+
+def test_batch_texts():
+    assert batch_texts(['a', 'b', 'c'], limit=4) == ['a\n\nb', 'c']
+    assert batch_texts(['abcdefghij'], limit=4) == ['abcd', 'efgh', 'ij']
+    assert batch_texts(['a' * 10, 'b'], limit=100) == ['a' * 10 + '\n\nb']
+
+
+@pytest.mark.asyncio
+async def test_send_does_not_wait_for_delivery():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot)
+    dispatcher.send('1', 'hello')
+    assert bot.sent == []
+    await dispatcher.join()
+    assert bot.sent == [('1', 'hello')]
+
+
+@pytest.mark.asyncio
+async def test_send_keeps_the_order_of_each_chat():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot, chat_rate=1000, chat_burst=1)
+    for i in range(5):
+        dispatcher.send('1', f'first {i}')
+        dispatcher.send('2', f'second {i}')
+    await dispatcher.join()
+    assert [text for chat, text in bot.sent if chat == '1'] == [
+        f'first {i}' for i in range(5)]
+    assert [text for chat, text in bot.sent if chat == '2'] == [
+        f'second {i}' for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_send_is_rate_limited_per_chat(monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, 'sleep', fake_sleep)
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot, chat_rate=1, chat_burst=2)
+    for i in range(4):
+        dispatcher.send('1', str(i))
+    await dispatcher.join()
+    assert len(bot.sent) == 4
+    assert len(delays) == 2
+    assert delays[0] == pytest.approx(1, abs=0.1)
+    assert delays[1] == pytest.approx(2, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_send_retries_too_many_requests():
+    bot = FakeBot(statuses=[429, 200])
+    dispatcher = MessageDispatcher(bot)
+    dispatcher.send('1', 'hello')
+    await dispatcher.join()
+    assert bot.sent == [('1', 'hello'), ('1', 'hello')]
+
+
+@pytest.mark.asyncio
+async def test_send_logs_failed_responses(caplog):
+    bot = FakeBot(statuses=[403])
+    dispatcher = MessageDispatcher(bot)
+    with caplog.at_level(logging.ERROR):
+        dispatcher.send('1', 'hello')
+        await dispatcher.join()
+    assert bot.sent == [('1', 'hello')]
+    assert 'status 403' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_idle_chat_buckets_are_dropped():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot, chat_rate=1000, chat_burst=1)
+    dispatcher.send('1', 'first')
+    await dispatcher.join()
+    await asyncio.sleep(0.01)
+    dispatcher.send('2', 'second')
+    await dispatcher.join()
+    assert '1' not in dispatcher._chat_buckets
+
+
+@pytest.mark.asyncio
+async def test_send_many_batches_messages():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot)
+    dispatcher.send_many('1', ['Today:', 'event 1', 'event 2'])
+    await dispatcher.join()
+    assert bot.sent == [('1', 'Today:\n\nevent 1\n\nevent 2')]
+
+
+@pytest.mark.asyncio
+async def test_close_drops_undelivered_messages():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot, chat_rate=0.001, chat_burst=1)
+    dispatcher.send('1', 'first')
+    dispatcher.send('1', 'second')
+    await dispatcher.close(timeout=0.1)
+    assert bot.sent == [('1', 'first')]
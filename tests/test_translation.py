@@ -3,11 +3,15 @@
 import pytest
 from textblob import TextBlob
 
+from app.database.models import Translation
+from app.internal import translation
 from app.internal.translation import (
     _detect_text_language, _get_language_code, _get_user_language,
-    translate_text, translate_text_for_user
+    translate_many, translate_text, translate_text_for_user,
+    translation_cache, TranslationCache
 )
 
+SPANISH = "Hola mi amigo, ¿cómo estás?"
 TEXT = [
     ("Привет мой друг", "english", "russian"),
     ("Hola mi amigo", "english", "spanish"),
@@ -16,6 +20,25 @@
 ]
 
 
+@pytest.fixture(autouse=True)
+def clear_translation_cache():
+    translation_cache.clear()
+    yield
+    translation_cache.clear()
+
+
+@pytest.fixture
+def remote_calls(monkeypatch):
+    calls = []
+
+    def translate(blob, from_lang=None, to="en"):
+        calls.append((str(blob), from_lang, to))
+        return TextBlob(f"{to}:{blob}")
+
+    monkeypatch.setattr(TextBlob, "translate", translate)
+    return calls
+
+
 @pytest.mark.parametrize("text, target_lang, original_lang", TEXT)
 def test_translate_text_with_original_lang(text, target_lang, original_lang):
     answer = translate_text(text, target_lang, original_lang)
@@ -135,3 +158,85 @@ def test_get_user_language_for_invalid_language(session, user):
     session.commit()
     with pytest.raises(HTTPException):
         _get_user_language(user.id, session=session)
+
+
+@pytest.mark.parametrize("text, language_code", [
+    ("Привет мой друг", "ru"),
+    ("Hola mi amigo, ¿cómo estás?", "es"),
+    ("Bonjour, mon ami", "fr"),
+    ("Hallo, mein Freund", "de"),
+    ("Ciao, amico mio", "it"),
+    ("שלום חבר", "he"),
+])
+def test_detect_text_language_offline(text, language_code):
+    assert _detect_text_language(text) == language_code
+
+
+@pytest.mark.parametrize("text", [
+    "12:30 !?", "Meeting", "Dentist", "Lunch with Dana",
+    "Doctor appointment", "会議",
+])
+def test_detect_text_language_without_confidence(text):
+    assert _detect_text_language(text) is None
+
+
+def test_translate_many(remote_calls):
+    texts = [SPANISH, "", "Hello my friend", SPANISH]
+    answer = translate_many(texts, "english")
+    assert answer == [f"en:{SPANISH}", "", "Hello my friend",
+                      f"en:{SPANISH}"]
+    assert remote_calls == [(SPANISH, "es", "en")]
+
+
+def test_translate_many_caches_in_memory(remote_calls):
+    translate_many([SPANISH, "Bonjour, mon ami"], "english")
+    answer = translate_many(["Bonjour, mon ami", SPANISH], "english")
+    assert answer == ["en:Bonjour, mon ami", f"en:{SPANISH}"]
+    assert len(remote_calls) == 2
+
+
+def test_translate_many_caches_in_database(remote_calls, session):
+    translate_many([SPANISH], "english", session=session)
+    translation_cache.clear()
+    answer = translate_many([SPANISH], "english", session=session)
+    assert answer == [f"en:{SPANISH}"]
+    assert len(remote_calls) == 1
+    stored = session.query(Translation).one()
+    assert (stored.source, stored.target) == ("es", "en")
+    assert stored.text_hash == translation.get_text_hash(SPANISH)
+
+
+def test_translate_many_caches_per_source_language(remote_calls, session):
+    translate_many(["Ciao amico"], "english", "italian", session=session)
+    translation_cache.clear()
+    translate_many(["Ciao amico"], "english", "spanish", session=session)
+    assert [call[1] for call in remote_calls] == ["it", "es"]
+
+
+def test_translate_text_for_user_uses_cache(remote_calls, session, user):
+    assert translate_text_for_user(
+        SPANISH, session, user.id) == f"en:{SPANISH}"
+    assert translate_text_for_user(
+        SPANISH, session, user.id) == f"en:{SPANISH}"
+    assert len(remote_calls) == 1
+
+
+def test_translation_cache_evicts_least_recently_used():
+    cache = TranslationCache(maxsize=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert len(cache) == 2
+
+
+def test_translate_many_lets_the_service_detect_short_texts(
+        remote_calls, session):
+    answer = translate_many(["Dentist", "12:30"], "hebrew", session=session)
+    assert answer == ["he:Dentist", "12:30"]
+    assert remote_calls == [("Dentist", "auto", "he")]
+    assert session.query(Translation).count() == 0
+    translate_many(["Dentist"], "hebrew", session=session)
+    assert len(remote_calls) == 1
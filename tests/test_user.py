@@ -1,8 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytest
 
 from app.routers.user import (
-    create_user, does_user_exist, get_users
+    create_user, does_user_exist, get_user_events_in_range,
+    get_user_events_starting_in_range, get_users,
 )
 from app.internal.user.availability import disable, enable
 from app.internal.utils import save
@@ -149,3 +150,54 @@ def test_does_user_exist_failure(self, session):
 
     def test_repr(self, user):
         assert user.__repr__() == f'<User {user.id}>'
+
+
+class TestUserEventsInRange:
+
+    def test_overlapping_events_sorted(
+            self, session, sender, today_event, today_event_2,
+            yesterday_event, next_month_event):
+        start = today_event.start.replace(hour=0)
+        end = start + timedelta(days=1)
+        events = get_user_events_in_range(session, sender.id, start, end)
+        assert events == [today_event_2, today_event]
+
+    def test_multiday_event_overlaps_later_day(
+            self, session, sender, today_event_2):
+        start = today_event_2.start.replace(hour=0) + timedelta(days=1)
+        end = start + timedelta(days=1)
+        events = get_user_events_in_range(session, sender.id, start, end)
+        assert events == [today_event_2]
+
+    def test_open_range(self, session, sender, today_event, old_event):
+        events = get_user_events_in_range(session, sender.id)
+        assert events == [old_event, today_event]
+        events = get_user_events_in_range(
+            session, sender.id, start=today_event.start)
+        assert events == [today_event]
+
+    def test_zero_length_event(self, session, sender, event):
+        end = event.start + timedelta(days=1)
+        events = get_user_events_in_range(
+            session, sender.id, event.start, end)
+        assert events == [event]
+
+    def test_all_day_filter(self, session, sender, event, all_day_event):
+        start = event.start
+        end = start + timedelta(days=1)
+        assert get_user_events_in_range(
+            session, sender.id, start, end, all_day=True) == [all_day_event]
+        assert get_user_events_in_range(
+            session, sender.id, start, end, all_day=False) == [event]
+
+    def test_starting_in_range(
+            self, session, sender, today_event, today_event_2,
+            yesterday_event):
+        start = today_event.start.replace(hour=0)
+        end = start + timedelta(days=1)
+        events = get_user_events_starting_in_range(
+            session, sender.id, start, end)
+        assert events == [today_event_2, today_event]
+        events = get_user_events_starting_in_range(
+            session, sender.id, end=start)
+        assert events == [yesterday_event]
@@ -1,10 +1,18 @@
 import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 import requests
 import responses
 
-from app.internal.weather_forecast import get_weather_data
+from app.database.models import WeatherDay
+from app.internal import weather_forecast
+from app.internal.weather_forecast import (
+    get_weather_data, get_weather_range, WeatherStore,
+)
 
 HISTORY_URL = "https://visual-crossing-weather.p.rapidapi.com/history"
 FORECAST_URL = "https://visual-crossing-weather.p.rapidapi.com/forecast"
@@ -77,3 +85,128 @@ def test_forecast_exception_from_api():
         requests.get(FORECAST_URL)
     output = get_weather_data(requested_date, "neo")
     assert output['Status'] == -1
+
+
+class StubWeatherApi(BaseHTTPRequestHandler):
+    """A local stub of the weather API, which records its requests."""
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        type(self).requests.append((url.path, query))
+        if url.path == "/forecast":
+            today = datetime.date.today()
+            days = [today + datetime.timedelta(days=i) for i in range(15)]
+        else:
+            start = datetime.date.fromisoformat(query["startDateTime"])
+            end = datetime.date.fromisoformat(query["endDateTime"])
+            days = [start + datetime.timedelta(days=i)
+                    for i in range((end - start).days)]
+        values = [{"datetimeStr": f"{day.isoformat()}T00:00:00+02:00",
+                   "mint": day.day, "maxt": day.day + 10,
+                   "conditions": url.path[1:]} for day in days]
+        body = json.dumps({"locations": {"Tel Aviv": {"values": values}}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def weather_api(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), StubWeatherApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubWeatherApi.requests = []
+    monkeypatch.setattr(
+        weather_forecast, "WEATHER_API_URL",
+        f"http://127.0.0.1:{server.server_port}")
+    yield StubWeatherApi.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_weather_range_fetches_once_per_type(weather_api, session):
+    today = datetime.date.today()
+    start = today - datetime.timedelta(days=10)
+    end = today + datetime.timedelta(days=20)
+    output = get_weather_range(start, end, "Tel Aviv", session)
+    assert len(output) == 31
+    assert all(day["Status"] == 0 for day in output.values())
+    assert output[start]["ForecastType"] == "history"
+    assert output[today]["ForecastType"] == "forecast"
+    assert output[end]["ForecastType"] == "historical-forecast"
+    assert output[today]["Conditions"] == "forecast"
+    paths = sorted(path for path, _ in weather_api)
+    assert paths.count("/forecast") == 1
+    assert paths.count("/history") <= 3
+
+    requests_made = len(weather_api)
+    again = get_weather_range(start, end, " tel  AVIV ", session)
+    assert again == output
+    assert len(weather_api) == requests_made
+
+
+def test_weather_store_keeps_every_day_fetched(weather_api, session):
+    today = datetime.date.today()
+    store = WeatherStore(session)
+    weather_json, error_text = store.get(today, "Tel Aviv")
+    assert error_text is None
+    assert weather_json["MinTempCel"] == today.day
+    assert session.query(WeatherDay).count() == 15
+    tomorrow = today + datetime.timedelta(days=1)
+    assert store.get(tomorrow, "tel aviv")[0]["MinTempCel"] == tomorrow.day
+    assert len(weather_api) == 1
+
+
+def test_weather_store_refreshes_stale_forecasts(weather_api, session):
+    today = datetime.date.today()
+    store = WeatherStore(session)
+    store.get(today, "Tel Aviv")
+    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+    session.query(WeatherDay).update({"fetched_at": yesterday})
+    session.commit()
+    store.get(today, "Tel Aviv")
+    assert [path for path, _ in weather_api] == ["/forecast", "/forecast"]
+    assert session.query(WeatherDay).count() == 15
+
+
+def test_weather_store_keeps_history(weather_api, session):
+    day = datetime.date(2020, 4, 4)
+    store = WeatherStore(session)
+    store.get(day, "Tel Aviv")
+    long_ago = datetime.datetime(2021, 1, 1)
+    session.query(WeatherDay).update({"fetched_at": long_ago})
+    session.commit()
+    weather_json, _ = store.get(day, "Tel Aviv")
+    assert weather_json["ForecastType"] == "history"
+    assert len(weather_api) == 1
+    _, query = weather_api[0]
+    assert query["startDateTime"] == "2020-04-04"
+    assert query["endDateTime"] == "2020-04-05"
+
+
+def test_get_weather_does_not_change_the_base_query(weather_api):
+    base_query_string = dict(weather_forecast.BASE_QUERY_STRING)
+    get_weather_data(datetime.datetime(2020, 4, 4), "tel aviv")
+    assert weather_forecast.BASE_QUERY_STRING == base_query_string
+    assert weather_api[0][1]["location"] == "tel aviv"
+
+
+def test_weather_store_serves_stale_days_when_unavailable(
+        weather_api, session, monkeypatch):
+    today = datetime.date.today()
+    store = WeatherStore(session)
+    store.get(today, "Tel Aviv")
+    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+    session.query(WeatherDay).update({"fetched_at": yesterday})
+    session.commit()
+    monkeypatch.setattr(
+        weather_forecast, "WEATHER_API_URL", "http://127.0.0.1:1")
+    weather_json, error_text = WeatherStore(session).get(today, "Tel Aviv")
+    assert error_text is None
+    assert weather_json["MinTempCel"] == today.day
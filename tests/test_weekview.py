@@ -1,8 +1,12 @@
+from datetime import datetime
+
 from bs4 import BeautifulSoup
 import pytest
 
 from app.routers.event import create_event
-from app.routers.weekview import get_week_dates
+from app.routers.weekview import (
+    get_week_dates, get_week_events_and_attributes
+)
 
 
 def create_weekview_event(events, session, user):
@@ -17,6 +21,13 @@ def create_weekview_event(events, session, user):
         )
 
 
+def count_weekview_queries(client, count_queries, date):
+    with count_queries() as statements:
+        response = client.get(f"/week/{date}")
+    assert response.ok
+    return len(statements)
+
+
 def test_get_week_dates(weekdays, sunday):
     week_dates = list(get_week_dates(sunday))
     for i in range(6):
@@ -54,3 +65,31 @@ def test_weekview_html_events(
     response = client.get(f"/week/{date}")
     soup = BeautifulSoup(response.content, 'html.parser')
     assert event in str(soup.find("div", {"id": event}))
+
+
+def test_week_events_and_attributes(multiday_event, event1):
+    days = list(get_week_dates(datetime(2021, 1, 31)))
+    week = get_week_events_and_attributes(days, [event1, multiday_event])
+    assert [day.day for day in week] == days
+    assert [len(day.events_and_attrs) for day in week] == [0, 2, 1, 1, 0, 0, 0]
+    positions = [
+        attrs.grid_position
+        for day in week
+        for event, attrs in day.events_and_attrs
+        if event is multiday_event
+    ]
+    assert positions == ["55 / 101", "1 / 101", "1 / 55"]
+
+
+def test_weekview_constant_number_of_queries(
+    test_db_client, count_queries, session, user, event1, event2, event3,
+    multiday_event,
+):
+    empty_week_queries = count_weekview_queries(
+        test_db_client, count_queries, "2021-1-31")
+    create_weekview_event(
+        [event1, event2, event3, multiday_event], session=session, user=user,
+    )
+    assert count_weekview_queries(
+        test_db_client, count_queries, "2021-1-31") == empty_week_queries
+    assert empty_week_queries <= 2